@@ -1,36 +1,81 @@
 #The agricultural returns via paradigm rules and soil depletion
+import numpy as np
+
+
+# the soil depletion of a set of communities, one row per community, so that
+# the agriculture of many communities can be run at once
+class AgricultureTable:
+    __slots__ = ('depletion',)
+
+    def __init__(self, n_communities, n_rules):
+        # local depletion of each land-use type in paradigm "rules" arrays
+        self.depletion = np.zeros([n_communities, n_rules])
+
+    #find the agricultural returns of a set of communities whose agriculture
+    #uses rows of this table and whose paradigms share a paradigm table
+    def Run(self, communities):
+        if len(communities) == 0:
+            return
+        params = communities[0].params
+        agris = [community.agri for community in communities]
+        rows = [agri.row for agri in agris]
+
+        # the paradigms are rows of one paradigm table
+        paradigms = [community.paradigm for community in communities]
+        table = paradigms[0].table
+        follows = [p.row for p in paradigms]
+        yield_rules = table.yield_rules[follows]
+        depletion_rules = table.depletion_rules[follows]
+
+        #NEW 0.11--LATITUDE SPREAD
+        y = np.array([community.position[1] for community in communities])
+        latitude = table.latitude[follows]
+        maxlat = np.array([p.maxlat for p in paradigms])
+        lat_modify = ((1-((np.abs(y-latitude)/maxlat)*params.lat_mod))
+                      *params.mult)
+
+        #yields use the depletion from before this run
+        workrate = np.array([agri.workrate for agri in agris])[:, np.newaxis]
+        depletion = self.depletion[rows]
+        yields = (np.sum(yield_rules*workrate - depletion, axis=1)
+                  * lat_modify).tolist()
+        #bounds
+        self.depletion[rows] = np.clip(depletion + depletion_rules*workrate,
+                                       0, 1)
+
+        for agri, agri_yields in zip(agris, yields):
+            agri.yields_prev = agri.yields
+            agri.yields = agri_yields
+
+
+# the agriculture of a single community, its depletion is a row of a table
+# which may be shared with other communities
 class Agriculture:
+    __slots__ = ('community', 'table', 'row', 'yields', 'yields_prev',
+                 'workrate')
 
-    def __init__(self, community):
+    def __init__(self, community, table=None, row=0):
         self.community = community
-        # local depletion array equates to each land-use type in paradigm "rules" array
-        self.depletion = [0,0,0,0,0,0,0,0,0,0] 
+        if table is None:
+            table = AgricultureTable(1, community.params.n_land_use_rules)
+        self.table = table
+        self.row = row
+        self.table.depletion[row] = 0
         self.yields = 0
         self.yields_prev = 0
         self.workrate = .5
-        
-        
+
+    @property
+    def depletion(self):
+        return self.table.depletion[self.row]
+
+    @depletion.setter
+    def depletion(self, depletion):
+        self.table.depletion[self.row] = depletion
+
     #find the agricultural returns of this community
     def Run(self):
-        
-        self.yields_prev = self.yields
-        self.yields = 0
-        
-        #NEW 0.11--LATITUDE SPREAD
-        lat_modify = (1-(((abs(self.community.position[1]-self.community.paradigm.latitude))
-            /self.community.paradigm.maxlat)*self.community.params.lat_mod))*self.community.params.mult
-        
-        #calculate yields and depletion for each section of community (in array)
-        #TODO--replace with matrix calculation via numpy?
         if self.community.paradigm is not None:
-            for i in range(len(self.community.paradigm.yield_rules)):
-                self.yields += ((self.community.paradigm.yield_rules[i] * self.workrate)
-                    - self.depletion[i]) * lat_modify
-                self.depletion[i] += self.community.paradigm.depletion_rules[i] * self.workrate
-                #bounds
-                if self.depletion[i] > 1:
-                    self.depletion[i] = 1
-                elif self.depletion[i] < 0:
-                    self.depletion[i] = 0
+            self.table.Run([self.community])
         else:
-            print("SKIPPED NONE PARA IN AGRI")
\ No newline at end of file
+            print("SKIPPED NONE PARA IN AGRI")
@@ -1,21 +1,26 @@
-import random as rnd
 from .. import terrain
-from numpy.random import random, randint
+from operator import attrgetter
+
+# key for finding the best offered paradigm
+_expectations = attrgetter('expectations')
 
 #paradigm shifts via comfort and expectations
 class ICONORHYTHM:
+    __slots__ = ('community', 'comfort', 'counterParadigms')
 
     def __init__(self, community):
         self.community = community
-        self.comfort = rnd.random()
-        self.counterParadigms = []
+        self.comfort = community.streams.leviathan.random()
+        # paradigms offered by neighbours, each is held once (as a key, in
+        # the order offered) up to params.max_counter_paradigms
+        self.counterParadigms = {}
 
     def Run(self):
         
         #if simple contagion paradigm spread
         if self.community.params.contagion is not None:
             #only checking if meeting ultrasociety needs
-            self.comfort = (self.community.agri.yields-sum(self.community.ultrasocietal_traits)) / 10
+            self.comfort = (self.community.agri.yields-self.community.total_ultrasocietal_traits()) / 10
             self.contagion_response()
             return
         
@@ -27,20 +32,22 @@ class ICONORHYTHM:
 
     def UpdateComfort(self):  
 
+        paradigm = self.community.paradigm
+
         # are yields getting better?
         gettingBetter = self.community.agri.yields - self.community.agri.yields_prev
 
         # how do expectations and reality compare? (including saved surplusses)
-        expectsVsReal = ((self.community.agri.yields + self.community.paradigm.expectations)
-            / self.community.paradigm.expectations) - 2
+        expectsVsReal = ((self.community.agri.yields + paradigm.expectations)
+            / paradigm.expectations) - 2
         
         # are yields high enough to support societal level?
         #TODO PARAMERETIZE BOTH SO MATCH NUM ULTRA TO NUM YEILDS
-        meetingNeeds = self.community.agri.yields - sum(self.community.ultrasocietal_traits) - 1 
+        meetingNeeds = self.community.agri.yields - self.community.total_ultrasocietal_traits() - 1 
 
         # add thus
         howAreThingsGoing = ((expectsVsReal + gettingBetter  + meetingNeeds)
-                                * self.community.paradigm.sensitivity)
+                                * paradigm.sensitivity)
 
         self.AdjustComfort(howAreThingsGoing)
 
@@ -51,88 +58,118 @@ class ICONORHYTHM:
 
         newPara = False
         # MIMESIS -- should community adopt a known counter paradigm?
-        for ct in self.counterParadigms: #TODO probably should suffle first?
-            # what are the expected returns pitched by other known paradigms?
-            # Are they a certain amount better than what the current paradigm offer's?
+        # what are the expected returns pitched by other known paradigms?
+        # Is the best a certain amount better than what the current paradigm offer's?
+        if self.counterParadigms:
+            ct = max(self.counterParadigms, key=_expectations)
             if ct.Compare(self.community) > self.community.paradigm.threshold:
-                self.community.paradigm = ct
+                self.Follow(ct, 'adoption')
                 newPara = True
-                break
 
         # MUTATE!!! (via current paradigm's rules on mutation)
-        if not newPara and rnd.random() < self.community.paradigm.mutation_rate:
+        if not newPara and self.community.streams.leviathan.random() < self.community.paradigm.mutation_rate:
             p = self.community.paradigm.Mutate(self.community)
-            self.community.paradigm = p
+            self.Follow(p, 'mutation')
             newPara = True
             
         # word spreads of the current paradigm to neighbours
         if not newPara:
             #spread current paradigm to neighbouring communities
-            for n in self.community.neighbours:
-                if (self.community.neighbours[n].terrain.polity_forming):
-                    self.community.neighbours[n].icono.counterParadigms.append(self.community.paradigm)
-            for n in self.community.littoral_neighbours_in_range(self.community.sea_attack_distance):
-                if (n.neighbour.terrain.polity_forming):
-                     n.neighbour.icono.counterParadigms.append(self.community.paradigm)
+            self.Spread(self.community.paradigm)
             
-            self.counterParadigms.clear()  # no memory of paradigms never adopted
+            self.ClearInbox()  # no memory of paradigms never adopted
             #TODO--LONGER MEMORIES?
         else:
-            self.counterParadigms.clear()
+            self.ClearInbox()
 
 
     def Response(self):
         
-        self.community.paradigm.UpdateExpectations(self.community)#move to community?
+        # the paradigm followed at the start of the response
+        paradigm = self.community.paradigm
+        paradigm.UpdateExpectations(self.community)#move to community?
         
         discomfort = 1 - self.comfort
 
         #COMPLACENCY AND MITIGATION
         if (self.comfort > .75 ):#TODO--should threshold affect?
-            self.community.agri.workrate -= self.community.paradigm.workrate_change
+            self.community.agri.workrate -= paradigm.workrate_change
         elif (self.comfort < .25):
-            self.community.agri.workrate += self.community.paradigm.workrate_change
+            self.community.agri.workrate += paradigm.workrate_change
         
         if (self.community.agri.workrate > 1): self.community.agri.workrate = 1
         elif (self.community.agri.workrate < 0): self.community.agri.workrate  = 0
 
         newPara = False
         # MIMESIS -- should community adopt a known counter paradigm?
-        for ct in self.counterParadigms: #TODO probably should suffle first?
-            # what are the expected returns pitched by other known paradigms?
-            # Are they a certain amount better than what the current
-            # paradigm offer's? (relative to the community's current comfort)
-            if ct.Compare(self.community) > self.community.paradigm.threshold * self.comfort:
-                self.community.paradigm = ct
+        # what are the expected returns pitched by other known paradigms?
+        # Is the best a certain amount better than what the current
+        # paradigm offer's? (relative to the community's current comfort)
+        if self.counterParadigms:
+            ct = max(self.counterParadigms, key=_expectations)
+            if ct.Compare(self.community) > paradigm.threshold * self.comfort:
+                self.Follow(ct, 'adoption')
                 newPara = True
                 if self.community.params.mil_spread:
                     self.diffuse_military_tech(self.community, self.community.params, ct.military_techs)
-                break
 
 
         # MUTATE!!! (via current paradigm's rules on mutation)
-        if not newPara and rnd.random() < (discomfort * discomfort * discomfort
-                                            * self.community.paradigm.mutation_rate):
-            p = self.community.paradigm.Mutate(self.community)
-            self.community.paradigm = p
+        if not newPara and self.community.streams.leviathan.random() < (discomfort * discomfort * discomfort
+                                            * paradigm.mutation_rate):
+            p = paradigm.Mutate(self.community)
+            self.Follow(p, 'mutation')
             newPara = True
             
         # word spreads of the current paradigm to neighbours
         if not newPara:
             #spread current paradigm to neighbouring communities
-            for n in self.community.neighbours:
-                if (self.community.neighbours[n].terrain.polity_forming):
-                    self.community.neighbours[n].icono.counterParadigms.append(self.community.paradigm)
-            for n in self.community.littoral_neighbours_in_range(self.community.sea_attack_distance):
-                if (n.neighbour.terrain.polity_forming):
-                     n.neighbour.icono.counterParadigms.append(self.community.paradigm)
+            self.Spread(paradigm)
             
-            self.counterParadigms.clear()  # no memory of paradigms never adopted
+            self.ClearInbox()  # no memory of paradigms never adopted
             #TODO--LONGER MEMORIES?
         else:
-            self.counterParadigms.clear()
+            self.ClearInbox()
     
 
+    # switch the community to a new paradigm, recording an adoption or
+    # mutation event if the world keeps an event log
+    def Follow(self, paradigm, event):
+        community = self.community
+        if community.events is not None:
+            community.events.record(event, community.index,
+                                    community.paradigm.row, paradigm.row)
+        community.paradigm = paradigm
+
+    # offer a paradigm to the neighbouring communities
+    def Spread(self, paradigm):
+        for n in self.community.adjacent:
+            # no neighbour beyond the edge of the map
+            if n is not None and n.terrain.polity_forming:
+                n.icono.Receive(paradigm)
+        for n in self.community.littoral_in_range:
+            if (n.neighbour.terrain.polity_forming):
+                n.neighbour.icono.Receive(paradigm)
+
+    # hold an offered paradigm in the inbox, repeated offers of the same
+    # paradigm are held once and a full inbox ignores new paradigms
+    def Receive(self, paradigm):
+        inbox = self.counterParadigms
+        if (paradigm not in inbox
+                and len(inbox) < self.community.params.max_counter_paradigms):
+            inbox[paradigm] = None
+            paradigm.inboxes += 1
+
+    # forget the offered paradigms, freeing the rows of those which are no
+    # longer followed or held by any community
+    def ClearInbox(self):
+        inbox = self.counterParadigms
+        for paradigm in inbox:
+            paradigm.inboxes -= 1
+            paradigm.ReleaseIfUnused()
+        inbox.clear()
+
+
     def AdjustComfort(self, adjust):
         self.comfort += adjust
         if self.comfort < 0:
@@ -144,9 +181,9 @@ class ICONORHYTHM:
     # for spreading military techs with paradigm mimesis, copied from community
     def diffuse_military_tech(self, target, params, military_techs):
         # Select a tech to share
-        selected_tech = randint(params.n_military_techs)
+        selected_tech = self.community.streams.leviathan.randint(params.n_military_techs)
         if military_techs[selected_tech] is True:
-            if params.military_tech_spread_probability > random():
+            if params.military_tech_spread_probability > self.community.streams.leviathan.random():
                 # Share this tech with the target
                 target.military_techs[selected_tech] = True
 
@@ -1,83 +1,132 @@
-import random as rnd
+from ..paradigm_table import ParadigmTable
+
 
 # the paradigm defining agricultural rules and depletion rates
 # including expectations based on follower return
+# the rules, latitude and follower count are a row of a paradigm table
+# which may be shared with other paradigms
 class Paradigm():
+    __slots__ = ('table', 'row', 'community', 'name', 'maxlat', 'mut_amount',
+                 'num_starting_rules', 'sensitivity', 'mutation_rate',
+                 'threshold', 'workrate_change', 'expectations',
+                 'military_techs', 'inboxes')
+
+    def __init__(self, community, table=None):
+        if table is None:
+            table = ParadigmTable(community.params.n_land_use_rules)
+        self.table = table
+        self.row = table.allocate()
 
-    def __init__(self, community):
-        
         self.community = community
-        self.name = rnd.random()
+        rng = community.streams.leviathan
+        self.name = rng.random()
         self.latitude = 0
         self.maxlat = 100
-        
+
         #basic parameters
         self.mut_amount = community.params.mut_amount
         self.num_starting_rules = 0 #TODO--parameterized?
-        
+
         #CULTURAL PARAMETERS
         self.sensitivity = community.params.sensitivity
         self.mutation_rate = community.params.mutation_rate
         self.threshold = community.params.threshold
         self.workrate_change = community.params.workrate_change
-        
+
         #variables
-        self.followers = []
-        self.followers.append(community)
-        self.expectations = rnd.random()*100
-        self.depletion_rules = [0] * 10 #TODO PARAMETERS FOR NUMBER OF RULES?
-        self.yield_rules = [0] * 10
-        
+        #followers are counted as communities adopt the paradigm
+        self.expectations = rng.random()*100
+        #number of communities holding the paradigm in their inbox
+        self.inboxes = 0
+        table.origin[self.row] = (-1 if community.index is None
+                                  else community.index)
+        table.depletion_rules[self.row] = 0
+        table.yield_rules[self.row] = 0
+
+        n_rules = table.n_rules
         for i in range(self.num_starting_rules):
-            rndnum = rnd.randint(0,9)
-            self.depletion_rules[rndnum] = ((rnd.random()*2) -1) *.05
-            self.yield_rules[rndnum] = rnd.random()
+            rndnum = rng.randint(n_rules)
+            table.depletion_rules[self.row, rndnum] = ((rng.random()*2) -1) *.05
+            table.yield_rules[self.row, rndnum] = rng.random()
 
         # military techs if used
         self.military_techs = community.military_techs
 
+    # free the row for reuse once no community follows the paradigm or holds
+    # it in its inbox, as then it can never be adopted again
+    def ReleaseIfUnused(self):
+        if (self.row is not None and self.inboxes == 0
+                and self.table.followers[self.row] == 0):
+            self.table.release(self.row)
+            self.row = None
+
+    @property
+    def yield_rules(self):
+        return self.table.yield_rules[self.row]
+
+    @property
+    def depletion_rules(self):
+        return self.table.depletion_rules[self.row]
+
+    @property
+    def latitude(self):
+        return self.table.latitude.item(self.row)
+
+    @latitude.setter
+    def latitude(self, latitude):
+        self.table.latitude[self.row] = latitude
+
+    # the number of communities following this paradigm
+    @property
+    def followers(self):
+        return self.table.followers.item(self.row)
+
     # compare expectations of this paradigm for communitys considering
     # adopting it, relative to the community the paradigm already follows
     def Compare(self, community):
         return self.expectations / community.paradigm.expectations
 
 
-    # create new para by modifying this paradigm by removing and adding rules
+    # create new para by copying this paradigm then removing and adding rules
+    # (copy on write, this paradigm's rules are unchanged)
     def Mutate(self, community):
-        
-        p = Paradigm(community)
-        p.depletion_rules = self.depletion_rules
-        p.yield_rules = self.yield_rules
+
+        p = Paradigm(community, self.table)
+        table = self.table
+        table.depletion_rules[p.row] = table.depletion_rules[self.row]
+        table.yield_rules[p.row] = table.yield_rules[self.row]
         p.expectations = self.expectations #FROM TEST-F.4
-        
+
         # for diminishing returns when applying paradigm to
         # communities at other latitudes
         p.latitude = community.position[1]
 
         #for spreading military techs if used
         self.military_techs = community.military_techs
-        
+
+        rng = community.streams.leviathan
+        n_rules = table.n_rules
         for i in range(self.mut_amount):
-            rndnum = rnd.randint(0,9)
+            rndnum = rng.randint(n_rules)
             #100 CYCLES TO DEPLETE --TODO--parameterize?
-            p.depletion_rules[rndnum] = ((rnd.random()*1.5) -1) *.01
-            p.yield_rules[rndnum] = rnd.random()
-        
+            table.depletion_rules[p.row, rndnum] = ((rng.random()*1.5) -1) *.01
+            table.yield_rules[p.row, rndnum] = rng.random()
+
         return p
-    
+
 
     # adjust expectations-->accessed by all communities
     # using this paradigm creating "word of mouth"
     def UpdateExpectations(self, community):
         if community.params.contagion is None:
             self.expectations += (((community.icono.comfort - .5) * 0.02)
-                + ((community.agri.yields - self.expectations) * 0.02)) / len(self.followers)
+                + ((community.agri.yields - self.expectations) * 0.02)) / self.followers
         elif community.params.contagion == 'Perfect': #perfect information
-            self.expectations = sum(self.yield_rules) - (sum(self.depletion_rules)*10)
+            self.expectations = self.yield_rules.sum() - (self.depletion_rules.sum()*10)
         elif community.params.contagion == 'FutureDiscounted': #incomplete information
-            self.expectations = sum(self.yield_rules) - sum(self.depletion_rules)
+            self.expectations = self.yield_rules.sum() - self.depletion_rules.sum()
         else:
             raise Exception("Invalid contagion parameter")
-        
+
         #bounds
-        if self.expectations <= 0: self.expectations = .0000001
\ No newline at end of file
+        if self.expectations <= 0: self.expectations = .0000001
@@ -1,6 +1,7 @@
 from .parameters import Parameters, generate_parameters, default_parameters
 from .world import World
+from .array_world import ArrayWorld
 from .community import Community
 
 __all__ = ['Parameters', 'generate_parameters', 'default_parameters', 'World',
-           'Community']
+           'ArrayWorld', 'Community']
@@ -5,16 +5,25 @@ from . import terrain
 from .area import Rectangle
 from .daterange import (DateRange, InvalidDateRange,
                         imperial_density_date_ranges, cities_date_ranges)
+from .histogram import SizeHistogram
+from .historical_data import (load_cities, load_battles, population_grids,
+                              battle_grids)
+from collections import namedtuple
 import matplotlib.pyplot as plt
 import numpy as np
 import pickle
-from scipy import ndimage, stats
+from scipy import ndimage, special, stats
 import yaml
 
 # How many communities a polity requires before it is considered large and is
 # recorded
 _LARGE_POLITY_THRESHOLD = 10
 
+# Range of power law exponents searched by fit_power_law and the step used
+# to differentiate the Hurwitz zeta function
+_ALPHA_RANGE = (1.001, 20.)
+_ALPHA_STEP = 1e-6
+
 # Colours
 _SEA = np.array([0.25098039, 0.57647059, 0.92941176, 1.])
 _DESERT = np.array([0.7372549, 0.71372549, 0.25098039, 1.])
@@ -47,20 +56,15 @@ def _colour_special_tiles(rgba_data, world, highlight_desert=False,
     if area is None:
         area = Rectangle.entire_map(world)
     xmin, xmax, ymin, ymax = area.bounds()
+    terrain_codes = world.grid(world.terrain_codes)[xmin:xmax, ymin:ymax]
     # Colour sea and optionally desert
-    for tile in world.tiles:
-        x, y = tile.position[0], tile.position[1]
-        if area.in_area(x, y):
-            x -= xmin
-            y -= ymin
-            if tile.terrain is terrain.sea:
-                rgba_data[x][y] = _SEA
-            elif tile.terrain is terrain.desert:
-                if highlight_desert:
-                    rgba_data[x][y] = _DESERT
-            elif tile.terrain is terrain.steppe:
-                if highlight_steppe:
-                    rgba_data[x][y] = _STEPPE
+    rgba_data[terrain_codes == terrain.TERRAINS.index(terrain.sea)] = _SEA
+    if highlight_desert:
+        rgba_data[
+            terrain_codes == terrain.TERRAINS.index(terrain.desert)] = _DESERT
+    if highlight_steppe:
+        rgba_data[
+            terrain_codes == terrain.TERRAINS.index(terrain.steppe)] = _STEPPE
     return rgba_data
 
 
@@ -69,14 +73,11 @@ def _highlight(rgba_data, area, highlight):
     Highlight tiles in an area
     """
     xmin, xmax, ymin, ymax = area.bounds()
-    for x, y in highlight.all_tiles:
-        if area.in_area(x, y):
-            x -= xmin
-            y -= ymin
-            rgba_data[x][y] += np.array([0.3, 0.0, 0.3, 0.0])
-            rgba_data[x][y] = np.array(
-                [min(value, 1.0) for value in rgba_data[x][y]]
-                )
+    tiles = np.array([(x - xmin, y - ymin) for x, y in highlight.all_tiles
+                      if area.in_area(x, y)], dtype=int).reshape(-1, 2)
+    x, y = tiles.T
+    rgba_data[x, y] = np.minimum(
+        rgba_data[x, y] + np.array([0.3, 0.0, 0.3, 0.0]), 1.0)
     return rgba_data
 
 
@@ -94,10 +95,7 @@ def plot_military_techs(world, highlight_desert=False, highlight_steppe=False):
     """
 
     # Prepare data
-    plot_data = np.array([
-        [world.index(x, y).total_military_techs()
-         for y in range(world.ydim)] for x in range(world.xdim)
-        ])
+    plot_data = world.grid(world.tile_values('military_techs'))
     plot_data = plot_data / world.params.n_military_techs
 
     # Generate rgba data
@@ -126,10 +124,7 @@ def plot_ultrasocietal_traits(world, highlight_desert=False,
     fig, ax, colour_map = _init_world_plot()
 
     # Prepare data
-    plot_data = np.array([
-        [world.index(x, y).total_ultrasocietal_traits()
-         for y in range(world.ydim)] for x in range(world.xdim)
-         ])
+    plot_data = world.grid(world.tile_values('ultrasocietal_traits'))
     plot_data = plot_data / world.params.n_ultrasocietal_traits
 
     # Generate rgba data
@@ -159,12 +154,7 @@ def plot_active_agriculture(world, highlight_desert=False,
     fig, ax, colour_map = _init_world_plot()
 
     # Prepare data
-    active_tiles = [tile for tile in world.tiles
-                    if tile.is_active(world.step_number) is True]
-    plot_data = np.zeros([world.xdim, world.ydim])
-    for tile in active_tiles:
-        x, y = tile.position
-        plot_data[x][y] = 1.
+    plot_data = world.grid(world.tile_values('active')).astype(float)
 
     # Generate rgba data
     plot_data = colour_map(plot_data)
@@ -198,6 +188,28 @@ class AccumulatorBase(object):
         self.date_ranges = date_ranges
         self.data = {era: np.zeros([world.xdim, world.ydim])
                      for era in date_ranges}
+        self._eras_by_step = {}
+
+    def active_eras(self, step_number=None):
+        """
+        The date ranges which contain the year of a step. The date ranges of
+        each step are found once and kept in a lookup table.
+
+        Args:
+            step_number (int, default=None): The step, by default the world's
+                current step.
+
+        Returns:
+            (list[DateRange]): The date ranges.
+        """
+        step = (self.world.step_number if step_number is None
+                else step_number)
+        eras = self._eras_by_step.get(step)
+        if eras is None:
+            year = self.world.year(step)
+            eras = [era for era in self.date_ranges if era.is_within(year)]
+            self._eras_by_step[step] = eras
+        return eras
 
     @classmethod
     def from_file(cls, world, data_file):
@@ -369,20 +381,20 @@ class ImperialDensity(AccumulatorBase):
         super().__init__(world, date_ranges)
 
     def sample(self):
-        # Create list of tiles to sample, only tiles with agriculture
-        agricultural_tiles = [tile for tile in self.world.tiles
-                              if tile.terrain.polity_forming]
-        agricultural_tiles[:] = [tile for tile in agricultural_tiles
-                                 if tile.is_active(self.world.step_number)]
-
-        # Create list of eras to add imperial density to, only those that
-        # contain the current year
-        year = self.world.year()
-        active_eras = [era for era in self.date_ranges if era.is_within(year)]
-        for tile in agricultural_tiles:
-            if tile.polity.size() > _LARGE_POLITY_THRESHOLD:
-                for era in active_eras:
-                    self.data[era][tile.position[0], tile.position[1]] += 1.
+        """
+        Add one to the imperial density of every active tile belonging to a
+        large polity, in each era containing the current year.
+        """
+        # Only add imperial density to eras that contain the current year
+        active_eras = self.active_eras()
+        if not active_eras:
+            return
+
+        large = self.world.active_mask() & (
+            self.world.tile_polity_sizes() > _LARGE_POLITY_THRESHOLD)
+        large = self.world.grid(large)
+        for era in active_eras:
+            self.data[era] += large
 
 
 class AttackEvents(AccumulatorBase):
@@ -406,11 +418,31 @@ class AttackEvents(AccumulatorBase):
     def __init__(self, world, date_ranges):
         super().__init__(world, date_ranges)
 
-    def sample(self, tile):
-        year = self.world.year()
-        active_eras = [era for era in self.date_ranges if era.is_within(year)]
+    def sample(self, tile=None):
+        """
+        Add the successful attacks of the last step, given by the targets in
+        the world's attack_targets, to the eras containing the year they were
+        made in. Call once after each step.
+
+        Args:
+            tile (Community, default=None): If given add a single attack on
+                this tile at the current step instead, so sample can be used
+                as an attack callback of World.step.
+        """
+        if tile is not None:
+            for era in self.active_eras():
+                self.data[era][tile.position[0], tile.position[1]] += 1.
+            return
+
+        active_eras = self.active_eras(self.world.step_number - 1)
+        if not active_eras:
+            return
+
+        world = self.world
+        attacks = world.grid(np.bincount(world.attack_targets,
+                                         minlength=world.total_tiles))
         for era in active_eras:
-            self.data[era][tile.position[0], tile.position[1]] += 1.
+            self.data[era] += attacks
 
 
 class CorrelateBase(object):
@@ -421,16 +453,48 @@ class CorrelateBase(object):
     Args:
         world (World): The world definition.
         date_ranges (list[DateRange]): The date ranges of the data.
+
+    Notes:
+        Blurred data is cached for each era, blur radius and area, so data
+        must not be modified once it has been correlated or plotted.
     """
     _label = None
     _prefix = None
-    _REMOVE_FLAG = -5
 
     def __init__(self, world, date_ranges):
         self.world = world
         self.date_ranges = date_ranges
         self.data = {era: np.zeros([world.xdim, world.ydim])
                      for era in date_ranges}
+        self._sea = world.grid(
+            world.terrain_codes == terrain.TERRAINS.index(terrain.sea))
+        self._blurred = {}
+
+    def _field(self, era, blur, area):
+        """
+        The data of one era within an area, blurred if requested.
+        """
+        xmin, xmax, ymin, ymax = area.bounds()
+        if not blur:
+            return self.data[era][xmin:xmax, ymin:ymax]
+        key = (era, blur, area.bounds())
+        if key not in self._blurred:
+            self._blurred[key] = ndimage.gaussian_filter(
+                self.data[era][xmin:xmax, ymin:ymax], sigma=blur)
+        return self._blurred[key]
+
+    def _compared(self, area, exclude):
+        """
+        A mask of the tiles within an area to correlate, all but sea tiles
+        and those in the excluded area.
+        """
+        compared = ~self._sea
+        if exclude:
+            compared = compared.copy()
+            x, y = np.array(exclude.all_tiles, dtype=int).reshape(-1, 2).T
+            compared[x, y] = False
+        xmin, xmax, ymin, ymax = area.bounds()
+        return compared[xmin:xmax, ymin:ymax]
 
     def plot_heatmap(self, blur=False, area=None, highlight=None):
         """
@@ -445,15 +509,11 @@ class CorrelateBase(object):
         """
         if area is None:
             area = Rectangle.entire_map(self.world)
-        xmin, xmax, ymin, ymax = area.bounds()
 
         for era in self.date_ranges:
             fig, ax, colour_map = _init_world_plot()
 
-            plot_data = self.data[era][xmin:xmax, ymin:ymax]
-
-            if blur:
-                plot_data = ndimage.gaussian_filter(plot_data, sigma=blur)
+            plot_data = self._field(era, blur, area)
             # Normalise
             vmax = np.max(plot_data)
             plot_data = plot_data/vmax
@@ -487,6 +547,16 @@ class CorrelateBase(object):
                 correlation.
             log_log (bool, default=False): If true correlate the logarithms of
                 the data and accumulator data.
+            charts (bool, default=True): Whether to plot the correlation of
+                each era, saving and showing the plots. If False only the
+                scores are computed.
+
+        Returns:
+            (tuple): A tuple of the form (mean_r, mean_n, BC_r, BCAD_r, AD_r)
+                of the mean correlation coefficient and number of tiles
+                compared over the common eras, and the correlation
+                coefficients of the eras 1500BC-500BC, 500BC-500AD and
+                500AD-1500AD, zero if an era is not compared.
         """
         assert self.world is accumulator.world
         common_eras = [era for era in self.date_ranges
@@ -495,71 +565,25 @@ class CorrelateBase(object):
         if area is None:
             area = Rectangle.entire_map(self.world)
         xmin, xmax, ymin, ymax = area.bounds()
-        xdim = xmax - xmin
-        ydim = ymax - ymin
-
-        if cumulative:
-            cumulative_sum = np.zeros([xdim, ydim])
-
-        sea_tiles = []
-        for tile in self.world.tiles:
-            if tile.terrain == terrain.sea:
-                x, y = tile.position[0], tile.position[1]
-                if area.in_area(x, y):
-                    sea_tiles.append((x-xmin, y-ymin))
-
-        # Correlate population and imperial density between eras in both
-        # cities data and imperial denisty
-        
-        total_r = .0 #LEV
-        total_n = 0
-        BC_r = .0
-        BCAD_r = .0
-        AD_r = .0
-        
-        for era in common_eras:
-            # Figure and axes
-            fig, ax = plt.subplots()
-            # Axes setup
-            ax.set_xlabel(accumulator._label)
-            ax.set_ylabel(self._label)
-            ax.set_title(str(era))
+        # Don't compare sea or excluded tiles
+        compared = self._compared(area, exclude)
 
+        cumulative_sum = 0
+        r = []
+        n = []
+        for era in common_eras:
             comparison = accumulator.data[era][xmin:xmax, ymin:ymax]
             if cumulative:
-                comparison += cumulative_sum
-                cumulative_sum = comparison
-            data = self.data[era][xmin:xmax, ymin:ymax]
-
-            if blur:
-                data = ndimage.gaussian_filter(data, sigma=blur)
-
-            # Don't compare sea tiles
-            for x, y in sea_tiles:
-                comparison[x, y] = self._REMOVE_FLAG
-                data[x, y] = self._REMOVE_FLAG
-
-            # Don't compare excluded tiles
-            if exclude:
-                for x, y in exclude.all_tiles:
-                    comparison[x, y] = self._REMOVE_FLAG
-                    data[x, y] = self._REMOVE_FLAG
-
-            comparison = comparison.flatten()
-            data = data.flatten()
+                cumulative_sum = cumulative_sum + comparison
+                comparison = cumulative_sum
+            data = self._field(era, blur, area)
 
+            selected = compared
             if log_log is True:
                 # Remove any tiles with value 0
-                for index in range(len(comparison)):
-                    if data[index] == 0 or comparison[index] == 0:
-                        comparison[index] = self._REMOVE_FLAG
-                        data[index] = self._REMOVE_FLAG
-
-            # Remove flagged elements
-            comparison = np.array([elem for elem in comparison
-                                   if elem != self._REMOVE_FLAG])
-            data = np.array([elem for elem in data
-                             if elem != self._REMOVE_FLAG])
+                selected = selected & (data != 0) & (comparison != 0)
+            comparison = comparison[selected]
+            data = data[selected]
 
             # Take logarithms if requested
             if log_log is True:
@@ -568,26 +592,119 @@ class CorrelateBase(object):
 
             # Linear regression
             linreg = stats.linregress(comparison, data)
-            total_r += linreg.rvalue
-            total_n += len(data)
-            #NOT FUTURE SAFE
-            if era == '1500BC-500BC': BC_r = linreg.rvalue
-            elif era == '500BC-500AD': BCAD_r = linreg.rvalue
-            elif era == '500AD-1500AD': AD_r = linreg.rvalue
-
-            # Scatter plot of data against comparison with best fit line
-            ax.plot(comparison, data, 'x')
-            ax.plot(comparison, comparison*linreg.slope + linreg.intercept)
-            ax.text(0, 1, str(linreg.rvalue), transform=ax.transAxes)
+            r.append(linreg.rvalue)
+            n.append(len(data))
+
+            if charts:
+                # Scatter plot of data against comparison with best fit line
+                fig, ax = plt.subplots()
+                ax.set_xlabel(accumulator._label)
+                ax.set_ylabel(self._label)
+                ax.set_title(str(era))
+                ax.plot(comparison, data, 'x')
+                ax.plot(comparison,
+                        comparison*linreg.slope + linreg.intercept)
+                ax.text(0, 1, str(linreg.rvalue), transform=ax.transAxes)
+
+                fig.tight_layout()
+                fig.savefig('{}_{}_correlation_{}.pdf'.format(
+                    self._prefix, accumulator._prefix, era), format='pdf')
 
-            fig.tight_layout()
-            fig.savefig('{}_{}_correlation_{}.pdf'.format(
-                self._prefix, accumulator._prefix, era), format='pdf')
-            
         #LEV
-        if charts: plt.show()
-        plt.close('all')
-        return total_r / len(common_eras), total_n / len(common_eras), BC_r, BCAD_r, AD_r
+        if charts:
+            plt.show()
+            plt.close('all')
+        return _scores(common_eras, r, n)
+
+    def correlate_many(self, accumulators, blur=False, cumulative=False,
+                       area=None, exclude=None, log_log=False):
+        """
+        Correlate the data of many accumulators, for example the mean
+        imperial density of each point of a parameter sweep, at once. The
+        scores are those of correlate without charts.
+
+        Args:
+            accumulators (list[AccumulatorBase]): The accumulators to compare
+                against, all with the same world.
+            blur (float, default=False): The radius of Gaussian blur to apply
+                to the data. If False no blur is applied.
+            cumulative (bool, default=False): Whether to compare against
+                cumulative accumulator data or not.
+            area (Area, default=None): The area to correlate. If None the
+                whole map correlated.
+            exclude (Area, default=None): An area to exclude from the
+                correlation.
+            log_log (bool, default=False): If true correlate the logarithms of
+                the data and accumulator data.
+
+        Returns:
+            (list[tuple]): The scores of each accumulator, as returned by
+                correlate. The correlation coefficient of an era is nan if
+                either set of values compared is constant.
+        """
+        assert all(self.world is accumulator.world
+                   for accumulator in accumulators)
+        common_eras = [era for era in self.date_ranges
+                       if all(era in accumulator.date_ranges
+                              for accumulator in accumulators)]
+
+        if area is None:
+            area = Rectangle.entire_map(self.world)
+        xmin, xmax, ymin, ymax = area.bounds()
+        compared = self._compared(area, exclude)
+
+        cumulative_sum = 0
+        r = np.zeros([len(accumulators), len(common_eras)])
+        n = np.zeros([len(accumulators), len(common_eras)], dtype=int)
+        for i, era in enumerate(common_eras):
+            # One row of compared tiles per accumulator
+            comparison = np.stack(
+                [accumulator.data[era][xmin:xmax, ymin:ymax][compared]
+                 for accumulator in accumulators])
+            if cumulative:
+                cumulative_sum = cumulative_sum + comparison
+                comparison = cumulative_sum
+            data = np.broadcast_to(self._field(era, blur, area)[compared],
+                                   comparison.shape)
+
+            if log_log is True:
+                selected = (data != 0) & (comparison != 0)
+                comparison = np.log(np.where(selected, comparison, 1))
+                data = np.log(np.where(selected, data, 1))
+            else:
+                selected = np.ones(comparison.shape, dtype=bool)
+            r[:, i], n[:, i] = _pearson(comparison, data, selected)
+
+        return [_scores(common_eras, r[j].tolist(), n[j].tolist())
+                for j in range(len(accumulators))]
+
+
+def _pearson(x, y, selected):
+    """
+    The Pearson correlation coefficient of each row of x and y, using only
+    the selected elements, and the number of elements selected.
+    """
+    n = selected.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        dx = np.where(selected, x - (np.where(selected, x, 0).sum(axis=1)
+                                     / n)[:, np.newaxis], 0)
+        dy = np.where(selected, y - (np.where(selected, y, 0).sum(axis=1)
+                                     / n)[:, np.newaxis], 0)
+        r = (dx*dy).sum(axis=1) / np.sqrt((dx*dx).sum(axis=1)
+                                          * (dy*dy).sum(axis=1))
+    return np.clip(r, -1, 1), n
+
+
+def _scores(eras, r, n):
+    """
+    Summarise the correlation of each era as (mean_r, mean_n, BC_r, BCAD_r,
+    AD_r).
+    """
+    by_era = dict(zip(eras, r))
+    #NOT FUTURE SAFE
+    return (sum(r) / len(eras), sum(n) / len(eras),
+            by_era.get('1500BC-500BC', .0), by_era.get('500BC-500AD', .0),
+            by_era.get('500AD-1500AD', .0))
 
 
 # Population corralatable class
@@ -608,20 +725,9 @@ class CitiesPopulation(CorrelateBase):
         super().__init__(world, date_ranges)
 
         # Sum populations from cities and eras
-        with open(data_file, 'r') as yamlfile:
-            cities_data = yaml.load(yamlfile, Loader=yaml.FullLoader)
-
-            for city in cities_data:
-                for era in date_ranges:
-                    try:
-                        self.data[era][
-                            city['x'], city['y']
-                            ] += city['population'][era]
-                    except KeyError:
-                        raise InvalidDateRange(
-                            "Date range {} not in city data\n\t{}".format(
-                                era, city)
-                            )
+        cities = load_cities(data_file)
+        self.data.update(population_grids(cities, date_ranges, world.xdim,
+                                          world.ydim))
 
 
 # Battles corralatable class
@@ -642,13 +748,9 @@ class Battles(CorrelateBase):
         super().__init__(world, date_ranges)
 
         # Sum battles from data file
-        with open(data_file, 'r') as yamlfile:
-            battles = yaml.load(yamlfile, Loader=yaml.FullLoader)
-
-            for battle in battles:
-                for era in self.date_ranges:
-                    if era.is_within(battle['year']):
-                        self.data[era][battle['x'], battle['y']] += 1.
+        battles = load_battles(data_file)
+        self.data.update(battle_grids(battles, date_ranges, world.xdim,
+                                      world.ydim))
 
 
 # Historical imperial density correlatble class
@@ -726,7 +828,7 @@ class CompareEmpireShape(object):
 
         # Sum the number of polities in the historical extent of the empire,
         # and their sizes
-        included_polities = []
+        included_polities = set()
         n_polities = 0
         polity_sizes = []
         for coordinates in occupied:
@@ -737,9 +839,9 @@ class CompareEmpireShape(object):
             polity = tile.polity
             # Ensure polities are not doubly counted if they possess more than
             # one community in the extent of the empire
-            if polity in included_polities:
+            if polity.id in included_polities:
                 continue
-            included_polities.append(polity)
+            included_polities.add(polity.id)
             n_polities += 1
             polity_sizes.append(polity.size())
 
@@ -813,16 +915,151 @@ class CompareEmpireShape(object):
             compare.polity_sizes = pickle.load(picklefile)
         return compare
 
+
+"""
+A discrete power law fitted to the tail of a distribution of sizes. alpha is
+the exponent, xmin the smallest size of the tail, n_tail the number of sizes
+in the tail, ks_distance the Kolmogorov-Smirnov distance between the tail and
+the fitted power law and alpha_error the bootstrap standard error of alpha,
+or None without bootstrapping.
+"""
+PowerLawFit = namedtuple('PowerLawFit', ['alpha', 'xmin', 'n_tail',
+                                         'ks_distance', 'alpha_error'])
+
+
+def _expected_log(alpha, xmin):
+    """
+    The mean of log(x) of a discrete power law with exponent alpha over the
+    sizes x >= xmin, -d/d(alpha) log(zeta(alpha, xmin)).
+    """
+    return (np.log(special.zeta(alpha - _ALPHA_STEP, xmin))
+            - np.log(special.zeta(alpha + _ALPHA_STEP, xmin))) / (
+                2*_ALPHA_STEP)
+
+
+def _discrete_alpha(mean_log, xmin, iterations=60):
+    """
+    The maximum likelihood exponent of discrete power laws given the mean
+    log size of each tail. The likelihood is maximised where the expected
+    mean log size equals the observed mean, which decreases monotonically
+    with alpha, so every exponent is found at once by bisection.
+    """
+    mean_log, xmin = np.broadcast_arrays(np.asarray(mean_log, dtype=float),
+                                         np.asarray(xmin, dtype=float))
+    low = np.full(mean_log.shape, _ALPHA_RANGE[0])
+    high = np.full(mean_log.shape, _ALPHA_RANGE[1])
+    for i in range(iterations):
+        alpha = (low + high) / 2
+        too_small = _expected_log(alpha, xmin) > mean_log
+        low = np.where(too_small, alpha, low)
+        high = np.where(too_small, high, alpha)
+    return (low + high) / 2
+
+
+def fit_power_law(sizes, xmin=None, min_tail=50, max_candidates=100,
+                  n_bootstrap=0, seed=None):
+    """
+    Fit a discrete power law to the tail of a distribution of sizes by
+    maximum likelihood, following Clauset, Shalizi and Newman (2009).
+
+    The fit only uses the count of each distinct size, so its cost depends on
+    the number of distinct sizes rather than the number of observations.
+    Unless xmin is given it is chosen from the distinct sizes to minimise the
+    Kolmogorov-Smirnov distance between the tail and the fitted power law.
+
+    Args:
+        sizes (SizeHistogram or list[int]): The sizes, for example
+            world.polity_sizes or world.battles_by_size. Sizes less than one
+            are ignored.
+        xmin (int, default=None): The smallest size of the tail. If None it
+            is selected.
+        min_tail (int, default=50): The smallest number of sizes in the tail
+            of a candidate xmin.
+        max_candidates (int, default=100): The largest number of candidate
+            values of xmin, spread logarithmically over the distinct sizes.
+        n_bootstrap (int, default=0): The number of bootstrap resamples of the
+            tail used to estimate the standard error of alpha, with xmin
+            fixed. If zero no error is estimated.
+        seed (int, SeedSequence or numpy Generator, default=None): The seed of
+            the bootstrap resampling.
+
+    Returns:
+        (PowerLawFit): The fitted power law.
+
+    Raises:
+        (ValueError): Raised if no tail has at least min_tail sizes.
+    """
+    if not isinstance(sizes, SizeHistogram):
+        histogram = SizeHistogram()
+        histogram.add(sizes)
+        sizes = histogram
+    values, counts = sizes.sizes()
+    positive = values > 0
+    values, counts = values[positive], counts[positive]
+    log_values = np.log(values)
+
+    # Number and total log size of the sizes in each tail
+    tail_counts = np.cumsum(counts[::-1])[::-1]
+    tail_logs = np.cumsum((counts*log_values)[::-1])[::-1]
+
+    if xmin is None:
+        candidates = np.flatnonzero(tail_counts >= min_tail)
+        if len(candidates) > max_candidates:
+            candidates = candidates[np.unique(np.geomspace(
+                1, len(candidates), max_candidates).astype(int) - 1)]
+    else:
+        candidates = np.flatnonzero(values >= xmin)[:1]
+        if len(candidates) == 0 or tail_counts[candidates[0]] < min_tail:
+            candidates = np.zeros(0, dtype=int)
+    if len(candidates) == 0:
+        raise ValueError(
+            'No tail has at least {} sizes'.format(min_tail))
+
+    alphas = _discrete_alpha(tail_logs[candidates]/tail_counts[candidates],
+                             values[candidates])
+
+    # Kolmogorov-Smirnov distance of each candidate tail
+    distances = np.zeros(len(candidates))
+    for i, (start, alpha) in enumerate(zip(candidates, alphas)):
+        tail = values[start:]
+        empirical = np.cumsum(counts[start:]) / tail_counts[start]
+        model = 1 - (special.zeta(alpha, tail + 1)
+                     / special.zeta(alpha, tail[0]))
+        distances[i] = np.max(np.abs(empirical - model))
+    best = np.argmin(distances)
+    start = candidates[best]
+
+    alpha_error = None
+    if n_bootstrap:
+        rng = np.random.default_rng(seed)
+        n_tail = tail_counts[start]
+        resampled = rng.multinomial(n_tail, counts[start:]/n_tail,
+                                    size=n_bootstrap)
+        bootstrap_alphas = _discrete_alpha(
+            resampled @ log_values[start:] / n_tail, values[start])
+        alpha_error = float(np.std(bootstrap_alphas, ddof=1))
+
+    return PowerLawFit(float(alphas[best]), int(values[start]),
+                       int(tail_counts[start]), float(distances[best]),
+                       alpha_error)
+
     
 #LEV ANALYSIS ADDITIONS#####################
+def _leviathan_grid(world, name):
+    """
+    Arrange a Leviathan value of each tile, named as in World.tile_values, as
+    a map, masked where a tile has a non polity forming terrain and so no
+    Leviathan state.
+    """
+    return np.ma.masked_array(world.grid(world.tile_values(name)),
+                              mask=world.grid(~world.polity_forming))
+
+
 def plot_yields(world, highlight_desert=False, highlight_steppe=False):
     fig, ax, colour_map = _init_world_plot()
 
     # Prepare data
-    plot_data = np.array([
-        [world.index(x, y).agri.yields
-         for y in range(world.ydim)] for x in range(world.xdim)
-        ])
+    plot_data = _leviathan_grid(world, 'yields')
     plot_data = plot_data / 10 #TODO--without normalization?? AND ALSO PARAMETERIZE TO LENGTH OF YIELDS ARRAY...
 
     # Generate rgba data
@@ -840,10 +1077,7 @@ def plot_depletion(world, highlight_desert=False, highlight_steppe=False):
     fig, ax, colour_map = _init_world_plot()
 
     # Prepare data
-    plot_data = np.array([
-        [sum(world.index(x, y).agri.depletion)
-         for y in range(world.ydim)] for x in range(world.xdim)
-        ])
+    plot_data = _leviathan_grid(world, 'depletion')
     plot_data = plot_data / 10
     # Generate rgba data
     plot_data = colour_map(plot_data)
@@ -860,10 +1094,7 @@ def plot_comfort(world, highlight_desert=False, highlight_steppe=False):
     fig, ax, colour_map = _init_world_plot()
 
     # Prepare data
-    plot_data = np.array([
-        [world.index(x, y).icono.comfort
-         for y in range(world.ydim)] for x in range(world.xdim)
-        ])
+    plot_data = _leviathan_grid(world, 'comfort')
     #plot_data = plot_data / world.params.n_military_techs will see if need normalization
 
     # Generate rgba data
@@ -881,10 +1112,7 @@ def plot_expectations(world, highlight_desert=False, highlight_steppe=False):
     fig, ax, colour_map = _init_world_plot()
 
     # Prepare data
-    plot_data = np.array([
-        [world.index(x, y).paradigm.expectations
-         for y in range(world.ydim)] for x in range(world.xdim)
-        ])
+    plot_data = _leviathan_grid(world, 'expectations')
     plot_data = plot_data / 100 #will see if need normalization
 
     # Generate rgba data
@@ -894,7 +1122,7 @@ def plot_expectations(world, highlight_desert=False, highlight_steppe=False):
     im = ax.imshow(np.rot90(plot_data), cmap=colour_map)
     fig.colorbar(im)
     plt.title("Expectations")
-    fig.savefig('comfort_{:04d}.png'.format(world.step_number))
+    fig.savefig('expectations_{:04d}.png'.format(world.step_number))
     plt.show()
     plt.close()
     
@@ -903,11 +1131,8 @@ def plot_paradigms(world, highlight_desert=False, highlight_steppe=False):
     
     colour_map = plt.get_cmap('tab20')
 
-    # Prepare data
-    plot_data = np.array([
-        [world.index(x, y).paradigm.name
-         for y in range(world.ydim)] for x in range(world.xdim)
-        ])
+    # Prepare data, paradigm rows cycle through the colour map
+    plot_data = _leviathan_grid(world, 'paradigm') % colour_map.N
     #plot_data = plot_data / world.params.n_military_techs will see if need normalization
 
     # Generate rgba data
@@ -927,11 +1152,9 @@ def plot_polities(world, highlight_desert=False, highlight_steppe=False):
     
     colour_map = plt.get_cmap('tab20')
 
-    # Prepare data #TODO--make work with non polity tiles removed
-    plot_data = np.array([
-        [world.index(x, y).polity.name
-         for y in range(world.ydim)] for x in range(world.xdim)
-        ])
+    # Prepare data, polity ids cycle through the colour map
+    #TODO--make work with non polity tiles removed
+    plot_data = world.grid(world.labels) % colour_map.N
     #plot_data = plot_data / world.params.n_military_techs will see if need normalization
 
     # Generate rgba data
@@ -948,8 +1171,15 @@ def plot_polities(world, highlight_desert=False, highlight_steppe=False):
 import math
 
 ##Print out log-log charts of the input data (used for paradigm spread)
+##data is a list of values or a SizeHistogram
 def logLogHistogramOut (data, title, bin_multiplier=2):
 
+    #histograms are plotted from the count of each size
+    weights = None
+    if isinstance(data, SizeHistogram):
+        data, weights = data.sizes()
+        weights = weights[data > 0]
+
     #clear zeros and negatives
     data = [i for i in data if i > 0]
     
@@ -974,7 +1204,8 @@ def logLogHistogramOut (data, title, bin_multiplier=2):
 
     #print basic histogram
     bins = np.array(bins)
-    values, nBins, patches = plot1.hist(data, bins=bins, density=True)
+    values, nBins, patches = plot1.hist(data, bins=bins, weights=weights,
+                                        density=True)
   
     #add regression line
     #NOTE!!!!---a bit HACKY when there's no data in a bin
@@ -0,0 +1,1005 @@
+"""
+Array world module, a structure-of-arrays implementation of the simulation.
+"""
+from . import terrain, period, default_parameters
+from .random_stream import spawn_streams, get_streams_state, set_streams_state
+from .map_file import load_map
+from .paradigm_table import ParadigmTable
+from .histogram import SizeHistogram
+from .world import (littoral_neighbour_index, InvalidCheckpoint, _START_YEAR,
+                    _YEARS_PER_STEP)
+from bisect import bisect_right
+import numpy as np
+
+# Terrain codes
+_AGRICULTURE = terrain.TERRAINS.index(terrain.agriculture)
+_STEPPE = terrain.TERRAINS.index(terrain.steppe)
+_SEA = terrain.TERRAINS.index(terrain.sea)
+
+# Label of tiles which do not belong to a polity
+_NO_POLITY = -1
+
+# State arrays stored in checkpoints, all but attack_targets are per tile
+_STATE_ARRAYS = ('labels', 'polity_size', 'polity_traits', 'polity_max_size',
+                 'battle_size', 'ultrasocietal_traits', 'trait_totals',
+                 'military_techs', 'tech_totals', 'comfort', 'workrate',
+                 'yields', 'yields_prev', 'depletion', 'paradigm', 'offers',
+                 'attack_targets')
+
+# Paradigm table arrays stored in checkpoints
+_PARADIGM_ARRAYS = ('yield_rules', 'depletion_rules', 'expectations',
+                    'latitude', 'origin', 'followers')
+
+
+class ArrayWorld(object):
+    """
+    A structure-of-arrays implementation of the world.
+
+    The state of every tile, its polity and its Leviathan paradigm are held in
+    numpy arrays and the attack, cultural shift and disintegration phases
+    operate on them directly. World remains the reference implementation.
+    Attacks are made one at a time in a random order, as in World, while
+    cultural shift, disintegration and the Leviathan agriculture and
+    iconorhythm loops update all tiles at once.
+
+    Only polity forming tiles belong to polities, so sea and desert tiles are
+    not counted by number_of_polities.
+
+    Args:
+        xdim (int): The x dimension of the world in communities.
+        ydim (int): The y dimension of the world in communities.
+        terrain_codes (numpy Array): The terrain of each tile as its index in
+            terrain.TERRAINS. Tiles are arranged in the same column-major
+            fashion as World.tiles.
+        elevation (numpy Array): The elevation of each tile in kilometres.
+        active_from (numpy Array): The step number from which each tile is
+            agriculturally active.
+        params (Parameters, default=guard.default_paramters): The simulation
+            parameter set to use.
+        max_steps (int, default=1500): The number of steps the world is
+            expected to run for. Littoral neighbours are only indexed up to
+            the maximum sea attack distance of this many steps, the index is
+            rebuilt if the world runs for longer.
+        seed (int, SeedSequence or numpy Generator, default=None): The root
+            seed of the world's random streams. Worlds created with the same
+            seed and parameters produce identical runs. If None fresh entropy
+            is used.
+
+    Attributes:
+        xdim (int): The x dimension of the world in communities.
+        ydim (int): The y dimension of the world in communities.
+        params (Parameters): The simulation parameter set.
+        step_number (int): The current step number.
+        terrain_codes (numpy Array): The terrain of each tile.
+        elevation (numpy Array): The elevation of each tile in kilometres.
+        active_from (numpy Array): The step each tile becomes active.
+        positions (numpy Array): The (x,y) coordinates of each tile.
+        neighbours (numpy Array): The neighbours of each tile in the order of
+            community.DIRECTIONS, -1 where there is no neighbour.
+        littoral (numpy Array): True for littoral tiles.
+        labels (numpy Array): The polity label of each tile, -1 for tiles
+            which do not form polities.
+        polity_size (numpy Array): The number of tiles with each label.
+        polity_traits (numpy Array): The total number of ultrasocietal traits
+            of the tiles with each label.
+        ultrasocietal_traits (numpy Array): Boolean array of the
+            ultrasocietal traits of each tile.
+        military_techs (numpy Array): Boolean array of the military
+            technologies of each tile.
+        comfort (numpy Array): The Leviathan comfort of each tile.
+        workrate (numpy Array): The agricultural workrate of each tile.
+        yields (numpy Array): The agricultural yield of each tile.
+        depletion (numpy Array): The soil depletion of each land use type of
+            each tile.
+        paradigm (numpy Array): The row of each tile's paradigm in paradigms,
+            -1 for tiles which do not form polities.
+        paradigms (ParadigmTable): The table of paradigms.
+        streams (Streams): The random streams of each subsystem of the world.
+        events (EventLog): The log recording the events of each step, None if
+            events are not recorded.
+        polity_sizes (SizeHistogram): The maximum size of each polity when it
+            disintegrated, and of the remaining polities once end is called.
+        battles_by_size (SizeHistogram): The battle size of each polity
+            forming tile at the end of each step.
+        attack_targets (numpy Array): The tiles conquered by successful
+            attacks in the last step, in the order of the attacks.
+    """
+    def __init__(self, xdim, ydim, terrain_codes, elevation, active_from,
+                 params=default_parameters, max_steps=1500, seed=None):
+        self.params = params
+        self.streams = spawn_streams(seed)
+        self.events = None
+
+        self.xdim = xdim
+        self.ydim = ydim
+        self.total_tiles = xdim*ydim
+        self.terrain_codes = np.asarray(terrain_codes, dtype=np.int8)
+        self.elevation = np.asarray(elevation, dtype=float)
+        self.active_from = np.asarray(active_from, dtype=int)
+        self.polity_forming = np.array(
+            [landscape.polity_forming for landscape in terrain.TERRAINS]
+            )[self.terrain_codes]
+        self._set_active_masks()
+
+        index = np.arange(self.total_tiles)
+        self.positions = np.stack([index % xdim, index // xdim], axis=1)
+
+        # Initialise neighbours and littoral neighbours
+        self.set_neighbours()
+        self.max_steps = max_steps
+        self.littoral = np.zeros(self.total_tiles, dtype=bool)
+        if params.sea_attacks:
+            self.set_littoral_tiles()
+        self.set_littoral_neighbours(self._horizon(max_steps))
+
+        self.paradigms = ParadigmTable(params.n_land_use_rules,
+                                       capacity=self.total_tiles,
+                                       rng=self.streams.leviathan)
+
+        self.polity_sizes = SizeHistogram()
+        self.battles_by_size = SizeHistogram()
+
+        # Each agricultural tile is its own polity, set step number to zero
+        self.reset()
+
+    def __str__(self):
+        string = 'ArrayWorld:\n'
+        string += '\t- Tiles: {0}\n'.format(self.total_tiles)
+        string += '\t- Dimensions: {0}x{1}\n'.format(self.xdim, self.ydim)
+        string += '\t- Number of polities: {0}'.format(
+            self.number_of_polities())
+
+        return string
+
+    @classmethod
+    def from_file(cls, yaml_file, params=default_parameters, max_steps=1500,
+                  seed=None, cache=True):
+        """
+        Read a world from a YAML file. The map is read from its compiled
+        binary map when the YAML file is unchanged since it was compiled, see
+        map_file.load_map.
+
+        Args:
+            yaml_file (str): Path to the file containing a YAML definition of
+                the world.
+            params (Parameters, default=guard.default_paramters): The
+                simulation parameter set.
+            max_steps (int, default=1500): The number of steps the world is
+                expected to run for.
+            seed (int, SeedSequence or numpy Generator, default=None): The
+                root seed of the world's random streams.
+            cache (bool, default=True): Whether to use and write the compiled
+                binary map.
+
+        Returns:
+            (ArrayWorld): The world object specified by the YAML file
+
+        Raises:
+            (MissingYamlKey): Raised if a required key is not present in the
+                YAML file.
+        """
+        map_data = load_map(yaml_file, cache)
+
+        polity_forming = np.array(
+            [landscape.polity_forming for landscape in terrain.TERRAINS]
+            )[map_data.terrain_codes]
+        period_active_from = np.array(
+            [agricultural_period.active_from
+             for agricultural_period in period.PERIODS])
+        active_from = np.where(polity_forming,
+                               period_active_from[map_data.period_codes], 0)
+
+        return cls(map_data.xdim, map_data.ydim, map_data.terrain_codes,
+                   map_data.elevation, active_from, params, max_steps, seed)
+
+    @classmethod
+    def from_world(cls, world, max_steps=1500, seed=None):
+        """
+        Create an array world with the same map and parameters as a World.
+
+        Args:
+            world (World): The world to copy the map from.
+            max_steps (int, default=1500): The number of steps the world is
+                expected to run for.
+            seed (int, SeedSequence or numpy Generator, default=None): The
+                root seed of the world's random streams.
+
+        Returns:
+            (ArrayWorld): The array world.
+        """
+        elevation = [tile.elevation for tile in world.tiles]
+        active_from = [tile.period.active_from for tile in world.tiles]
+        return cls(world.xdim, world.ydim, world.terrain_codes, elevation,
+                   active_from, world.params, max_steps, seed)
+
+    def number_of_polities(self):
+        """
+        Calculate the number of polities in the world.
+
+        Returns:
+            (int): The number of polities.
+        """
+        return np.count_nonzero(self.polity_size)
+
+    def year(self, step_number=None):
+        """
+        Return the current year.
+
+        Args:
+            step_number (int, default=None): The step to give the year of, by
+                default the current step.
+
+        Returns:
+            (int): The current year. Years BC are negative.
+        """
+        if step_number is None:
+            step_number = self.step_number
+        return step_number*_YEARS_PER_STEP + _START_YEAR
+
+    def sea_attack_distance(self):
+        """
+        Determine maximum sea attack distance at current step.
+
+        Returns:
+            (float): The maximum sea attack distance.
+        """
+        return (self.params.base_sea_attack_distance
+                + self.step_number * self.params.sea_attack_increment)
+
+    def _horizon(self, steps):
+        """
+        The maximum sea attack distance reached in a number of steps.
+        """
+        return (self.params.base_sea_attack_distance
+                + steps * self.params.sea_attack_increment)
+
+    def grid(self, values):
+        """
+        Arrange per tile values as a map.
+
+        Args:
+            values (numpy Array): An array with one element per tile.
+
+        Returns:
+            (numpy Array): A two dimensional view of values indexed by the
+                (x,y) coordinates of the tiles.
+        """
+        return np.asarray(values).reshape(self.ydim, self.xdim).T
+
+    def _set_active_masks(self):
+        """
+        Find the active tiles of each agricultural period. Tiles only become
+        active at the start of a period so the mask of active tiles is
+        computed once for each.
+        """
+        self._activation_steps = np.unique(
+            self.active_from[self.polity_forming]).tolist()
+        self._active_masks = [
+            self.polity_forming & (self.active_from <= step)
+            for step in self._activation_steps]
+        self._inactive = np.zeros(self.total_tiles, dtype=bool)
+
+    def active_mask(self):
+        """
+        Determine which tiles are polity forming and currently active.
+
+        Returns:
+            (numpy Array): A boolean array which is True for active tiles.
+                The array is shared between steps and must not be modified.
+        """
+        period = bisect_right(self._activation_steps, self.step_number)
+        if period == 0:
+            return self._inactive
+        return self._active_masks[period-1]
+
+    def tile_polity_sizes(self):
+        """
+        The size of the polity each tile belongs to.
+
+        Returns:
+            (numpy Array): The size of each tile's polity, 0 for tiles which
+                do not belong to a polity.
+        """
+        sizes = np.zeros(self.total_tiles, dtype=int)
+        sizes[self.polity_forming] = self.polity_size[
+            self.labels[self.polity_forming]]
+        return sizes
+
+    def tile_values(self, name):
+        """
+        The value of a state variable for each tile.
+
+        Args:
+            name (str): The state variable, one of the keys of
+                world.TILE_VALUES.
+
+        Returns:
+            (numpy Array): A new array of the value of each tile. Tiles which
+                do not form polities are -1 for labels and paradigm and 0
+                otherwise.
+        """
+        if name == 'labels':
+            return self.labels.copy()
+        if name == 'active':
+            return self.active_mask().copy()
+        if name == 'paradigm':
+            return self.paradigm.copy()
+        if name == 'depletion':
+            values = self.depletion.sum(axis=1)
+        elif name == 'expectations':
+            values = self.paradigms.expectations[self.paradigm]
+        elif name == 'military_techs':
+            values = self.tech_totals
+        elif name == 'ultrasocietal_traits':
+            values = self.trait_totals
+        elif name in ('comfort', 'yields'):
+            values = getattr(self, name)
+        else:
+            raise KeyError(name)
+        return np.where(self.polity_forming, values, 0.)
+
+    def set_neighbours(self):
+        """
+        Assign tiles their neighbours.
+        """
+        x, y = self.positions[:, 0], self.positions[:, 1]
+        index = np.arange(self.total_tiles)
+        self.neighbours = np.stack([
+            np.where(x > 0, index - 1, -1),
+            np.where(x < self.xdim - 1, index + 1, -1),
+            np.where(y < self.ydim - 1, index + self.xdim, -1),
+            np.where(y > 0, index - self.xdim, -1)
+            ], axis=1)
+
+    def set_littoral_tiles(self):
+        """
+        Flag polity forming tiles with a sea neighbour as littoral.
+        """
+        neighbour_terrain = np.where(self.neighbours >= 0,
+                                     self.terrain_codes[self.neighbours], -1)
+        self.littoral = (self.polity_forming
+                         & np.any(neighbour_terrain == _SEA, axis=1))
+
+    def set_littoral_neighbours(self, horizon):
+        """
+        Index the littoral neighbours of each littoral tile up to a maximum
+        distance.
+
+        Args:
+            horizon (float): The maximum distance to index neighbours to.
+        """
+        self._littoral_horizon = horizon
+        (self.littoral_pointers, self.littoral_neighbours,
+         self.littoral_distances) = littoral_neighbour_index(
+             self.positions, self.littoral, horizon)
+        self._littoral_rows = np.repeat(np.arange(self.total_tiles),
+                                        np.diff(self.littoral_pointers))
+        self._map_list_cache = None
+        self._in_range_cache = (None, None)
+
+    def littoral_neighbours_in_range(self, distance):
+        """
+        Count the littoral neighbours of each tile within a given distance.
+        The counts for the last distance are cached, so attacks and paradigm
+        spread share one count per step.
+
+        Args:
+            distance (float): The threshold distance.
+
+        Returns:
+            (numpy Array): The number of littoral neighbours of each tile in
+                range. These are the first entries of the tile's littoral
+                neighbours. The array is shared and must not be modified.
+        """
+        cached_distance, in_range = self._in_range_cache
+        if distance == cached_distance:
+            return in_range
+
+        if distance > self._littoral_horizon:
+            self.max_steps *= 2
+            self.set_littoral_neighbours(
+                max(distance, self._horizon(self.max_steps)))
+        in_range = np.bincount(
+            self._littoral_rows[self.littoral_distances <= distance],
+            minlength=self.total_tiles)
+        self._in_range_cache = (distance, in_range)
+        return in_range
+
+    def _map_lists(self):
+        """
+        The static map arrays used by attacks as python lists.
+        """
+        if self._map_list_cache is None:
+            self._map_list_cache = (
+                self.neighbours.tolist(), self.terrain_codes.tolist(),
+                self.polity_forming.tolist(), self.elevation.tolist(),
+                self.littoral_pointers.tolist(),
+                self.littoral_neighbours.tolist())
+        return self._map_list_cache
+
+    def set_seed(self, seed):
+        """
+        Replace the random streams of the world.
+
+        Args:
+            seed (int, SeedSequence or numpy Generator): The root seed of the
+                new random streams. If None fresh entropy is used.
+        """
+        self.streams = spawn_streams(seed)
+        self.paradigms.rng = self.streams.leviathan
+
+    def set_event_log(self, events):
+        """
+        Record the attacks, ethnocides, disintegrations and paradigm changes
+        of the following steps in an event log.
+
+        Args:
+            events (EventLog): The event log. If None events are no longer
+                recorded.
+        """
+        self.events = events
+
+    def reset(self, seed=None):
+        """
+        Reset the world by returning all polities to single communities,
+        setting the step number to 0 and clearing the polity and battle size
+        histograms.
+
+        Args:
+            seed (int, SeedSequence or numpy Generator, default=None): If not
+                None the random streams are replaced by streams from this seed
+                before the reset, so the following run is reproducible.
+        """
+        if seed is not None:
+            self.set_seed(seed)
+        params = self.params
+        self.step_number = 0
+        self.polity_sizes.clear()
+        self.battles_by_size.clear()
+        pf_tiles = np.flatnonzero(self.polity_forming)
+
+        # Each polity forming tile is its own polity
+        self.labels = np.full(self.total_tiles, _NO_POLITY)
+        self.labels[pf_tiles] = pf_tiles
+        self.polity_size = self.polity_forming.astype(int)
+        self.polity_traits = np.zeros(self.total_tiles, dtype=int)
+        self.polity_max_size = np.zeros(self.total_tiles, dtype=int)
+        self.battle_size = np.zeros(self.total_tiles, dtype=int)
+        self.attack_targets = np.zeros(0, dtype=int)
+
+        self.ultrasocietal_traits = np.zeros(
+            [self.total_tiles, params.n_ultrasocietal_traits], dtype=bool)
+        self.trait_totals = np.zeros(self.total_tiles, dtype=int)
+        if params.military_technology_seed == 'steppes':
+            # Steppe communities start with all military technologies
+            seeded = self.terrain_codes == _STEPPE
+        elif params.military_technology_seed == 'uniform':
+            # 4.34% chance of starting with all military technologies
+            seeded = self.polity_forming & (
+                self.streams.world.block(self.total_tiles) < 0.0434)
+        else:
+            raise ValueError('tech_seed must be one of "steppes" or "uniform"')
+        self.military_techs = np.repeat(seeded[:, np.newaxis],
+                                        params.n_military_techs, axis=1)
+        self.tech_totals = self.military_techs.sum(axis=1)
+
+        # Leviathan state
+        self.comfort = self.streams.world.block(self.total_tiles)
+        self.workrate = np.full(self.total_tiles, .5)
+        self.yields = np.zeros(self.total_tiles)
+        self.yields_prev = np.zeros(self.total_tiles)
+        self.depletion = np.zeros([self.total_tiles, params.n_land_use_rules])
+        self.paradigms.clear()
+        self.paradigm = np.full(self.total_tiles, -1)
+        self.paradigm[pf_tiles] = self.paradigms.new(pf_tiles)
+        # Paradigm each tile last spread to its neighbours, -1 if none
+        self.offers = np.full(self.total_tiles, -1)
+
+    def attack(self):
+        """
+        Attempt an attack from all active communities, in a random order.
+        """
+        params = self.params
+        rng = self.streams.attack
+        attackers = np.flatnonzero(self.active_mask())
+        attackers = attackers[rng.permutation(len(attackers))].tolist()
+        n_attacks = len(attackers)
+        sea_attack_distance = self.sea_attack_distance()
+
+        # Draw random numbers for all attacks at once
+        directions = rng.integers(4, n_attacks).tolist()
+        target_draws = rng.block(n_attacks).tolist()
+        success_draws = rng.block(n_attacks).tolist()
+        ethnocide_draws = rng.block(n_attacks).tolist()
+        selected_techs = rng.integers(params.n_military_techs,
+                                      n_attacks).tolist()
+        tech_draws = rng.block(n_attacks).tolist()
+
+        # Scalar access to python lists is much faster than to arrays, the
+        # map itself is converted once in _map_lists
+        (neighbours, terrain_codes, polity_forming, elevation,
+         littoral_pointers, littoral_neighbours) = self._map_lists()
+        active = self.active_mask().tolist()
+        comfort = self.comfort.tolist()
+        labels = self.labels.tolist()
+        polity_size = self.polity_size.tolist()
+        polity_traits = self.polity_traits.tolist()
+        trait_totals = self.trait_totals.tolist()
+        tech_totals = self.tech_totals.tolist()
+        # Military technologies as bit fields
+        tech_bits = (self.military_techs
+                     << np.arange(params.n_military_techs)).sum(axis=1)
+        techs = tech_bits.tolist()
+        in_range = self.littoral_neighbours_in_range(
+            sea_attack_distance).tolist()
+        battle_size = [0]*self.total_tiles
+
+        ultrasocietal_coefficient = params.ultrasocietal_attack_coefficient
+        elevation_coefficient = params.elevation_defence_coefficient
+        ethnocide_range = params.ethnocide_max - params.ethnocide_min
+        entropy_maximisation = (
+            params.attack_method == 'entropy_maximisation')
+        if not entropy_maximisation and params.attack_method != 'uniform':
+            raise ValueError('attack_method must be one of "uniform" or'
+                             '"entropy_maxmisation"')
+
+        def attack_power(tile):
+            return ((ultrasocietal_coefficient*polity_traits[labels[tile]]
+                     + 1.) * (comfort[tile] + .001) * 2)
+
+        # Ethnocide copies traits and paradigms, record the pairs and apply
+        # them in order afterwards
+        ethnocides = []
+        # Attacks made as (attacker, target, sea, success), if logged
+        events = self.events
+        attacks = []
+        conquered = []
+
+        for k in range(n_attacks):
+            tile = attackers[k]
+            sea_attack = False
+
+            if not entropy_maximisation:
+                target = neighbours[tile][directions[k]]
+
+                # Attack each neighbour with a probability of 1/4, don't
+                # attack an empty neighbour
+                if target < 0:
+                    continue
+
+                if terrain_codes[target] == _SEA:
+                    if not params.sea_attacks:
+                        continue
+                    # Find a littoral neighbour within range
+                    target = littoral_neighbours[
+                        littoral_pointers[tile]
+                        + int(target_draws[k]*in_range[tile])]
+                    sea_attack = True
+
+                # Don't attack or spread technology to a non-agricultural or
+                # inactive tile
+                if not polity_forming[target] or not active[target]:
+                    continue
+            else:
+                candidates = [
+                    neighbour for neighbour in neighbours[tile]
+                    if neighbour >= 0
+                    if polity_forming[neighbour] and active[neighbour]
+                    if labels[neighbour] != labels[tile]
+                    ]
+                n_land = len(candidates)
+                if params.sea_attacks:
+                    start = littoral_pointers[tile]
+                    candidates += littoral_neighbours[
+                        start:start+in_range[tile]]
+                if len(candidates) == 0:
+                    continue
+
+                advantages = np.array([1. / attack_power(candidate)
+                                       for candidate in candidates])
+                cumulative = np.cumsum(advantages / np.sum(advantages))
+                target_no = min(int(np.searchsorted(
+                    cumulative, target_draws[k], side='right')),
+                    len(candidates) - 1)
+                target = candidates[target_no]
+                sea_attack = target_no >= n_land
+
+            attacker_label = labels[tile]
+            defender_label = labels[target]
+            # Don't attack a tile in the same polity, but do spread
+            # technology
+            if defender_label != attacker_label:
+                power_attacker = attack_power(tile)
+                power_defender = (ultrasocietal_coefficient
+                                  * polity_traits[defender_label] + 1.)
+                if not sea_attack:
+                    power_defender += elevation_coefficient*elevation[target]
+                probability = ((power_attacker - power_defender)
+                               / (power_attacker + power_defender))
+
+                success = probability > success_draws[k]
+                if events is not None:
+                    attacks.append((tile, target, sea_attack, success))
+                if success:
+                    conquered.append(target)
+                    # Transfer the defending tile to the attacker's polity
+                    traits = trait_totals[target]
+                    polity_size[defender_label] -= 1
+                    polity_traits[defender_label] -= traits
+                    polity_size[attacker_label] += 1
+                    polity_traits[attacker_label] += traits
+                    labels[target] = attacker_label
+
+                    # Attempt ethnocide
+                    probability = (
+                        params.ethnocide_min
+                        + ethnocide_range*tech_totals[tile]
+                        / params.n_military_techs
+                        - params.ethnocide_elevation_coefficient
+                        * elevation[target])
+                    if min(max(probability, 0), 1) > ethnocide_draws[k]:
+                        polity_traits[attacker_label] += (
+                            trait_totals[tile] - traits)
+                        trait_totals[target] = trait_totals[tile]
+                        ethnocides.append((target, tile))
+
+                battle_size[tile] = (polity_size[attacker_label]
+                                     + polity_size[labels[target]])
+
+            # Attempt to diffuse military technology regardless of whether
+            # the attack proceeded or was successful
+            tech = 1 << selected_techs[k]
+            if techs[tile] & tech:
+                if params.military_tech_spread_probability > tech_draws[k]:
+                    if not techs[target] & tech:
+                        techs[target] |= tech
+                        tech_totals[target] += 1
+
+        self.labels = np.array(labels)
+        self.polity_size = np.array(polity_size)
+        self.polity_traits = np.array(polity_traits)
+        self.trait_totals = np.array(trait_totals)
+        self.tech_totals = np.array(tech_totals)
+        self.military_techs = (
+            np.array(techs)[:, np.newaxis]
+            >> np.arange(params.n_military_techs)) & 1 == 1
+        self.battle_size = np.array(battle_size)
+        self.attack_targets = np.array(conquered, dtype=int)
+
+        if events is not None:
+            if attacks:
+                events.extend('attack', *zip(*attacks))
+            if ethnocides:
+                targets, attackers = zip(*ethnocides)
+                events.extend('ethnocide', attackers, targets)
+
+        abandoned, adopted = [], []
+        for target, tile in ethnocides:
+            self.ultrasocietal_traits[target] = self.ultrasocietal_traits[tile]
+            if params.spread_para_on_ethnocide:
+                abandoned.append(self.paradigm[target])
+                adopted.append(self.paradigm[tile])
+                self.paradigm[target] = self.paradigm[tile]
+                # The target no longer follows the paradigm it offered, which
+                # may be left without followers
+                self.offers[target] = -1
+        if abandoned:
+            self.paradigms.switch(abandoned, adopted, self.offers)
+
+    def cultural_shift(self):
+        """
+        Attempt cultural shift in all communities.
+        """
+        params = self.params
+        tiles = np.flatnonzero(self.polity_forming)
+        leviathan = np.zeros(len(tiles), dtype=bool)
+        if params.icono:
+            leviathan = self.active_mask()[tiles]
+            for i in range(params.num_icono_loops):
+                self.leviathan(tiles[leviathan])
+
+        # Chance to develop or loose each ultrasocietal trait, comfort
+        # affects losing traits in Leviathan communities
+        traits = self.ultrasocietal_traits[tiles]
+        loss_probability = np.full(len(tiles),
+                                   params.mutation_from_ultrasocietal,
+                                   dtype=float)
+        loss_probability[leviathan] -= (
+            (self.comfort[tiles[leviathan]] - .5)
+            * params.mutation_from_ultrasocietal)
+        draws = self.streams.cultural_shift.block(traits.shape)
+        gain = ~traits & (params.mutation_to_ultrasocietal > draws)
+        loss = traits & (loss_probability[:, np.newaxis] > draws)
+        traits = (traits | gain) & ~loss
+        self.ultrasocietal_traits[tiles] = traits
+
+        totals = traits.sum(axis=1)
+        change = totals - self.trait_totals[tiles]
+        self.trait_totals[tiles] = totals
+        self.polity_traits += np.bincount(self.labels[tiles], weights=change,
+                                          minlength=self.total_tiles
+                                          ).astype(int)
+
+    def leviathan(self, tiles):
+        """
+        Run one loop of the Leviathan agriculture and iconorhythm for a set of
+        tiles simultaneously.
+
+        Args:
+            tiles (numpy Array): The tiles to update.
+
+        Notes:
+            Each tile considers the paradigms spread to it by its land and
+            littoral neighbours in the previous loop and, like World, adopts
+            the one with the highest expectations. Ties go to land neighbours
+            (in the order of community.DIRECTIONS) before littoral neighbours
+            by distance.
+        """
+        params = self.params
+        paradigms = self.paradigms
+        paradigm = self.paradigm[tiles]
+
+        # Agriculture, yields and soil depletion
+        lat_modify = (1 - ((np.abs(self.positions[tiles, 1]
+                                   - paradigms.latitude[paradigm])
+                            / 100) * params.lat_mod)) * params.mult
+        workrate = self.workrate[tiles, np.newaxis]
+        depletion = self.depletion[tiles]
+        self.yields_prev[tiles] = self.yields[tiles]
+        yields = np.sum(paradigms.yield_rules[paradigm]*workrate - depletion,
+                        axis=1) * lat_modify
+        self.yields[tiles] = yields
+        self.depletion[tiles] = np.clip(
+            depletion + paradigms.depletion_rules[paradigm]*workrate, 0, 1)
+
+        # Comfort and expectations
+        traits = self.trait_totals[tiles]
+        expectations = paradigms.expectations
+        if params.contagion is None:
+            own = expectations[paradigm]
+            getting_better = yields - self.yields_prev[tiles]
+            expects_vs_real = ((yields + own) / own) - 2
+            meeting_needs = yields - traits - 1
+            comfort = np.clip(
+                self.comfort[tiles]
+                + (expects_vs_real + getting_better + meeting_needs)
+                * params.sensitivity, 0, 1)
+
+            # Every follower being updated moves its paradigm's expectations
+            # towards its own returns by 2% divided between all of the
+            # paradigm's followers, as in World
+            used, inverse = np.unique(paradigm, return_inverse=True)
+            n_updates = np.bincount(inverse)
+            returns = np.bincount(inverse, weights=yields + comfort - .5)
+            decay = (1 - .02/paradigms.followers[used])**n_updates
+            expectations[used] = (expectations[used]*decay
+                                  + returns/n_updates*(1 - decay))
+        else:
+            comfort = (yields - traits) / 10
+            used = np.unique(paradigm)
+            if params.contagion == 'Perfect':
+                discount = 10
+            elif params.contagion == 'FutureDiscounted':
+                discount = 1
+            else:
+                raise Exception("Invalid contagion parameter")
+            expectations[used] = (
+                np.sum(paradigms.yield_rules[used], axis=1)
+                - np.sum(paradigms.depletion_rules[used], axis=1)*discount)
+        expectations[used] = np.maximum(expectations[used], .0000001)
+        self.comfort[tiles] = comfort
+
+        if params.contagion is None:
+            # Complacency and mitigation
+            workrate = self.workrate[tiles]
+            workrate[comfort > .75] -= params.workrate_change
+            workrate[comfort < .25] += params.workrate_change
+            self.workrate[tiles] = np.clip(workrate, 0, 1)
+            threshold = params.threshold * comfort
+        else:
+            threshold = np.full(len(tiles), params.threshold)
+
+        # Mimesis, adopt the offered paradigm with the highest expectations if
+        # it is sufficiently better than the current one
+        neighbours = self.neighbours[tiles]
+        rows = np.repeat(np.arange(len(tiles)), neighbours.shape[1])
+        offers = np.where(neighbours >= 0, self.offers[neighbours], -1).ravel()
+        if params.sea_attacks:
+            distance = self.sea_attack_distance()
+            in_range = self.littoral_neighbours_in_range(distance)
+            littoral_rows = np.repeat(np.arange(len(tiles)), in_range[tiles])
+            entries = (np.repeat(self.littoral_pointers[tiles]
+                                 - np.cumsum(in_range[tiles])
+                                 + in_range[tiles], in_range[tiles])
+                       + np.arange(len(littoral_rows)))
+            littoral = self.littoral_neighbours[entries]
+            rows = np.concatenate([rows, littoral_rows])
+            offers = np.concatenate([
+                offers,
+                np.where(littoral != tiles[littoral_rows],
+                         self.offers[littoral], -1)])
+        offered = offers >= 0
+        rows = rows[offered]
+        offers = offers[offered]
+        # Stable sort so ties go to the first offer considered
+        order = np.lexsort((-expectations[offers], rows))
+        best_rows, best = np.unique(rows[order], return_index=True)
+        best = offers[order][best]
+        new_paradigm = np.full(len(tiles), -1)
+        own = expectations[paradigm]
+        acceptable = (expectations[best] / own[best_rows]
+                      > threshold[best_rows])
+        new_paradigm[best_rows[acceptable]] = best[acceptable]
+        adopting = new_paradigm >= 0
+
+        if params.contagion is None and params.mil_spread:
+            adopters = tiles[adopting]
+            selected_techs = self.streams.leviathan.integers(
+                params.n_military_techs, len(adopters))
+            spread = (
+                self.military_techs[paradigms.origin[new_paradigm[adopting]],
+                                    selected_techs]
+                & (params.military_tech_spread_probability
+                   > self.streams.leviathan.block(len(adopters)))
+                & ~self.military_techs[adopters, selected_techs])
+            self.military_techs[adopters[spread], selected_techs[spread]] = (
+                True)
+            self.tech_totals[adopters[spread]] += 1
+
+        # Mutation, via the current paradigm's mutation rate
+        if params.contagion is None:
+            mutation_probability = (1 - comfort)**3 * params.mutation_rate
+        else:
+            mutation_probability = params.mutation_rate
+        mutating = ~adopting & (self.streams.leviathan.block(len(tiles))
+                                < mutation_probability)
+        mutants = tiles[mutating]
+        new_paradigm[mutating] = paradigms.mutate(
+            paradigm[mutating], mutants, self.positions[mutants, 1],
+            params.mut_amount)
+        if self.events is not None:
+            self.events.extend('adoption', tiles[adopting], paradigm[adopting],
+                               new_paradigm[adopting])
+            self.events.extend('mutation', mutants, paradigm[mutating],
+                               new_paradigm[mutating])
+        changed = adopting | mutating
+        self.paradigm[tiles[changed]] = new_paradigm[changed]
+
+        # Communities which didn't change paradigm spread it to their
+        # neighbours, the offers are withdrawn before paradigms are abandoned
+        # so abandoned paradigms which are no longer offered are freed
+        self.offers[tiles] = np.where(changed, -1, self.paradigm[tiles])
+        paradigms.switch(paradigm[adopting], new_paradigm[adopting],
+                         self.offers)
+        paradigms.switch(paradigm[mutating], [], self.offers)
+
+    def disintegration(self):
+        """
+        Attempt disintegration of all polities
+        """
+        params = self.params
+        labels = np.flatnonzero(self.polity_size > 1)
+        size = self.polity_size[labels]
+        probability = (params.disintegration_size_coefficient * size
+                       - params.disintegration_ultrasocietal_trait_coefficient
+                       * self.polity_traits[labels] / size)
+        probability = np.where(
+            probability < 0, params.disintegration_base,
+            np.minimum(params.disintegration_base + probability, 1))
+        disintegrating = labels[
+            probability > self.streams.world.block(len(labels))]
+        if len(disintegrating) == 0:
+            return
+
+        self.polity_sizes.add(self.polity_max_size[disintegrating])
+        if self.events is not None:
+            self.events.extend('disintegration', disintegrating,
+                               self.polity_size[disintegrating],
+                               self.polity_max_size[disintegrating])
+
+        # Create a new polity for each of the communities
+        is_disintegrating = np.zeros(self.total_tiles, dtype=bool)
+        is_disintegrating[disintegrating] = True
+        tiles = np.flatnonzero(self.polity_forming)
+        tiles = tiles[is_disintegrating[self.labels[tiles]]]
+        self.polity_size[disintegrating] = 0
+        self.polity_traits[disintegrating] = 0
+
+        new_labels = np.flatnonzero(self.polity_size == 0)[:len(tiles)]
+        self.labels[tiles] = new_labels
+        self.polity_size[new_labels] = 1
+        self.polity_traits[new_labels] = self.trait_totals[tiles]
+        self.polity_max_size[new_labels] = 0
+
+    def step(self):
+        """
+        Conduct a simulation step
+        """
+        if self.events is not None:
+            self.events.step = self.step_number
+
+        # Attacks
+        self.attack()
+
+        # Cultural shift
+        self.cultural_shift()
+
+        # Disintegration
+        self.disintegration()
+
+        # Increment step counter
+        self.step_number += 1
+
+        # Track the maximum size of each polity and the size of battles
+        self.polity_max_size = np.maximum(self.polity_max_size,
+                                          self.polity_size)
+        self.battles_by_size.add(self.battle_size[self.polity_forming])
+
+    def end(self):
+        """
+        Record the maximum sizes of the remaining polities.
+
+        Returns:
+            (SizeHistogram): The maximum size of every polity which has
+                disintegrated or remains.
+        """
+        self.polity_sizes.add(self.polity_max_size[self.polity_size > 0])
+
+        return self.polity_sizes
+
+    def save_checkpoint(self, checkpoint_file):
+        """
+        Save the state of the world between steps to a compressed numpy
+        archive.
+
+        Args:
+            checkpoint_file (str): Path of the file to write.
+        """
+        arrays = {name: getattr(self, name) for name in _STATE_ARRAYS}
+        arrays.update({'paradigm_'+name: getattr(self.paradigms, name)
+                       for name in _PARADIGM_ARRAYS})
+        np.savez_compressed(
+            checkpoint_file, xdim=self.xdim, ydim=self.ydim,
+            terrain_codes=self.terrain_codes, step_number=self.step_number,
+            max_steps=self.max_steps,
+            **self.polity_sizes.get_state('polity_sizes'),
+            **self.battles_by_size.get_state('battles_by_size'),
+            paradigm_free_rows=np.array(self.paradigms.free_rows(),
+                                        dtype=int),
+            **arrays, **get_streams_state(self.streams))
+
+    def load_checkpoint(self, checkpoint_file):
+        """
+        Restore the state of the world from a checkpoint written by
+        save_checkpoint. The world must have the same map as the world the
+        checkpoint was saved from.
+
+        Args:
+            checkpoint_file (str): Path of the checkpoint file.
+
+        Raises:
+            (InvalidCheckpoint): Raised if the checkpoint was saved from a
+                world with a different map.
+        """
+        with np.load(checkpoint_file) as checkpoint:
+            arrays = dict(checkpoint)
+
+        if (int(arrays['xdim']) != self.xdim
+                or int(arrays['ydim']) != self.ydim
+                or np.any(arrays['terrain_codes'] != self.terrain_codes)):
+            raise InvalidCheckpoint(checkpoint_file)
+
+        self.step_number = int(arrays['step_number'])
+        max_steps = int(arrays['max_steps'])
+        if max_steps != self.max_steps:
+            self.max_steps = max_steps
+            self.set_littoral_neighbours(self._horizon(max_steps))
+
+        for name in _STATE_ARRAYS:
+            setattr(self, name, arrays[name])
+        self.paradigms.restore({name: arrays['paradigm_'+name]
+                                for name in _PARADIGM_ARRAYS},
+                               arrays['paradigm_free_rows'].tolist())
+        self.polity_sizes.set_state('polity_sizes', arrays)
+        self.battles_by_size.set_state('battles_by_size', arrays)
+        set_streams_state(self.streams, arrays)
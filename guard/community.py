@@ -1,10 +1,10 @@
 """
 Community class.
 """
-from . import terrain, period
+from . import terrain, period, random_stream
+from bisect import bisect_right
 from collections import namedtuple
-from numpy.random import random, randint, choice
-import numpy as np
+from types import MappingProxyType
 
 #LEV
 from .Leviathan import Paradigm, ICONORHYTHM, Agriculture
@@ -38,26 +38,92 @@ class Community(object):
     Attributes:
         terrain (Terrain): The terrain of the community.
         elevation (int): The communities elevation in kilometres.
-        ultrasocietal_traits (list[bool]): A vector of which ultrasocietal
-            traits the community possesses.
+        ultrasocietal_traits (tuple[bool]): A vector of which ultrasocietal
+            traits the community possesses. Empty for communities with a non
+            polity forming terrain. The vector is read only, assign a new
+            sequence to change the traits.
         military_techs (list[bool]): A vector of which military technologies
-            the community possesses.
+            the community possesses. Empty for communities with a non polity
+            forming terrain.
         position (tuple[int,int]): The position of the community on its map in
             the format (x,y).
-        neighbours (dict): The communities neighbours in the four cardinal
-            directions.
+        index (int): The position of the community in its world's list of
+            tiles, None if the community is not part of a world.
+        neighbours (MappingProxyType): The communities neighbours in the four
+            cardinal directions. The mapping is read only, assign a new
+            dictionary to change the neighbours.
+        adjacent (tuple[Community]): The communities neighbours in the order
+            of DIRECTIONS, None where there is no neighbour.
         littoral (bool): True if the community is littoral, False otherwise.
-        littoral_neighbours (list[LittoralNeighbour]): A list of all of the
-            communities littoral neighbours as LittoralNeighbour named tuples.
+        littoral_neighbours (list[LittoralNeighbour]): A list of the
+            communities littoral neighbours as LittoralNeighbour named tuples,
+            sorted by distance.
+        littoral_distances (list[float]): The distances to the littoral
+            neighbours, in the same order as littoral_neighbours.
+        sea_attack_distance (float): The maximum sea attack distance at the
+            community's last attack attempt.
+        littoral_in_range (list[LittoralNeighbour]): The littoral neighbours
+            within sea_attack_distance, shared by sea attacks and paradigm
+            spread.
         polity (Polity): The polity to which the community belongs.
-
+        polity_index (int): The position of the community in its polity's
+            list of communities.
+        streams (Streams): The random streams used by the community, shared
+            with the other communities of its world.
+        events (EventLog): The event log of the community's world, shared
+            with its other communities, None if events are not recorded.
+        paradigm (Paradigm): The Leviathan paradigm the community follows,
+            None for communities with a non polity forming terrain.
+        icono (ICONORHYTHM): The community's Leviathan iconorhythm, None for
+            communities with a non polity forming terrain.
+        agri (Agriculture): The community's Leviathan agriculture, None for
+            communities with a non polity forming terrain.
+
+    Notes:
+        Communities are slotted and their ultrasocietal traits are packed
+        into the bits of an integer, as large maps hold many thousands of
+        communities.
     """
+    __slots__ = ('polity', 'polity_index', 'streams', 'params', 'terrain',
+                 'elevation', 'period', 'position', 'index', 'adjacent',
+                 'littoral', 'littoral_neighbours', 'littoral_distances',
+                 'littoral_in_range', 'sea_attack_distance', 'battle_size',
+                 '_traits', '_n_traits', '_trait_total', 'military_techs',
+                 '_paradigm', 'icono', 'agri', 'events')
+
     def __init__(self, params, landscape=terrain.agriculture, elevation=0,
                  active_from=period.agri1):
+        self.polity = None
+        self.polity_index = None
+        self.streams = random_stream.default_streams
+        self.events = None
+        self.params = params
         self.terrain = landscape
         self.elevation = elevation
         self.period = active_from
 
+        self.position = (None, None)
+        self.index = None
+        self.adjacent = (None,)*len(DIRECTIONS)
+        self.littoral = False
+        self.littoral_neighbours = []
+        self.littoral_distances = []
+        self.littoral_in_range = []
+        self.sea_attack_distance = 0
+        self.battle_size = 0
+
+        self._traits = 0
+        self._n_traits = 0
+        self._trait_total = 0
+        self._paradigm = None
+        if not landscape.polity_forming:
+            # Sea and desert communities never join a polity, attack or
+            # hold a paradigm, so they carry no traits or Leviathan state
+            self.military_techs = ()
+            self.icono = None
+            self.agri = None
+            return
+
         self.ultrasocietal_traits = [False]*params.n_ultrasocietal_traits
         if params.military_technology_seed == 'steppes':
             # Steppe communities start with all military technologies
@@ -70,28 +136,17 @@ class Community(object):
             # original simulation there are 115 steppes tiles out of 2647
             # polity supporting (steppe or agricultural) tiles making 4.34% of
             # the communities begining with all miliatry technologies
-            if random() < 0.0434:
-                if landscape in [terrain.steppe, terrain.agriculture]:
-                    self.military_techs = [True]*params.n_military_techs
+            if self.streams.world.random() < 0.0434:
+                self.military_techs = [True]*params.n_military_techs
             else:
                 self.military_techs = [False]*params.n_military_techs
         else:
             raise ValueError('tech_seed must be one of "steppes" or "uniform"')
 
-        self.position = (None, None)
-        self.neighbours = dict.fromkeys(DIRECTIONS)
-        self.littoral = False
-        self.littoral_neighbours = []
-
-        self.polity = None
-        
         #LEV ################
-        self.params = params
         self.paradigm = Paradigm.Paradigm(self)
         self.icono = ICONORHYTHM.ICONORHYTHM(self)
         self.agri = Agriculture.Agriculture(self)
-        self.sea_attack_distance = 0
-        self.battle_size = 0
         #####################
 
     def __str__(self):
@@ -105,6 +160,98 @@ class Community(object):
 
         return string
 
+    @property
+    def neighbours(self):
+        """
+        The communities neighbours in the four cardinal directions, as a read
+        only mapping.
+        """
+        return MappingProxyType(dict(zip(DIRECTIONS, self.adjacent)))
+
+    @neighbours.setter
+    def neighbours(self, neighbours):
+        self.adjacent = tuple(neighbours[direction]
+                              for direction in DIRECTIONS)
+
+    @property
+    def paradigm(self):
+        """
+        The Leviathan paradigm the community follows.
+
+        Assigning a paradigm moves the community from the follower count of
+        its old paradigm to that of the new one. The old paradigm's row is
+        freed if it is left without followers and no community holds it in
+        its inbox.
+        """
+        return self._paradigm
+
+    @paradigm.setter
+    def paradigm(self, paradigm):
+        old = self._paradigm
+        if paradigm is not None:
+            paradigm.table.followers[paradigm.row] += 1
+        self._paradigm = paradigm
+        if old is not None:
+            old.table.followers[old.row] -= 1
+            old.ReleaseIfUnused()
+
+    @property
+    def ultrasocietal_traits(self):
+        """
+        A vector of which ultrasocietal traits the community possesses.
+
+        The vector is unpacked from the bits of an integer into a tuple on
+        each access. It is replaced rather than modified in place so that the
+        running trait totals of the community and its polity are kept up to
+        date.
+        """
+        traits = self._traits
+        return tuple(bool(traits >> index & 1)
+                     for index in range(self._n_traits))
+
+    @ultrasocietal_traits.setter
+    def ultrasocietal_traits(self, traits):
+        packed = 0
+        total = 0
+        for index, trait in enumerate(traits):
+            if trait:
+                packed |= 1 << index
+                total += 1
+        self._traits = packed
+        self._n_traits = len(traits)
+        if self.polity is not None:
+            self.polity.change_traits(total - self._trait_total)
+        self._trait_total = total
+
+    def copy_ultrasocietal_traits(self, other):
+        """
+        Replace the ultrasocietal traits of the community with those of
+        another community.
+
+        Args:
+            other (Community): The community to copy.
+        """
+        total = other._trait_total
+        self._traits = other._traits
+        self._n_traits = other._n_traits
+        if self.polity is not None:
+            self.polity.change_traits(total - self._trait_total)
+        self._trait_total = total
+
+    def _change_trait(self, index, value):
+        """
+        Gain or loose a single ultrasocietal trait, updating the running
+        totals.
+        """
+        if value:
+            self._traits |= 1 << index
+        else:
+            self._traits &= ~(1 << index)
+        change = 1 if value else -1
+        self._trait_total += change
+        if self.polity is not None:
+            self.polity.change_traits(change)
+
     def total_ultrasocietal_traits(self):
         """
         Total number of ultrasocietal traits.
@@ -112,7 +259,7 @@ class Community(object):
         Returns:
             (int): The total number of ultrasocietal traits.
         """
-        return sum(self.ultrasocietal_traits)
+        return self._trait_total
 
     def total_military_techs(self):
         """
@@ -169,10 +316,27 @@ class Community(object):
 
         Returns:
             (list[LittoralNeighbour]): A list of all littoral neighours within
-                range.
+                range, sorted by distance.
         """
-        return [neighbour for neighbour in self.littoral_neighbours
-                if neighbour.distance <= distance]
+        return self.littoral_neighbours[
+            :bisect_right(self.littoral_distances, distance)]
+
+    def set_sea_attack_distance(self, distance):
+        """
+        Set the maximum sea attack distance. The list of littoral neighbours
+        in range is only rebuilt when the distance crosses the distance of a
+        littoral neighbour.
+
+        Args:
+            distance (float): The maximum sea attack distance.
+        """
+        self.sea_attack_distance = distance
+        end = len(self.littoral_in_range)
+        distances = self.littoral_distances
+        if ((end < len(distances) and distance >= distances[end])
+                or (end > 0 and distance < distances[end-1])):
+            self.littoral_in_range = self.littoral_neighbours_in_range(
+                distance)
 
     def attack_power(self, params):
         """
@@ -267,22 +431,33 @@ class Community(object):
             sea_attack (bool): Whether the attack is made by sea.
             probability (float, default=None): Manually set the success
                 probability. If None this has no effect. Used for testing.
+
+        Returns:
+            (bool): True if the attack was successful.
         """
         if probability is None:
             probability = self.success_probability(target, params, sea_attack)
         # Determine whether attack was successful
-        if probability > random():
+        success = probability > self.streams.attack.random()
+        if self.events is not None:
+            self.events.record('attack', self.index, target.index, sea_attack,
+                               success)
+        if success:
             # Transfer defending community to attacker's polity
             self.polity.transfer_community(target)
 
             # Attempt ethnocide
-            if self.ethnocide_probability(target, params) > random():
-                target.ultrasocietal_traits[:] = self.ultrasocietal_traits
+            if (self.ethnocide_probability(target, params)
+                    > self.streams.attack.random()):
+                target.copy_ultrasocietal_traits(self)
+                if self.events is not None:
+                    self.events.record('ethnocide', self.index, target.index)
                 
                 if params.spread_para_on_ethnocide: target.paradigm = self.paradigm #LEV
         
         #LEV TRACKING SHOULD BE ELSEWHERE?
         self.battle_size = len(self.polity.communities) + len(target.polity.communities)
+        return success
                 
 
     def attempt_attack(self, params, step_number, sea_attack_distance,
@@ -296,18 +471,22 @@ class Community(object):
             sea_attack_distance (float): The maximum distance for a sea attack
                 at this step.
             callback (function, default=None): A callback function to be
-                invoked when a successful attack is made. Currently used to
-                collect attack frequency.
+                invoked with the target when an attack is made. Currently
+                used to collect attack frequency.
+
+        Returns:
+            (Community): The target if a successful attack was made,
+                otherwise None.
         """
-        self.sea_attack_distance = sea_attack_distance #LEV saved so can be used by icono
+        #LEV saved so can be used by icono
+        self.set_sea_attack_distance(sea_attack_distance)
         
         sea_attack = False
         proceed = True
 
         # Check attack method
         if params.attack_method == 'uniform':
-            direction = choice(DIRECTIONS)
-            target = self.neighbours[direction]
+            target = self.streams.attack.choice(self.adjacent)
 
             # Don't attack or spread technology to an empty neighbour
             # It is important to replicate Turchin's results that communities
@@ -319,9 +498,8 @@ class Community(object):
                 if params.sea_attacks:
                     # Sea attack
                     # Find a littoral neighbour within range
-                    in_range = self.littoral_neighbours_in_range(
-                        sea_attack_distance)
-                    target = in_range[choice(len(in_range))].neighbour
+                    in_range = self.littoral_in_range
+                    target = self.streams.attack.choice(in_range).neighbour
                     sea_attack = True
                 else:
                     return
@@ -342,7 +520,7 @@ class Community(object):
 
         elif params.attack_method == 'entropy_maximisation':
             land_neighbours = [
-                neighbour for neighbour in self.neighbours.values()
+                neighbour for neighbour in self.adjacent
                 if neighbour.terrain.polity_forming
                 if neighbour.is_active(step_number)
                 if neighbour.polity is not self.polity
@@ -350,7 +528,7 @@ class Community(object):
             if params.sea_attacks:
                 sea_neighbours = [
                     littoral_neighbour.neighbour for littoral_neighbour
-                    in self.littoral_neighbours_in_range(sea_attack_distance)
+                    in self.littoral_in_range
                     ]
                 all_neighbours = land_neighbours + sea_neighbours
             else:
@@ -359,15 +537,13 @@ class Community(object):
             if len(all_neighbours) == 0:
                 return
 
-            neighbour_strengths = np.array(
-                [neighbour.attack_power(params)
-                 for neighbour in all_neighbours]
-                )
+            advantages = [1. / neighbour.attack_power(params)
+                          for neighbour in all_neighbours]
+            total_advantage = sum(advantages)
+            probabilities = [advantage / total_advantage
+                             for advantage in advantages]
 
-            advantages = 1. / neighbour_strengths
-            probabilities = advantages / np.sum(advantages)
-
-            target_no = choice(range(len(all_neighbours)), p=probabilities)
+            target_no = self.streams.attack.weighted_index(probabilities)
             target = all_neighbours[target_no]
 
             if target_no > len(land_neighbours)-1:
@@ -377,8 +553,9 @@ class Community(object):
                              '"entropy_maxmisation"')
 
         # Conduct an attack if there is no reason not to
+        success = False
         if proceed:
-            self.attack(target, params, sea_attack=sea_attack)
+            success = self.attack(target, params, sea_attack=sea_attack)
             if callback:
                 callback(target)
 
@@ -386,43 +563,60 @@ class Community(object):
         # attack proceeded or was successful
         self.diffuse_military_tech(target, params)
 
-    def cultural_shift(self, params, step_number):
+        if success:
+            return target
+
+    def cultural_shift(self, params, step_number, draws=None,
+                       run_leviathan=True):
         """
         Local cultural shift (mutation of ultrasocietal traits vector).
 
         Args:
             params (Parameters): The simulation parameter set.
+            step_number (int): The current simulation step.
+            draws (list[float], default=None): One uniform random number for
+                each ultrasocietal trait. If None these are drawn from the
+                community's random stream.
+            run_leviathan (bool, default=True): Whether to run the Leviathan
+                agriculture and iconorhythm loops first. World runs these for
+                all communities at once before cultural shift.
         """
+        if draws is None:
+            draws = [self.streams.cultural_shift.random()
+                     for trait in range(params.n_ultrasocietal_traits)]
         
         #LEV ##############################
         # Run the Leviathan agriculture and iconorhythm if an active agricultural community
         # Then usual possible cultural shift, but now comfort affects losing ultrasocietal trait
         if (params.icono and self.is_active(step_number)):
-            for i in range(self.params.num_icono_loops):
-                self.agri.Run()
-                self.icono.Run()
+            if run_leviathan:
+                for i in range(self.params.num_icono_loops):
+                    self.agri.Run()
+                    self.icono.Run()
             
             
-            for index, trait in enumerate(self.ultrasocietal_traits):
-                if trait is False:
-                    if params.mutation_to_ultrasocietal > random():
-                        self.ultrasocietal_traits[index] = True
+            traits = self._traits
+            for index in range(self._n_traits):
+                if not traits >> index & 1:
+                    if params.mutation_to_ultrasocietal > draws[index]:
+                        self._change_trait(index, True)
                 else:
                     # Chance to loose an ultrasocietal trait
                     if params.mutation_from_ultrasocietal - ((self.icono.comfort-.5)
-                    *params.mutation_from_ultrasocietal) > random():
-                        self.ultrasocietal_traits[index] = False
+                    *params.mutation_from_ultrasocietal) > draws[index]:
+                        self._change_trait(index, False)
         
         else: # original cultural shift      
-            for index, trait in enumerate(self.ultrasocietal_traits):
-                if trait is False:
+            traits = self._traits
+            for index in range(self._n_traits):
+                if not traits >> index & 1:
                     # Chance to develop an ultrasocietal trait
-                    if params.mutation_to_ultrasocietal  > random():
-                        self.ultrasocietal_traits[index] = True
+                    if params.mutation_to_ultrasocietal  > draws[index]:
+                        self._change_trait(index, True)
                 else:
                     # Chance to loose an ultrasocietal trait
-                    if params.mutation_from_ultrasocietal > random():
-                        self.ultrasocietal_traits[index] = False
+                    if params.mutation_from_ultrasocietal > draws[index]:
+                        self._change_trait(index, False)
         ##############################
 
                         
@@ -436,8 +630,9 @@ class Community(object):
             params (Parameters): The simulation parameter set.
         """
         # Select a tech to share
-        selected_tech = randint(params.n_military_techs)
+        selected_tech = self.streams.attack.randint(params.n_military_techs)
         if self.military_techs[selected_tech] is True:
-            if params.military_tech_spread_probability > random():
+            if (params.military_tech_spread_probability
+                    > self.streams.attack.random()):
                 # Share this tech with the target
                 target.military_techs[selected_tech] = True
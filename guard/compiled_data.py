@@ -0,0 +1,86 @@
+"""
+Compiled binary caches of YAML data files, tagged with the hash of the file
+they were compiled from.
+"""
+import hashlib
+import numpy as np
+import os
+import tempfile
+import zipfile
+
+
+def file_hash(filename):
+    """
+    The SHA-256 digest of the contents of a file.
+
+    Args:
+        filename (str): Path to the file.
+
+    Returns:
+        (str): The hexadecimal digest.
+    """
+    with open(filename, 'rb') as infile:
+        return hashlib.sha256(infile.read()).hexdigest()
+
+
+def read_compiled(compiled_file, version, digest, names):
+    """
+    Read arrays from a compiled file if it is of the current format version
+    and was compiled from a file with the given hash.
+
+    Args:
+        compiled_file (str): Path to the compiled file.
+        version (int): The current version of the compiled format.
+        digest (str): The hash of the file the data should be compiled from.
+        names (list[str]): The names of the arrays to read.
+
+    Returns:
+        (dict): The arrays keyed by name, or None if the compiled file is
+            missing, unreadable, of another version, compiled from a
+            different file or lacks one of the arrays.
+    """
+    try:
+        with np.load(compiled_file) as compiled:
+            if (int(compiled['version']) != version
+                    or str(compiled['yaml_hash']) != digest):
+                return None
+            return {name: compiled[name] for name in names}
+    except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+        # Missing, empty or partly written compiled file
+        return None
+
+
+def write_compiled(compiled_file, version, digest, arrays):
+    """
+    Write arrays to a compiled file, tagged with the format version and the
+    hash of the file they were compiled from.
+
+    The arrays are written to a temporary file in the same directory which
+    then replaces the compiled file, so processes reading the compiled file
+    while it is written, or writing it at the same time, never see a partly
+    written file.
+
+    Args:
+        compiled_file (str): Path to the compiled file.
+        version (int): The current version of the compiled format.
+        digest (str): The hash of the file the data was compiled from.
+        arrays (dict): The arrays to write keyed by name.
+
+    Raises:
+        (OSError): Raised if the compiled file can't be written, e.g. in a
+            read only directory.
+    """
+    directory = os.path.dirname(os.path.abspath(compiled_file))
+    descriptor, temporary = tempfile.mkstemp(
+        dir=directory, prefix=os.path.basename(compiled_file) + '.',
+        suffix='.tmp')
+    try:
+        # Write through a file object so numpy does not append another
+        # suffix
+        with os.fdopen(descriptor, 'wb') as outfile:
+            np.savez_compressed(outfile, version=version, yaml_hash=digest,
+                                **arrays)
+        os.replace(temporary, compiled_file)
+    except BaseException:
+        os.remove(temporary)
+        raise
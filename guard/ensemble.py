@@ -0,0 +1,171 @@
+"""
+Ensembles of independent simulations run across a pool of processes.
+"""
+from . import default_parameters
+from .analysis import ImperialDensity
+from .daterange import imperial_density_date_ranges
+from .histogram import SizeHistogram
+from .world import World
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import copy
+import numpy as np
+
+"""
+The reduced imperial density of an ensemble, and the polity and battle sizes
+of all of its runs
+"""
+EnsembleResult = namedtuple('EnsembleResult', ['mean', 'variance', 'n_runs',
+                                               'polity_sizes',
+                                               'battles_by_size'])
+
+"""
+The result of a single run, its accumulated imperial density and its polity
+and battle sizes
+"""
+Replica = namedtuple('Replica', ['imperial_density', 'polity_sizes',
+                                 'battles_by_size'])
+
+# The world of each worker process, reused by all of the runs the worker
+# makes with the same map, engine and parameters
+_worker_world = {'key': None, 'world': None}
+
+
+def _get_world(engine, map_file, params, steps):
+    """
+    Return the world of this process, creating it if the map, engine or
+    parameters differ from the previous run.
+    """
+    key = (engine, map_file, params, steps)
+    if _worker_world['key'] != key:
+        _worker_world['world'] = None
+        _worker_world['world'] = engine.from_file(map_file, params,
+                                                  max_steps=steps)
+        _worker_world['key'] = key
+    return _worker_world['world']
+
+
+def _run_replica(engine, map_file, params, steps, date_ranges, seed):
+    """
+    Run a single simulation and sample its imperial density.
+
+    Returns:
+        (Replica): The accumulated imperial density of each date range and
+            the polity and battle sizes of the run.
+    """
+    world = _get_world(engine, map_file, params, steps)
+    world.reset(seed)
+
+    imperial_density = ImperialDensity(world, date_ranges)
+    for step in range(steps):
+        world.step()
+        imperial_density.sample()
+
+    # The world and its histograms are reused by the next run
+    return Replica(imperial_density.data, copy.deepcopy(world.end()),
+                   copy.deepcopy(world.battles_by_size))
+
+
+def run_ensemble(map_file, n_runs, params=default_parameters, seed=None,
+                 steps=1500, engine=World,
+                 date_ranges=imperial_density_date_ranges, processes=None,
+                 executor=None, world=None):
+    """
+    Run an ensemble of independent simulations of a map and reduce their
+    imperial density.
+
+    Each worker process reads the map once and reuses it for all of its runs.
+    Only the accumulated imperial density of each run is returned from the
+    workers.
+
+    Args:
+        map_file (str): Path to the YAML definition of the world.
+        n_runs (int): The number of simulations.
+        params (Parameters, default=guard.default_paramters): The simulation
+            parameter set.
+        seed (int or SeedSequence, default=None): The root seed of the
+            ensemble. Each run is seeded with a child of this seed, so the
+            same root seed gives identical results for any number of
+            processes. If None fresh entropy is used.
+        steps (int, default=1500): The number of steps of each simulation.
+        engine (class, default=World): The simulation engine, World or
+            ArrayWorld.
+        date_ranges (list[DateRange], default=imperial_density_date_ranges):
+            The date ranges to accumulate imperial density for.
+        processes (int, default=None): The number of worker processes. If
+            None the number of CPUs is used. If 1 the runs are made in this
+            process.
+        executor (Executor, default=None): An existing pool to submit the
+            runs to, processes is ignored if this is given.
+        world (World, default=None): The world definition attached to the
+            returned accumulators, used for plotting. If None it is read from
+            map_file.
+
+    Returns:
+        (EnsembleResult): A named tuple of the mean and variance of the
+            imperial density, as ImperialDensity accumulators, the number of
+            runs and the polity and battle sizes of every run merged into
+            SizeHistograms, which can be passed to analysis.fit_power_law.
+    """
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    seeds = seed.spawn(n_runs)
+    args = [[engine]*n_runs, [map_file]*n_runs, [params]*n_runs,
+            [steps]*n_runs, [date_ranges]*n_runs, seeds]
+
+    if executor is not None:
+        results = executor.map(_run_replica, *args)
+        mean, variance, polity_sizes, battles_by_size = _reduce(
+            results, date_ranges)
+    elif processes == 1:
+        mean, variance, polity_sizes, battles_by_size = _reduce(
+            map(_run_replica, *args), date_ranges)
+    else:
+        with ProcessPoolExecutor(processes) as pool:
+            results = pool.map(_run_replica, *args)
+            mean, variance, polity_sizes, battles_by_size = _reduce(
+                results, date_ranges)
+
+    if world is None:
+        world = engine.from_file(map_file, params, max_steps=steps)
+    mean_accumulator = ImperialDensity(world, date_ranges)
+    mean_accumulator.data = mean
+    variance_accumulator = ImperialDensity(world, date_ranges)
+    variance_accumulator.data = variance
+
+    return EnsembleResult(mean_accumulator, variance_accumulator, n_runs,
+                          polity_sizes, battles_by_size)
+
+
+def _reduce(results, date_ranges):
+    """
+    Reduce the imperial density of each run to its mean and sample variance,
+    and merge the polity and battle sizes of the runs. The runs are summed in
+    order, so the result does not depend on which worker made each run.
+    """
+    n_runs = 0
+    total = {}
+    total_squares = {}
+    polity_sizes = SizeHistogram()
+    battles_by_size = SizeHistogram()
+    for data, run_polity_sizes, run_battles_by_size in results:
+        n_runs += 1
+        polity_sizes.merge(run_polity_sizes)
+        battles_by_size.merge(run_battles_by_size)
+        for era in date_ranges:
+            if era in total:
+                total[era] = total[era] + data[era]
+                total_squares[era] = total_squares[era] + data[era]**2
+            else:
+                total[era] = data[era].copy()
+                total_squares[era] = data[era]**2
+
+    mean = {era: total[era] / n_runs for era in date_ranges}
+    if n_runs > 1:
+        # Clip rounding errors which would give a negative variance
+        variance = {era: np.maximum(
+            total_squares[era] - n_runs*mean[era]**2, 0) / (n_runs - 1)
+            for era in date_ranges}
+    else:
+        variance = {era: np.zeros_like(mean[era]) for era in date_ranges}
+    return mean, variance, polity_sizes, battles_by_size
@@ -0,0 +1,200 @@
+"""
+Event log module, a record of the attacks, ethnocides, disintegrations and
+paradigm changes of a run.
+"""
+import os
+import numpy as np
+
+# The columns of each type of event, every event also records its step
+EVENT_TYPES = {
+    'attack': [('attacker', np.int32), ('target', np.int32),
+               ('sea', np.bool_), ('success', np.bool_)],
+    'ethnocide': [('attacker', np.int32), ('target', np.int32)],
+    'disintegration': [('polity', np.int32), ('size', np.int32),
+                       ('max_size', np.int32)],
+    'adoption': [('tile', np.int32), ('old', np.int32), ('new', np.int32)],
+    'mutation': [('tile', np.int32), ('old', np.int32), ('new', np.int32)],
+}
+
+_DTYPES = {kind: np.dtype([('step', np.int32)] + columns)
+           for kind, columns in EVENT_TYPES.items()}
+
+
+class EventLog(object):
+    """
+    A log of typed events buffered in preallocated record arrays. Each type
+    of event has its own buffer, when a buffer is full it is flushed as a
+    chunk, either to disk or to a list of chunks held in memory.
+
+    On disk the log is a directory holding one raw binary file per column of
+    each event type, named "<type>.<column>", to which chunks are appended.
+    Columns can be read on their own, or memory mapped, after a run with
+    read_event_log.
+
+    The event types and their columns are given by EVENT_TYPES, tiles are
+    identified by their index in the world, polities by their id and
+    paradigms by their row of the world's paradigm table. Rows are reused, so
+    a paradigm row identifies a paradigm only between the events which
+    create and abandon it.
+
+    Args:
+        path (str, default=None): The directory to write the log to, created
+            if it does not exist. Existing logs in the directory are
+            overwritten. If None the log is kept in memory.
+        chunk_size (int, default=65536): The number of events of each type
+            buffered before they are flushed.
+
+    Attributes:
+        path (str): The directory the log is written to, None if the log is
+            kept in memory.
+        chunk_size (int): The number of events of each type buffered before
+            they are flushed.
+        step (int): The step recorded with new events, set by the world at
+            the start of each step.
+    """
+    def __init__(self, path=None, chunk_size=65536):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.step = 0
+        self._buffers = {kind: np.zeros(chunk_size, dtype=dtype)
+                         for kind, dtype in _DTYPES.items()}
+        self._counts = dict.fromkeys(_DTYPES, 0)
+        self._flushed = dict.fromkeys(_DTYPES, 0)
+        self._chunks = {kind: [] for kind in _DTYPES}
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+            for kind, dtype in _DTYPES.items():
+                for column in dtype.names:
+                    open(_column_file(path, kind, column), 'wb').close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
+
+    def __len__(self):
+        """
+        The number of events recorded.
+        """
+        return sum(self._flushed.values()) + sum(self._counts.values())
+
+    def record(self, kind, *values):
+        """
+        Record a single event at the current step.
+
+        Args:
+            kind (str): The type of event, a key of EVENT_TYPES.
+            *values: The value of each column of the event type, excluding
+                the step.
+        """
+        count = self._counts[kind]
+        self._buffers[kind][count] = (self.step,) + values
+        self._counts[kind] = count + 1
+        if count + 1 == self.chunk_size:
+            self._flush(kind)
+
+    def extend(self, kind, *columns):
+        """
+        Record a number of events of the same type at the current step.
+
+        Args:
+            kind (str): The type of event, a key of EVENT_TYPES.
+            *columns (array_like): The values of each column of the event
+                type, excluding the step, one element per event.
+        """
+        number = len(columns[0])
+        names = _DTYPES[kind].names[1:]
+        start = 0
+        while start < number:
+            count = self._counts[kind]
+            end = min(number, start + self.chunk_size - count)
+            buffer = self._buffers[kind][count:count+end-start]
+            buffer['step'] = self.step
+            for name, column in zip(names, columns):
+                buffer[name] = column[start:end]
+            self._counts[kind] = count + end - start
+            if self._counts[kind] == self.chunk_size:
+                self._flush(kind)
+            start = end
+
+    def _flush(self, kind):
+        """
+        Write the buffered events of one type as a chunk and empty the
+        buffer.
+        """
+        count = self._counts[kind]
+        if count == 0:
+            return
+        chunk = self._buffers[kind][:count]
+        if self.path is None:
+            self._chunks[kind].append(chunk.copy())
+        else:
+            for column in chunk.dtype.names:
+                with open(_column_file(self.path, kind, column), 'ab') as f:
+                    np.ascontiguousarray(chunk[column]).tofile(f)
+        self._flushed[kind] += count
+        self._counts[kind] = 0
+
+    def flush(self):
+        """
+        Flush the buffered events of every type.
+        """
+        for kind in _DTYPES:
+            self._flush(kind)
+
+    def events(self, kind):
+        """
+        All events of one type recorded so far.
+
+        Args:
+            kind (str): The type of event, a key of EVENT_TYPES.
+
+        Returns:
+            (numpy Array): A record array of the events in the order they
+                were recorded, with a field for the step and each column of
+                the event type.
+        """
+        if self.path is None:
+            chunks = self._chunks[kind]
+        else:
+            chunks = [read_event_log(self.path, kind)]
+        return np.concatenate(
+            chunks + [self._buffers[kind][:self._counts[kind]]])
+
+
+def _column_file(path, kind, column):
+    return os.path.join(path, '{}.{}'.format(kind, column))
+
+
+def read_event_log(path, kind, columns=None, mmap=False):
+    """
+    Read the events of one type from a log written to disk.
+
+    Args:
+        path (str): The directory of the log.
+        kind (str): The type of event, a key of EVENT_TYPES.
+        columns (list[str], default=None): The columns to read, by default
+            the step and every column of the event type.
+        mmap (bool, default=False): Whether to memory map the columns rather
+            than reading them.
+
+    Returns:
+        (numpy Array or dict): If columns is None a record array of the
+            events, otherwise a dictionary of arrays keyed by column.
+    """
+    dtype = _DTYPES[kind]
+    names = dtype.names if columns is None else columns
+    arrays = {}
+    for name in names:
+        filename = _column_file(path, kind, name)
+        if mmap and os.path.getsize(filename):
+            arrays[name] = np.memmap(filename, dtype=dtype[name], mode='r')
+        else:
+            arrays[name] = np.fromfile(filename, dtype=dtype[name])
+    if columns is not None:
+        return arrays
+    events = np.zeros(len(arrays['step']), dtype=dtype)
+    for name in names:
+        events[name] = arrays[name]
+    return events
@@ -0,0 +1,208 @@
+"""
+Streaming accumulators of the sizes of polities and battles.
+"""
+import json
+import numpy as np
+
+
+class SizeHistogram(object):
+    """
+    An exact histogram of non-negative integer sizes, such as polity or
+    battle sizes, accumulated as a simulation runs. Memory is fixed by the
+    largest size seen rather than the number of sizes recorded.
+
+    Optionally a reservoir sample of the individual sizes is kept, a uniform
+    random sample of fixed size of all sizes recorded.
+
+    Args:
+        sample_size (int, default=0): The size of the reservoir sample, if
+            zero no sample is kept.
+        seed (int, SeedSequence or numpy Generator, default=None): The seed
+            of the generator used for the reservoir sample. It is independent
+            of the random streams of the simulation.
+
+    Attributes:
+        counts (numpy Array): The number of times each size has been
+            recorded, indexed by size.
+        sample_size (int): The size of the reservoir sample.
+        sample (numpy Array): The reservoir sample, which has fewer than
+            sample_size elements until sample_size sizes are recorded.
+    """
+    def __init__(self, sample_size=0, seed=None):
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.sample_size = sample_size
+        self.sample = np.zeros(0, dtype=np.int64)
+        self._rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        """
+        The number of sizes recorded.
+        """
+        return int(self.counts.sum())
+
+    def add(self, sizes):
+        """
+        Record a size or an array of sizes.
+
+        Args:
+            sizes (int or array_like): The sizes to record.
+        """
+        sizes = np.atleast_1d(np.asarray(sizes, dtype=np.int64))
+        if len(sizes) == 0:
+            return
+        seen = len(self)
+        counts = np.bincount(sizes, minlength=len(self.counts))
+        counts[:len(self.counts)] += self.counts
+        self.counts = counts
+        if self.sample_size:
+            self._add_to_sample(sizes, seen)
+
+    def _add_to_sample(self, sizes, seen):
+        """
+        Add sizes to the reservoir sample, following algorithm R where the
+        i'th size recorded replaces a random element of the sample with
+        probability sample_size/i.
+        """
+        free = self.sample_size - len(self.sample)
+        if free > 0:
+            self.sample = np.concatenate([self.sample, sizes[:free]])
+            sizes = sizes[free:]
+            seen += free
+        if len(sizes) == 0:
+            return
+        slots = self._rng.integers(0, seen + 1 + np.arange(len(sizes)))
+        kept = slots < self.sample_size
+        # Later sizes overwrite earlier ones given the same slot, as they
+        # would if added one at a time
+        self.sample[slots[kept]] = sizes[kept]
+
+    def clear(self):
+        """
+        Forget all recorded sizes.
+        """
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.sample = np.zeros(0, dtype=np.int64)
+
+    def sizes(self):
+        """
+        The distinct sizes recorded and how often each was recorded.
+
+        Returns:
+            (tuple): A tuple of the form (sizes, counts) of numpy arrays in
+                increasing order of size.
+        """
+        sizes = np.flatnonzero(self.counts)
+        return sizes, self.counts[sizes]
+
+    def to_list(self):
+        """
+        Expand the histogram into a list of every size recorded, in
+        increasing order.
+
+        Returns:
+            (list[int]): The sizes.
+        """
+        sizes, counts = self.sizes()
+        return np.repeat(sizes, counts).tolist()
+
+    def log_binned(self, bin_multiplier=2):
+        """
+        The probability density of the positive sizes in logarithmic bins.
+        The first bin starts at the smallest positive size and each bin edge
+        is bin_multiplier times the previous one, as in
+        analysis.logLogHistogramOut.
+
+        Args:
+            bin_multiplier (float, default=2): The ratio of consecutive bin
+                edges.
+
+        Returns:
+            (tuple): A tuple of the form (edges, density) of numpy arrays,
+                edges has one more element than density. Both are empty if
+                no positive sizes have been recorded.
+        """
+        sizes, counts = self.sizes()
+        positive = sizes > 0
+        sizes, counts = sizes[positive], counts[positive]
+        if len(sizes) == 0:
+            return np.zeros(0), np.zeros(0)
+        edges = [float(sizes[0])]
+        while edges[-1] < sizes[-1]:
+            edges.append(edges[-1]*bin_multiplier)
+        if len(edges) == 1:
+            edges.append(edges[0]*bin_multiplier)
+        density, edges = np.histogram(sizes, bins=edges, weights=counts,
+                                      density=True)
+        return edges, density
+
+    def merge(self, other):
+        """
+        Combine the sizes recorded by another histogram, for example from
+        another run of an ensemble, into this histogram.
+
+        The reservoir samples are merged so the result is a uniform sample of
+        the sizes recorded by both histograms.
+
+        Args:
+            other (SizeHistogram): The histogram to merge.
+
+        Returns:
+            (SizeHistogram): This histogram.
+        """
+        seen, other_seen = len(self), len(other)
+        if len(other.counts) > len(self.counts):
+            counts = other.counts.copy()
+            counts[:len(self.counts)] += self.counts
+        else:
+            counts = self.counts.copy()
+            counts[:len(other.counts)] += other.counts
+        self.counts = counts
+
+        if self.sample_size:
+            self.sample = self._merge_samples(seen, other.sample, other_seen)
+        return self
+
+    def _merge_samples(self, seen, other_sample, other_seen):
+        """
+        Draw a sample from the union of two samples, taking from each in
+        proportion to the number of sizes it represents.
+        """
+        total = seen + other_seen
+        if total <= self.sample_size:
+            return np.concatenate([self.sample, other_sample])
+        size = min(self.sample_size, len(self.sample) + len(other_sample))
+        from_self = self._rng.hypergeometric(seen, other_seen, size)
+        from_self = min(max(from_self, size - len(other_sample)),
+                        len(self.sample))
+        return np.concatenate([
+            self._rng.choice(self.sample, from_self, replace=False),
+            self._rng.choice(other_sample, size - from_self, replace=False)])
+
+    def get_state(self, name):
+        """
+        Collect the state of the histogram as arrays.
+
+        Args:
+            name (str): The prefix of the array names.
+
+        Returns:
+            (dict): Arrays describing the histogram, keyed by
+                "<name>_counts", "<name>_sample" and "<name>_rng_state".
+        """
+        return {name+'_counts': self.counts,
+                name+'_sample': self.sample,
+                name+'_rng_state': np.array(
+                    json.dumps(self._rng.bit_generator.state))}
+
+    def set_state(self, name, arrays):
+        """
+        Restore the state of the histogram from get_state.
+
+        Args:
+            name (str): The prefix of the array names.
+            arrays (dict): The arrays returned by get_state.
+        """
+        self.counts = np.asarray(arrays[name+'_counts'], dtype=np.int64)
+        self.sample = np.asarray(arrays[name+'_sample'], dtype=np.int64)
+        self._rng.bit_generator.state = json.loads(
+            str(arrays[name+'_rng_state']))
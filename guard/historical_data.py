@@ -0,0 +1,214 @@
+"""
+Reading historical cities and battles data from YAML files, and the compiled
+binary cache of these datasets.
+"""
+from .compiled_data import file_hash, read_compiled, write_compiled
+from .daterange import InvalidDateRange
+from collections import namedtuple
+import numpy as np
+import yaml
+
+"""
+Historical cities as arrays with one element per city. eras are the date
+range labels of the population data and population has one row per city and
+one column per era, NaN where a city has no population for an era.
+"""
+CitiesData = namedtuple('CitiesData', ['name', 'x', 'y', 'eras',
+                                       'population'])
+
+"""
+Historical battles as arrays with one element per battle, in order of year.
+"""
+BattlesData = namedtuple('BattlesData', ['x', 'y', 'year'])
+
+# Version of the compiled data format, compiled data of other versions is
+# rebuilt
+_FORMAT_VERSION = 1
+
+
+def compiled_data_path(yaml_file):
+    """
+    The path of the compiled data of a YAML data file.
+
+    Args:
+        yaml_file (str): Path to the YAML data file.
+
+    Returns:
+        (str): The path of the compiled data.
+    """
+    return str(yaml_file) + '.npz'
+
+
+def parse_cities(yaml_file):
+    """
+    Parse a YAML historical cities file into arrays.
+
+    Args:
+        yaml_file (str): Path to the cities YAML file.
+
+    Returns:
+        (CitiesData): The cities.
+    """
+    with open(yaml_file, 'r') as infile:
+        cities = yaml.load(infile, Loader=yaml.FullLoader)
+
+    eras = sorted({str(era) for city in cities for era in city['population']})
+    column = {era: i for i, era in enumerate(eras)}
+    population = np.full([len(cities), len(eras)], np.nan)
+    for i, city in enumerate(cities):
+        for era, value in city['population'].items():
+            population[i, column[str(era)]] = value
+
+    return CitiesData(np.array([str(city.get('city')) for city in cities]),
+                      np.array([city['x'] for city in cities], dtype=int),
+                      np.array([city['y'] for city in cities], dtype=int),
+                      np.array(eras), population)
+
+
+def parse_battles(yaml_file):
+    """
+    Parse a YAML historical battles file into arrays.
+
+    Args:
+        yaml_file (str): Path to the battles YAML file.
+
+    Returns:
+        (BattlesData): The battles.
+    """
+    with open(yaml_file, 'r') as infile:
+        battles = yaml.load(infile, Loader=yaml.FullLoader)
+
+    year = np.array([battle['year'] for battle in battles], dtype=int)
+    order = np.argsort(year, kind='stable')
+    return BattlesData(
+        np.array([battle['x'] for battle in battles], dtype=int)[order],
+        np.array([battle['y'] for battle in battles], dtype=int)[order],
+        year[order])
+
+
+def _load(yaml_file, parse, data_type, cache):
+    """
+    Load a dataset from its compiled data if it was compiled from the current
+    contents of the YAML file, otherwise parse and, if possible, compile it.
+    """
+    if not cache:
+        return parse(yaml_file)
+
+    compiled_file = compiled_data_path(yaml_file)
+    digest = file_hash(yaml_file)
+    compiled = read_compiled(compiled_file, _FORMAT_VERSION, digest,
+                             data_type._fields)
+    if compiled is not None:
+        return data_type(**compiled)
+
+    data = parse(yaml_file)
+    try:
+        write_compiled(compiled_file, _FORMAT_VERSION, digest,
+                       data._asdict())
+    except OSError:
+        # The compiled data can't be written, e.g. a read only directory
+        pass
+    return data
+
+
+def load_cities(yaml_file, cache=True):
+    """
+    Load historical cities data, using the compiled data if it was compiled
+    from the current contents of the YAML file.
+
+    Args:
+        yaml_file (str): Path to the cities YAML file.
+        cache (bool, default=True): Whether to use and write the compiled
+            data.
+
+    Returns:
+        (CitiesData): The cities.
+    """
+    return _load(yaml_file, parse_cities, CitiesData, cache)
+
+
+def load_battles(yaml_file, cache=True):
+    """
+    Load historical battles data, using the compiled data if it was compiled
+    from the current contents of the YAML file.
+
+    Args:
+        yaml_file (str): Path to the battles YAML file.
+        cache (bool, default=True): Whether to use and write the compiled
+            data.
+
+    Returns:
+        (BattlesData): The battles.
+    """
+    return _load(yaml_file, parse_battles, BattlesData, cache)
+
+
+def _tiles(x, y, xdim, ydim):
+    """
+    The flat index in a (xdim,ydim) grid of each coordinate. Negative
+    coordinates count from the end of the map, as when indexing the grid.
+    """
+    return np.where(x < 0, x + xdim, x)*ydim + np.where(y < 0, y + ydim, y)
+
+
+def population_grids(cities, date_ranges, xdim, ydim):
+    """
+    Sum the populations of the cities in each tile for a set of eras.
+
+    Args:
+        cities (CitiesData): The cities.
+        date_ranges (list[DateRange]): The eras, each must be one of the eras
+            of the cities data.
+        xdim (int): The x dimension of the map.
+        ydim (int): The y dimension of the map.
+
+    Returns:
+        (dict): The population of each tile as an array of shape (xdim,ydim),
+            keyed by date range.
+
+    Raises:
+        (InvalidDateRange): Raised if a city has no population for one of
+            the eras.
+    """
+    tiles = _tiles(cities.x, cities.y, xdim, ydim)
+    eras = cities.eras.tolist()
+    grids = {}
+    for era in date_ranges:
+        if str(era) in eras:
+            population = cities.population[:, eras.index(str(era))]
+            missing = np.flatnonzero(np.isnan(population))
+        else:
+            population = np.zeros(len(tiles))
+            missing = np.arange(len(tiles))
+        if len(missing):
+            raise InvalidDateRange(
+                "Date range {} not in city data\n\t{}".format(
+                    era, cities.name[missing[0]]))
+        grids[era] = np.bincount(tiles, weights=population,
+                                 minlength=xdim*ydim).reshape(xdim, ydim)
+    return grids
+
+
+def battle_grids(battles, date_ranges, xdim, ydim):
+    """
+    Count the battles in each tile for a set of eras.
+
+    Args:
+        battles (BattlesData): The battles.
+        date_ranges (list[DateRange]): The eras.
+        xdim (int): The x dimension of the map.
+        ydim (int): The y dimension of the map.
+
+    Returns:
+        (dict): The number of battles in each tile as an array of shape
+            (xdim,ydim), keyed by date range.
+    """
+    tiles = _tiles(battles.x, battles.y, xdim, ydim)
+    grids = {}
+    for era in date_ranges:
+        # Battles are in order of year, those within an era are a slice
+        start, end = np.searchsorted(battles.year,
+                                     [era.start_year, era.end_year])
+        counts = np.bincount(tiles[start:end], minlength=xdim*ydim)
+        grids[era] = counts.reshape(xdim, ydim).astype(float)
+    return grids
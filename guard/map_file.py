@@ -0,0 +1,187 @@
+"""
+Reading world maps from YAML files, and the compiled binary map cache.
+"""
+from . import terrain, period
+from .compiled_data import file_hash, read_compiled, write_compiled
+from collections import namedtuple
+import numpy as np
+import yaml
+
+"""
+Terrain and agricultural period names used in map files
+"""
+TERRAIN_NAMES = {'agriculture': terrain.agriculture,
+                 'steppe': terrain.steppe,
+                 'desert': terrain.desert,
+                 'sea': terrain.sea}
+PERIOD_NAMES = {'agri1': period.agri1,
+                'agri2': period.agri2,
+                'agri3': period.agri3}
+
+"""
+A map as arrays with one element per tile, in the order of World.tiles.
+terrain_codes and period_codes are positions in terrain.TERRAINS and
+period.PERIODS, elevation is in kilometres.
+"""
+MapData = namedtuple('MapData', ['xdim', 'ydim', 'terrain_codes',
+                                 'elevation', 'period_codes'])
+
+# Version of the compiled map format, compiled maps of other versions are
+# rebuilt
+_FORMAT_VERSION = 1
+
+
+def read_map_file(yaml_file):
+    """
+    Read the definition of a map from a YAML file.
+
+    Args:
+        yaml_file (str): Path to the file containing a YAML definition of the
+            world.
+
+    Returns:
+        (tuple): A tuple of the form (xdim, ydim, communities) where
+            communities is the list of community definitions in the file.
+
+    Raises:
+        (MissingYamlKey): Raised if a required key is not present in the YAML
+            file.
+    """
+    with open(yaml_file, 'r') as infile:
+        world_data = yaml.load(infile, Loader=yaml.FullLoader)
+    try:
+        xdim = world_data['xdim']
+    except KeyError:
+        raise MissingYamlKey('xdim', yaml_file)
+    try:
+        ydim = world_data['ydim']
+    except KeyError:
+        raise MissingYamlKey('ydim', yaml_file)
+    try:
+        community_data = world_data['communities']
+    except KeyError:
+        raise MissingYamlKey('communities', yaml_file)
+
+    return xdim, ydim, community_data
+
+
+def compiled_map_path(yaml_file):
+    """
+    The path of the compiled map of a YAML map file.
+
+    Args:
+        yaml_file (str): Path to the YAML map file.
+
+    Returns:
+        (str): The path of the compiled map.
+    """
+    return str(yaml_file) + '.npz'
+
+
+def parse_map(yaml_file):
+    """
+    Parse a YAML map file into arrays.
+
+    Args:
+        yaml_file (str): Path to the YAML map file.
+
+    Returns:
+        (MapData): The map.
+
+    Raises:
+        (MissingYamlKey): Raised if a required key is not present in the YAML
+            file.
+        (ValueError): Raised if the file does not define every tile.
+    """
+    xdim, ydim, community_data = read_map_file(yaml_file)
+
+    total_tiles = xdim*ydim
+    terrain_codes = np.full(total_tiles, -1, dtype=np.int8)
+    elevation = np.zeros(total_tiles)
+    period_codes = np.zeros(total_tiles, dtype=np.int8)
+    for community in community_data:
+        i = community['x'] + community['y']*xdim
+
+        assert community['terrain'] in TERRAIN_NAMES
+        landscape = TERRAIN_NAMES[community['terrain']]
+        terrain_codes[i] = terrain.TERRAINS.index(landscape)
+
+        if landscape.polity_forming:
+            elevation[i] = community['elevation'] / 1000.
+            period_codes[i] = period.PERIODS.index(
+                PERIOD_NAMES[community['activeFrom']])
+
+    if np.any(terrain_codes < 0):
+        raise ValueError('{} defines {} of {} tiles'.format(
+            yaml_file, np.count_nonzero(terrain_codes >= 0), total_tiles))
+
+    return MapData(xdim, ydim, terrain_codes, elevation, period_codes)
+
+
+def compile_map(yaml_file, compiled_file=None):
+    """
+    Parse a YAML map file and write it to a compiled binary map, tagged with
+    the hash of the YAML file.
+
+    Args:
+        yaml_file (str): Path to the YAML map file.
+        compiled_file (str, default=None): Path of the compiled map. If None
+            the path given by compiled_map_path is used.
+
+    Returns:
+        (MapData): The map.
+    """
+    if compiled_file is None:
+        compiled_file = compiled_map_path(yaml_file)
+    digest = file_hash(yaml_file)
+    map_data = parse_map(yaml_file)
+    write_compiled(compiled_file, _FORMAT_VERSION, digest,
+                   map_data._asdict())
+    return map_data
+
+
+def load_map(yaml_file, cache=True):
+    """
+    Load a map, using its compiled binary map if it was compiled from the
+    current contents of the YAML file. Otherwise the YAML file is parsed and,
+    if possible, compiled for next time.
+
+    Args:
+        yaml_file (str): Path to the YAML map file.
+        cache (bool, default=True): Whether to use and write the compiled
+            map.
+
+    Returns:
+        (MapData): The map.
+
+    Raises:
+        (MissingYamlKey): Raised if a required key is not present in the YAML
+            file.
+    """
+    if not cache:
+        return parse_map(yaml_file)
+
+    compiled_file = compiled_map_path(yaml_file)
+    compiled = read_compiled(compiled_file, _FORMAT_VERSION,
+                             file_hash(yaml_file), MapData._fields)
+    if compiled is not None:
+        return MapData(int(compiled['xdim']), int(compiled['ydim']),
+                       compiled['terrain_codes'], compiled['elevation'],
+                       compiled['period_codes'])
+
+    try:
+        return compile_map(yaml_file, compiled_file)
+    except OSError:
+        # The compiled map can't be written, e.g. a read only directory
+        return parse_map(yaml_file)
+
+
+class MissingYamlKey(Exception):
+    """
+    Exception raised when a necessary key is missing from the world YAML file.
+    """
+    def __init__(self, key, filename):
+        super().__init__(
+            'Required key "{}" missing from the world definition'
+            ' file "{}".'.format(key, filename)
+            )
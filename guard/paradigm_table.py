@@ -0,0 +1,217 @@
+"""
+Paradigm table module, the Leviathan paradigms of a world as rows of arrays.
+"""
+from .random_stream import default_stream
+import numpy as np
+
+
+class ParadigmTable(object):
+    """
+    A table of Leviathan paradigms where each paradigm is a row of the rule
+    and expectation arrays.
+
+    The table is used directly by ArrayWorld and through Paradigm objects by
+    World, which keeps the expectations of each paradigm on the object as they
+    are read on every comparison. Free rows are kept in a free list and reused
+    when new paradigms are created. Both engines free the row of a paradigm
+    once it has no followers and is no longer offered to any community, as
+    paradigms without followers may still be adopted by the communities they
+    are offered to.
+
+    Args:
+        n_rules (int): The number of land use rules of each paradigm.
+        capacity (int, default=0): The initial number of rows.
+        rng (RandomStream, default=random_stream.default_stream): The random
+            stream used to create and mutate paradigms.
+
+    Attributes:
+        n_rules (int): The number of land use rules of each paradigm.
+        yield_rules (numpy Array): The yield of each land use rule, one row
+            per paradigm.
+        depletion_rules (numpy Array): The depletion rate of each land use
+            rule, one row per paradigm.
+        expectations (numpy Array): The expected returns of each paradigm.
+        latitude (numpy Array): The latitude (y coordinate) each paradigm was
+            created at.
+        origin (numpy Array): The tile which created each paradigm.
+        followers (numpy Array): The number of tiles following each paradigm.
+    """
+    def __init__(self, n_rules, capacity=0, rng=default_stream):
+        self.n_rules = n_rules
+        self.rng = rng
+        self.yield_rules = np.zeros([capacity, n_rules])
+        self.depletion_rules = np.zeros([capacity, n_rules])
+        self.expectations = np.zeros(capacity)
+        self.latitude = np.zeros(capacity)
+        self.origin = np.zeros(capacity, dtype=int)
+        self.followers = np.zeros(capacity, dtype=int)
+        # Free rows, the last is used first
+        self._free = list(range(capacity-1, -1, -1))
+
+    def __len__(self):
+        """
+        The number of paradigms with at least one follower.
+        """
+        return np.count_nonzero(self.followers)
+
+    def _grow(self, capacity):
+        """
+        Extend all arrays to hold at least capacity rows.
+        """
+        old_capacity = len(self.followers)
+        extra = capacity - old_capacity
+        self.yield_rules = np.concatenate(
+            [self.yield_rules, np.zeros([extra, self.n_rules])])
+        self.depletion_rules = np.concatenate(
+            [self.depletion_rules, np.zeros([extra, self.n_rules])])
+        self.expectations = np.concatenate([self.expectations,
+                                            np.zeros(extra)])
+        self.latitude = np.concatenate([self.latitude, np.zeros(extra)])
+        self.origin = np.concatenate([self.origin,
+                                      np.zeros(extra, dtype=int)])
+        self.followers = np.concatenate([self.followers,
+                                         np.zeros(extra, dtype=int)])
+        self._free.extend(range(capacity-1, old_capacity-1, -1))
+
+    def _allocate(self, number):
+        """
+        Take free rows for a number of new paradigms, each of which is given
+        one follower.
+        """
+        if len(self._free) < number:
+            capacity = len(self.followers)
+            self._grow(max(2*capacity,
+                           capacity + number - len(self._free)))
+        start = len(self._free) - number
+        rows = np.array(self._free[start:][::-1], dtype=int)
+        del self._free[start:]
+        self.followers[rows] = 1
+        return rows
+
+    def allocate(self):
+        """
+        Take a free row for a single new paradigm with no followers.
+
+        Returns:
+            (int): The row of the new paradigm.
+
+        Notes:
+            The table's arrays are replaced when it grows, so views of rows
+            taken before allocating may no longer belong to the table.
+        """
+        if not self._free:
+            self._grow(max(2*len(self.followers), 1))
+        return self._free.pop()
+
+    def release(self, row):
+        """
+        Free the row of a paradigm so it can be reused.
+
+        Args:
+            row (int): The row of the paradigm.
+        """
+        self.followers[row] = 0
+        self._free.append(row)
+
+    def clear(self):
+        """
+        Remove all paradigms.
+        """
+        self.followers[:] = 0
+        self._free = list(range(len(self.followers)-1, -1, -1))
+
+    def free_rows(self):
+        """
+        The stack of rows which are free for reuse, the last row is reused
+        first.
+
+        Returns:
+            (list[int]): The free rows.
+        """
+        return list(self._free)
+
+    def restore(self, arrays, free_rows):
+        """
+        Replace the contents of the table, used when restoring a checkpoint.
+
+        Args:
+            arrays (dict): The yield_rules, depletion_rules, expectations,
+                latitude, origin and followers arrays of the table.
+            free_rows (list[int]): The stack of free rows.
+        """
+        for name, array in arrays.items():
+            setattr(self, name, array)
+        self.n_rules = self.yield_rules.shape[1]
+        self._free = list(free_rows)
+
+    def new(self, tiles):
+        """
+        Create a new paradigm, with no land use rules, for each of a set of
+        tiles.
+
+        Args:
+            tiles (numpy Array): The tiles creating the paradigms.
+
+        Returns:
+            (numpy Array): The rows of the new paradigms.
+        """
+        rows = self._allocate(len(tiles))
+        self.yield_rules[rows] = 0
+        self.depletion_rules[rows] = 0
+        self.expectations[rows] = self.rng.block(len(tiles))*100
+        self.latitude[rows] = 0
+        self.origin[rows] = tiles
+        return rows
+
+    def mutate(self, parents, tiles, latitude, mut_amount):
+        """
+        Create mutated copies of a set of paradigms.
+
+        Args:
+            parents (numpy Array): The rows of the paradigms to mutate.
+            tiles (numpy Array): The tiles creating the new paradigms.
+            latitude (numpy Array): The latitude of the tiles.
+            mut_amount (int): The number of rules to mutate.
+
+        Returns:
+            (numpy Array): The rows of the new paradigms.
+
+        Notes:
+            The rules of the parents are copied, so the parent paradigms are
+            unchanged.
+        """
+        number = len(parents)
+        rows = self._allocate(number)
+        self.yield_rules[rows] = self.yield_rules[parents]
+        self.depletion_rules[rows] = self.depletion_rules[parents]
+        self.expectations[rows] = self.expectations[parents]
+        self.latitude[rows] = latitude
+        self.origin[rows] = tiles
+
+        for i in range(mut_amount):
+            rules = self.rng.integers(self.n_rules, number)
+            self.depletion_rules[rows, rules] = (
+                (self.rng.block(number)*1.5) - 1) * .01
+            self.yield_rules[rows, rules] = self.rng.block(number)
+
+        return rows
+
+    def switch(self, old, new, offered=None):
+        """
+        Move followers from one set of paradigms to another. The rows of
+        paradigms left without followers are freed, unless they are still
+        offered to communities, which may yet adopt them.
+
+        Args:
+            old (numpy Array): The rows of the paradigms being abandoned.
+            new (numpy Array): The rows of the paradigms being adopted.
+            offered (numpy Array, default=None): The rows of the paradigms
+                currently offered, -1 for no offer.
+        """
+        old = np.asarray(old, dtype=int)
+        np.subtract.at(self.followers, old, 1)
+        np.add.at(self.followers, np.asarray(new, dtype=int), 1)
+        freed = np.unique(old[self.followers[old] == 0])
+        if offered is not None and len(freed):
+            freed = freed[~np.isin(freed, offered)]
+        self._free.extend(freed.tolist())
@@ -77,6 +77,11 @@ _default_parameters = {
         'lat_mod': 10,#2 org"
         # yields multiplier
         'mult': 10,#2 org
+        # number of land-use rules of each paradigm
+        'n_land_use_rules': 10,
+        # number of distinct paradigms a community can be offered between
+        # its responses
+        'max_counter_paradigms': 16,
         
         #Testing parameters
         'mil_spread': False,#False # attempt spread military tech with paradigms
@@ -41,3 +41,9 @@ agri2 = Period(900)
 Agricultural from 700CE
 """
 agri3 = Period(1100)
+
+"""
+All agricultural periods, a period's position in this tuple is used as its
+integer code
+"""
+PERIODS = (agri1, agri2, agri3)
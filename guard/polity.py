@@ -1,7 +1,8 @@
 """
 Polity Module.
 """
-import random as rnd #LEV
+import numpy as np
+
 
 class Polity(object):
     """
@@ -10,17 +11,34 @@ class Polity(object):
     Args:
         communities (list[Community]): A list of communities which belong to
             the polity.
+        register (PolityRegister, default=None): The register of the world
+            the polity belongs to. If None the polity is not given an id.
 
     Attributes:
         communities (list[Community]): A list of communities which belong to
-            the polity.
+            the polity. The order of the list is not preserved when
+            communities are removed.
+        trait_total (int): The running total of ultrasocietal traits of the
+            communities of the polity.
+        id (int): The integer id of the polity in its register, None if the
+            polity is not registered.
     """
-    def __init__(self, communities):
+    __slots__ = ('communities', 'register', 'id', 'trait_total', 'max_size')
+
+    def __init__(self, communities, register=None):
         self.communities = communities
-        for community in communities:
+        self.register = register
+        self.id = None
+        if register is not None:
+            self.id = register.add(self)
+
+        self.trait_total = 0
+        for index, community in enumerate(communities):
             community.assign_to_polity(self)
-            
-        self.name = rnd.random() #LEV
+            community.polity_index = index
+            self.trait_total += community.total_ultrasocietal_traits()
+            self._label(community, self.id)
+
         self.max_size = 0 #LEV
 
     def __str__(self):
@@ -48,7 +66,10 @@ class Polity(object):
             already belongs to a polity. It is only used in testing.
         """
         community.assign_to_polity(self)
+        community.polity_index = len(self.communities)
         self.communities.append(community)
+        self.trait_total += community.total_ultrasocietal_traits()
+        self._label(community, self.id)
 
     def remove_community(self, community):
         """
@@ -58,7 +79,24 @@ class Polity(object):
             community (Community): The community to remove.
         """
         community.assign_to_polity(None)
-        self.communities.remove(community)
+        # Swap the last community into the removed community's place
+        last = self.communities.pop()
+        if last is not community:
+            self.communities[community.polity_index] = last
+            last.polity_index = community.polity_index
+        community.polity_index = None
+        self.trait_total -= community.total_ultrasocietal_traits()
+        self._label(community, -1)
+
+        if self.register is not None and len(self.communities) == 0:
+            self.register.emptied(self)
+
+    def _label(self, community, label):
+        """
+        Record the polity a community belongs to in the register.
+        """
+        if self.register is not None and community.index is not None:
+            self.register.labels[community.index] = label
 
     def transfer_community(self, community):
         """
@@ -78,10 +116,24 @@ class Polity(object):
             (list[Polity]): A list of new, single-community polities created
                 from the distintegration of the polity.
         """
-        new_polities = [Polity([tile]) for tile in self.communities]
+        new_polities = [Polity([tile], self.register)
+                        for tile in self.communities]
         self.communities = []
+        self.trait_total = 0
+        if self.register is not None:
+            self.register.emptied(self)
         return new_polities
 
+    def change_traits(self, change):
+        """
+        Update the running total of ultrasocietal traits when those of a
+        member community change.
+
+        Args:
+            change (int): The change in the number of traits.
+        """
+        self.trait_total += change
+
     def size(self):
         """
         Determine the size of the polity (in communities).
@@ -99,10 +151,7 @@ class Polity(object):
         Returns:
             (float): The number number of ultrasocietal traits.
         """
-        return sum(
-            [community.total_ultrasocietal_traits()
-             for community in self.communities]
-            ) / self.size()
+        return self.trait_total / self.size()
 
     def attack_power(self, params):
         """
@@ -118,10 +167,11 @@ class Polity(object):
             The attack power is the mean number of ultrasocietal traits in the
             communities of the polity, multiplied by the size of the polity.
             Here the size of the polity is omitted in the mean and
-            multiplication to save calculation time.
+            multiplication to save calculation time. The total number of
+            traits is maintained as communities join and leave the polity and
+            gain or loose traits, so this takes constant time.
         """
-        power = sum([community.total_ultrasocietal_traits()
-                     for community in self.communities])
+        power = self.trait_total
         power *= params.ultrasocietal_attack_coefficient
         power += 1.
         return power
@@ -153,3 +203,122 @@ class Polity(object):
         """
         for community in self.communities:
             community.cultural_shift(params)
+
+
+class PolityRegister(object):
+    """
+    A register of the polities of a world.
+
+    Each polity is given a stable integer id, and the id of the polity each
+    tile belongs to is recorded in a label array. The id of a polity which
+    has lost all of its communities is freed for reuse when the register is
+    pruned.
+
+    Args:
+        total_tiles (int): The number of tiles in the world.
+
+    Attributes:
+        labels (numpy Array): The id of the polity each tile belongs to, in
+            the same order as World.tiles. Tiles which do not belong to a
+            polity have the label -1.
+    """
+    __slots__ = ('labels', '_polities', '_free_ids', '_empty')
+
+    def __init__(self, total_tiles):
+        self.labels = np.full(total_tiles, -1)
+        self._polities = []
+        self._free_ids = []
+        self._empty = []
+
+    def __getitem__(self, polity_id):
+        """
+        The polity with a given id.
+        """
+        return self._polities[polity_id]
+
+    def __len__(self):
+        """
+        The number of ids, including those not currently used. Ids are in the
+        range [0, len(register)).
+        """
+        return len(self._polities)
+
+    def add(self, polity):
+        """
+        Register a polity.
+
+        Args:
+            polity (Polity): The polity to register.
+
+        Returns:
+            (int): The id of the polity.
+        """
+        if self._free_ids:
+            polity_id = self._free_ids.pop()
+            self._polities[polity_id] = polity
+        else:
+            polity_id = len(self._polities)
+            self._polities.append(polity)
+        return polity_id
+
+    def emptied(self, polity):
+        """
+        Record that a polity has lost all of its communities.
+
+        Args:
+            polity (Polity): The empty polity.
+        """
+        self._empty.append(polity)
+
+    def prune(self):
+        """
+        Free the ids of polities which have been emptied, unless they have
+        since gained communities.
+        """
+        for polity in self._empty:
+            if polity.size() == 0 and self._polities[polity.id] is polity:
+                self._polities[polity.id] = None
+                self._free_ids.append(polity.id)
+        self._empty = []
+
+    def free_ids(self):
+        """
+        The stack of ids which are free for reuse, the last id is reused
+        first.
+
+        Returns:
+            (list[int]): The free ids.
+        """
+        return list(self._free_ids)
+
+    def restore(self, polities, free_ids):
+        """
+        Replace the polities of the register, used when restoring a
+        checkpoint. The labels are set from the polities' communities.
+
+        Args:
+            polities (list[Polity]): The polity with each id, None for ids
+                which are not in use.
+            free_ids (list[int]): The stack of free ids.
+        """
+        self._polities = list(polities)
+        self._free_ids = list(free_ids)
+        self._empty = []
+        self.labels[:] = -1
+        for polity_id, polity in enumerate(polities):
+            if polity is None:
+                continue
+            polity.register = self
+            polity.id = polity_id
+            for community in polity.communities:
+                polity._label(community, polity_id)
+
+    def polities(self):
+        """
+        The polities with at least one community, in order of their ids.
+
+        Returns:
+            (list[Polity]): The polities.
+        """
+        return [polity for polity in self._polities
+                if polity is not None and polity.size() != 0]
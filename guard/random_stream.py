@@ -0,0 +1,230 @@
+"""
+Random number streams drawn in blocks.
+"""
+from collections import namedtuple
+import json
+import numpy as np
+
+"""
+The subsystems of a world which each draw from their own stream
+"""
+SUBSYSTEMS = ('world', 'attack', 'cultural_shift', 'leviathan')
+
+"""
+A named tuple of random streams, one for each subsystem
+"""
+Streams = namedtuple('Streams', SUBSYSTEMS)
+
+
+class RandomStream(object):
+    """
+    A stream of uniform random numbers which are drawn from numpy in large
+    blocks and handed out one at a time. Drawing a block amortises the
+    overhead of a numpy call over many numbers.
+
+    Args:
+        generator (numpy Generator, default=None): The generator to draw from.
+            If None numbers are drawn from the global numpy random state.
+        block_size (int, default=65536): The number of uniform numbers drawn
+            at a time.
+    """
+    def __init__(self, generator=None, block_size=65536):
+        self.generator = generator
+        self.block_size = block_size
+        self._buffer = iter(())
+
+    def block(self, shape):
+        """
+        Draw a block of uniform random numbers in the range [0,1).
+
+        Args:
+            shape (tuple[int]): The shape of the block.
+
+        Returns:
+            (numpy Array): The block of random numbers.
+        """
+        if self.generator is None:
+            return np.random.random(shape)
+        return self.generator.random(shape)
+
+    def get_state(self):
+        """
+        Return the state of the stream.
+
+        Returns:
+            (tuple): A tuple of the form (generator_state, buffer), where
+                generator_state is the bit generator state as a JSON string
+                and buffer is an array of the drawn numbers not yet handed
+                out.
+        """
+        if self.generator is None:
+            raise ValueError('Only streams with a generator have a state')
+        buffer = list(self._buffer)
+        self._buffer = iter(buffer)
+        return (json.dumps(self.generator.bit_generator.state),
+                np.array(buffer))
+
+    def set_state(self, generator_state, buffer):
+        """
+        Restore the state of the stream.
+
+        Args:
+            generator_state (str): The bit generator state as a JSON string.
+            buffer (numpy Array): The drawn numbers not yet handed out.
+        """
+        if self.generator is None:
+            raise ValueError('Only streams with a generator have a state')
+        self.generator.bit_generator.state = json.loads(generator_state)
+        self._buffer = iter(np.asarray(buffer).tolist())
+
+    def integers(self, high, size):
+        """
+        Draw an array of random integers in the range [0,high).
+
+        Args:
+            high (int): The upper bound, which is never drawn.
+            size (int): The number of integers to draw.
+
+        Returns:
+            (numpy Array): The random integers.
+        """
+        return (self.block(size)*high).astype(int)
+
+    def random(self):
+        """
+        Draw a uniform random number in the range [0,1).
+
+        Returns:
+            (float): The random number.
+        """
+        for number in self._buffer:
+            return number
+        self._buffer = iter(self.block(self.block_size).tolist())
+        return next(self._buffer)
+
+    def randint(self, high):
+        """
+        Draw a random integer in the range [0,high).
+
+        Args:
+            high (int): The upper bound, which is never drawn.
+
+        Returns:
+            (int): The random integer.
+        """
+        return int(self.random()*high)
+
+    def choice(self, sequence):
+        """
+        Choose a random element of a sequence with equal probability.
+
+        Args:
+            sequence (sequence): The sequence to choose from.
+
+        Returns:
+            The chosen element.
+        """
+        return sequence[int(self.random()*len(sequence))]
+
+    def weighted_index(self, probabilities):
+        """
+        Choose a random index according to a list of probabilities.
+
+        Args:
+            probabilities (list[float]): The probability of each index, these
+                should sum to one.
+
+        Returns:
+            (int): The chosen index.
+        """
+        draw = self.random()
+        cumulative = 0.
+        for index, probability in enumerate(probabilities):
+            cumulative += probability
+            if draw < cumulative:
+                return index
+        # Guard against rounding errors in the sum of the probabilities
+        return len(probabilities) - 1
+
+    def permutation(self, number):
+        """
+        Draw a random permutation.
+
+        Args:
+            number (int): The number of elements to permute.
+
+        Returns:
+            (numpy Array): A random permutation of range(number).
+        """
+        if self.generator is None:
+            return np.random.permutation(number)
+        return self.generator.permutation(number)
+
+
+def spawn_streams(seed=None):
+    """
+    Create an independent random stream for each subsystem of a world. The
+    streams are spawned from a single seed sequence, so the same seed always
+    gives the same streams.
+
+    Args:
+        seed (int, SeedSequence or numpy Generator, default=None): The root
+            seed. A Generator spawns the streams from its own seed sequence,
+            advancing it, so reusing a Generator gives new streams. If None
+            fresh entropy is drawn from the operating system.
+
+    Returns:
+        (Streams): A named tuple of random streams.
+    """
+    if isinstance(seed, np.random.Generator):
+        generators = seed.spawn(len(SUBSYSTEMS))
+    else:
+        if isinstance(seed, np.random.SeedSequence):
+            # Copy the sequence so that reusing it gives the same streams
+            seed = np.random.SeedSequence(seed.entropy,
+                                          spawn_key=seed.spawn_key)
+        else:
+            seed = np.random.SeedSequence(seed)
+        generators = [np.random.default_rng(child)
+                      for child in seed.spawn(len(SUBSYSTEMS))]
+
+    return Streams(*[RandomStream(generator) for generator in generators])
+
+
+def get_streams_state(streams):
+    """
+    Collect the state of a set of streams as arrays.
+
+    Args:
+        streams (Streams): The streams.
+
+    Returns:
+        (dict): Arrays describing the state of each stream, keyed by
+            "rng_<subsystem>_state" and "rng_<subsystem>_buffer".
+    """
+    arrays = {}
+    for name, stream in zip(SUBSYSTEMS, streams):
+        generator_state, buffer = stream.get_state()
+        arrays['rng_{}_state'.format(name)] = np.array(generator_state)
+        arrays['rng_{}_buffer'.format(name)] = buffer
+    return arrays
+
+
+def set_streams_state(streams, arrays):
+    """
+    Restore the state of a set of streams from get_streams_state.
+
+    Args:
+        streams (Streams): The streams to restore.
+        arrays (dict): The arrays returned by get_streams_state.
+    """
+    for name, stream in zip(SUBSYSTEMS, streams):
+        stream.set_state(str(arrays['rng_{}_state'.format(name)]),
+                         arrays['rng_{}_buffer'.format(name)])
+
+
+"""
+Streams used by communities which do not belong to a world
+"""
+default_stream = RandomStream()
+default_streams = Streams(*[default_stream]*len(SUBSYSTEMS))
@@ -0,0 +1,478 @@
+"""
+Headless rendering of a world's state as RGBA map frames and PNG images.
+
+Frames are built with array operations only, from the values of the world's
+tiles given by tile_values, colour tables sampled once from matplotlib colour
+maps and terrain colours computed once per map, so they can be written every
+few steps of a run without creating any pyplot figures. Frames can be written
+by worker processes while the run continues and exported as animations.
+"""
+from . import terrain
+from .area import Rectangle
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from matplotlib import colormaps
+from multiprocessing.sharedctypes import RawArray
+import numpy as np
+import os
+import shutil
+import struct
+import subprocess
+import zlib
+
+"""
+A map layer, the tile value drawn, the colour map used and the value drawn
+as the top of the colour map. If vmax is a string it is the name of the
+parameter giving the value, if it is None values are categories, such as
+polity ids, which cycle through the colours of the colour map.
+"""
+Layer = namedtuple('Layer', ['values', 'colour_map', 'vmax'])
+
+LAYERS = {
+    'polities': Layer('labels', 'tab20', None),
+    'paradigms': Layer('paradigm', 'tab20', None),
+    'comfort': Layer('comfort', 'RdYlGn_r', 1.),
+    'yields': Layer('yields', 'RdYlGn_r', 10.),
+    'depletion': Layer('depletion', 'RdYlGn_r', 10.),
+    'expectations': Layer('expectations', 'RdYlGn_r', 100.),
+    'military_techs': Layer('military_techs', 'RdYlGn_r', 'n_military_techs'),
+    'ultrasocietal_traits': Layer('ultrasocietal_traits', 'RdYlGn_r',
+                                  'n_ultrasocietal_traits'),
+    'active': Layer('active', 'RdYlGn_r', 1.),
+}
+
+# Colours, as in the analysis plots
+_SEA = np.array([64, 147, 237, 255], dtype=np.uint8)
+_DESERT = np.array([188, 182, 64, 255], dtype=np.uint8)
+_STEPPE = np.array([109, 0, 193, 255], dtype=np.uint8)
+
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Colour tables of each colour map, sampled on first use
+_COLOUR_TABLES = {}
+
+
+def colour_table(name):
+    """
+    The colours of a matplotlib colour map as 8-bit RGBA values.
+
+    Args:
+        name (str): The name of a registered matplotlib colour map.
+
+    Returns:
+        (numpy Array): An array of shape (N,4) of the N colours of the colour
+            map. The array is shared and must not be modified.
+    """
+    if name not in _COLOUR_TABLES:
+        colour_map = colormaps[name]
+        colours = colour_map(np.arange(colour_map.N))
+        _COLOUR_TABLES[name] = np.round(colours*255).astype(np.uint8)
+    return _COLOUR_TABLES[name]
+
+
+def _png_chunk(kind, data):
+    return (struct.pack('>I', len(data)) + kind + data
+            + struct.pack('>I', zlib.crc32(kind + data)))
+
+
+def encode_png(frame, compression=6):
+    """
+    Encode a frame as a PNG image.
+
+    Args:
+        frame (numpy Array): An 8-bit RGBA image of shape (height,width,4).
+        compression (int, default=6): The zlib compression level, from 0 to
+            9.
+
+    Returns:
+        (bytes): The PNG image.
+    """
+    height, width = frame.shape[:2]
+    # Each row of the image data starts with its filter type, 0 for none
+    rows = np.zeros([height, 4*width + 1], dtype=np.uint8)
+    rows[:, 1:] = frame.reshape(height, 4*width)
+    header = struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)
+    return b''.join([
+        _PNG_SIGNATURE,
+        _png_chunk(b'IHDR', header),
+        _png_chunk(b'IDAT', zlib.compress(rows.tobytes(), compression)),
+        _png_chunk(b'IEND', b'')
+        ])
+
+
+def write_png(filename, frame, compression=6):
+    """
+    Write a frame to a PNG file.
+
+    Args:
+        filename (str): The file to write.
+        frame (numpy Array): An 8-bit RGBA image of shape (height,width,4).
+        compression (int, default=6): The zlib compression level, from 0 to
+            9.
+    """
+    with open(filename, 'wb') as outfile:
+        outfile.write(encode_png(frame, compression))
+
+
+class MapRenderer(object):
+    """
+    Render per tile values of a world as RGBA frames.
+
+    The tile drawn at each pixel and the colour of the sea, and optionally
+    desert and steppe, tiles are found when the renderer is created, so
+    drawing a frame is a colour table lookup of the value of each pixel's
+    tile. Tiles which do not form polities have no state and are transparent
+    unless their terrain is coloured. North is at the top of the frames, as
+    in the analysis plots.
+
+    Args:
+        world (World or ArrayWorld): The world to render.
+        area (Rectangle, default=None): The area of the map to render, by
+            default the entire map.
+        highlight_desert (bool, default=False): Colour desert tiles.
+        highlight_steppe (bool, default=False): Colour steppe tiles.
+        scale (int, default=1): The width and height in pixels of each tile.
+
+    Attributes:
+        world (World or ArrayWorld): The world rendered, None for copies
+            made by pickling, which only draw given values.
+        params (Parameters): The world's parameters.
+        shape (tuple): The (height,width) of the frames in pixels.
+    """
+    def __init__(self, world, area=None, highlight_desert=False,
+                 highlight_steppe=False, scale=1):
+        self.world = world
+        self.params = world.params
+        if area is None:
+            area = Rectangle.entire_map(world)
+        xmin, xmax, ymin, ymax = area.bounds()
+
+        # The tile at each pixel, rows run from north to south
+        rows = np.arange(ymax-1, ymin-1, -1).repeat(scale)
+        columns = np.arange(xmin, xmax).repeat(scale)
+        self._pixel_tiles = rows[:, np.newaxis]*world.xdim + columns
+        self.shape = self._pixel_tiles.shape
+
+        # Colour of the pixels of coloured terrain
+        codes = world.terrain_codes[self._pixel_tiles]
+        terrain_colours = [(terrain.sea, _SEA)]
+        if highlight_desert:
+            terrain_colours.append((terrain.desert, _DESERT))
+        if highlight_steppe:
+            terrain_colours.append((terrain.steppe, _STEPPE))
+        self._background = np.zeros(self.shape + (4,), dtype=np.uint8)
+        coloured = np.zeros(self.shape, dtype=bool)
+        for landscape, colour in terrain_colours:
+            pixels = codes == terrain.TERRAINS.index(landscape)
+            self._background[pixels] = colour
+            coloured |= pixels
+        # Pixels drawn from tile values and their tiles
+        self._drawn = world.polity_forming[self._pixel_tiles] & ~coloured
+        self._drawn_tiles = self._pixel_tiles[self._drawn]
+
+    def __getstate__(self):
+        # Copies sent to other processes draw given values, so the world is
+        # not copied with them
+        state = self.__dict__.copy()
+        state['world'] = None
+        return state
+
+    def frame(self, values, colour_map='RdYlGn_r', vmax=1.):
+        """
+        Draw per tile values.
+
+        Args:
+            values (numpy Array): The value of each tile, in the same order
+                as the world's tiles.
+            colour_map (str, default='RdYlGn_r'): The matplotlib colour map.
+            vmax (float, default=1.): The value drawn as the top of the colour
+                map, values are clipped to between 0 and vmax. If None values
+                are integer categories which cycle through the colours of the
+                colour map, and negative values are transparent.
+
+        Returns:
+            (numpy Array): An 8-bit RGBA frame of shape (height,width,4).
+        """
+        colours = colour_table(colour_map)
+        n_colours = len(colours)
+        values = np.asarray(values)[self._drawn_tiles]
+        if vmax is None:
+            codes = values.astype(int) % n_colours
+        else:
+            codes = np.clip(values*(n_colours/vmax), 0,
+                            n_colours-1).astype(int)
+        drawn = colours[codes]
+        if vmax is None:
+            drawn[values < 0] = 0
+        frame = self._background.copy()
+        frame[self._drawn] = drawn
+        return frame
+
+    def render(self, layer, values=None):
+        """
+        Draw one of the LAYERS of the world's current state.
+
+        Args:
+            layer (str): The layer, a key of LAYERS.
+            values (numpy Array, default=None): The tile values of the layer,
+                by default they are taken from the world.
+
+        Returns:
+            (numpy Array): An 8-bit RGBA frame of shape (height,width,4).
+        """
+        spec = LAYERS[layer]
+        if values is None:
+            values = self.world.tile_values(spec.values)
+        vmax = spec.vmax
+        if isinstance(vmax, str):
+            vmax = getattr(self.params, vmax)
+        return self.frame(values, spec.colour_map, vmax)
+
+    def save(self, layer, filename=None, compression=6):
+        """
+        Write a layer of the world's current state to a PNG file.
+
+        Args:
+            layer (str): The layer, a key of LAYERS.
+            filename (str, default=None): The file to write, by default
+                "<layer>_<step number>.png".
+            compression (int, default=6): The zlib compression level.
+
+        Returns:
+            (str): The file written.
+        """
+        if filename is None:
+            filename = '{}_{:04d}.png'.format(layer, self.world.step_number)
+        write_png(filename, self.render(layer), compression)
+        return filename
+
+
+class FrameWriter(object):
+    """
+    Write frames of layers of a world every number of steps of a run.
+    update is called after each step and writes the frames when the step
+    number is a multiple of every, named "<layer>_<step number>.png".
+
+    Args:
+        renderer (MapRenderer): The renderer of the world.
+        directory (str): The directory to write frames to, created if it does
+            not exist.
+        layers (list[str], default=['polities']): The layers to write, keys of
+            LAYERS.
+        every (int, default=10): The number of steps between frames.
+        compression (int, default=1): The zlib compression level.
+
+    Attributes:
+        filenames (list[str]): The files written, in order.
+    """
+    def __init__(self, renderer, directory, layers=['polities'], every=10,
+                 compression=1):
+        self.renderer = renderer
+        self.directory = directory
+        self.layers = list(layers)
+        self.every = every
+        self.compression = compression
+        self.filenames = []
+        self._last_step = None
+        os.makedirs(directory, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def update(self):
+        """
+        Write frames of the current step if it is a multiple of every and
+        has not been written.
+        """
+        step_number = self.renderer.world.step_number
+        if step_number % self.every or step_number == self._last_step:
+            return
+        self._last_step = step_number
+        filenames = [
+            os.path.join(self.directory,
+                         '{}_{:05d}.png'.format(layer, step_number))
+            for layer in self.layers]
+        self.filenames.extend(filenames)
+        world = self.renderer.world
+        self._write(filenames, [world.tile_values(LAYERS[layer].values)
+                                for layer in self.layers])
+
+    def _write(self, filenames, values):
+        """
+        Render and write the frames of a step from the tile values of each
+        layer.
+        """
+        for filename, layer, layer_values in zip(filenames, self.layers,
+                                                 values):
+            write_png(filename, self.renderer.render(layer, layer_values),
+                      self.compression)
+
+    def close(self):
+        """
+        Finish writing frames.
+        """
+        pass
+
+    def export(self, output, layer=None, fps=10):
+        """
+        Export the frames of a layer written so far as an animation, see
+        export_animation.
+
+        Args:
+            output (str): The animation file to write.
+            layer (str, default=None): The layer, by default the first layer
+                written.
+            fps (float, default=10): The frames per second of the animation.
+        """
+        if layer is None:
+            layer = self.layers[0]
+        prefix = os.path.join(self.directory, layer + '_')
+        export_animation([filename for filename in self.filenames
+                          if filename.startswith(prefix)], output, fps)
+
+
+# The renderer and snapshot slots of each frame writer worker process
+_worker = {'renderer': None, 'snapshots': None}
+
+
+def _init_worker(renderer, buffer, shape):
+    _worker['renderer'] = renderer
+    _worker['snapshots'] = np.frombuffer(buffer).reshape(shape)
+
+
+def _write_snapshot(slot, filenames, layers, compression):
+    """
+    Render and write the frames of a step from a snapshot slot in a worker
+    process.
+    """
+    renderer = _worker['renderer']
+    for filename, layer, values in zip(filenames, layers,
+                                       _worker['snapshots'][slot]):
+        write_png(filename, renderer.render(layer, values), compression)
+
+
+class BackgroundFrameWriter(FrameWriter):
+    """
+    A frame writer which renders and encodes frames in worker processes.
+
+    update copies the tile values of each layer into a slot of a snapshot
+    buffer shared with the workers and submits the slot, so the run only
+    pays for the copies while frames are written. If the frames of
+    max_pending steps are waiting to be written update waits for the oldest
+    before reusing its slot. The files are complete once close returns,
+    which is called on leaving a with block. Errors writing frames are raised
+    by a following call to update or by close.
+
+    Args:
+        renderer (MapRenderer): The renderer of the world, copied to each
+            worker without the world.
+        directory (str): The directory to write frames to, created if it does
+            not exist.
+        layers (list[str], default=['polities']): The layers to write, keys of
+            LAYERS.
+        every (int, default=10): The number of steps between frames.
+        compression (int, default=1): The zlib compression level.
+        max_pending (int, default=16): The number of steps whose frames may
+            wait to be written.
+        processes (int, default=1): The number of worker processes.
+
+    Attributes:
+        filenames (list[str]): The files written, in order.
+    """
+    def __init__(self, renderer, directory, layers=['polities'], every=10,
+                 compression=1, max_pending=16, processes=1):
+        super().__init__(renderer, directory, layers, every, compression)
+        self.max_pending = max_pending
+        shape = (max_pending, len(self.layers), renderer.world.total_tiles)
+        # Shared memory must be given to the workers as they start
+        buffer = RawArray('d', int(np.prod(shape)))
+        self._snapshots = np.frombuffer(buffer).reshape(shape)
+        self._next_slot = 0
+        self._pending = deque()
+        self._pool = ProcessPoolExecutor(processes, initializer=_init_worker,
+                                         initargs=(renderer, buffer, shape))
+
+    def _write(self, filenames, values):
+        """
+        Copy the tile values of a step into the next slot and submit it to
+        the workers, first collecting the steps written.
+        """
+        pending = self._pending
+        # Slots are used in turn, so the next slot is free once fewer than
+        # max_pending steps are pending
+        while pending and (pending[0].done()
+                           or len(pending) == self.max_pending):
+            pending.popleft().result()
+        slot = self._next_slot
+        self._next_slot = (slot + 1) % self.max_pending
+        self._snapshots[slot] = values
+        pending.append(self._pool.submit(_write_snapshot, slot, filenames,
+                                         self.layers, self.compression))
+
+    def close(self):
+        """
+        Wait for the submitted frames to be written and stop the workers.
+        """
+        try:
+            while self._pending:
+                self._pending.popleft().result()
+        finally:
+            self._pool.shutdown()
+
+
+class MissingEncoder(Exception):
+    """
+    Exception raised when no encoder is available for an animation format.
+    """
+    pass
+
+
+def export_animation(filenames, output, fps=10):
+    """
+    Encode a sequence of PNG frames as an animation. GIF animations are
+    encoded with Pillow, other formats, such as MP4, with ffmpeg.
+
+    Args:
+        filenames (list[str]): The PNG frames, in order.
+        output (str): The animation file to write, the format is given by its
+            extension.
+        fps (float, default=10): The frames per second of the animation.
+
+    Raises:
+        (MissingEncoder): Raised if the encoder for the format is not
+            installed.
+    """
+    if output.lower().endswith('.gif'):
+        try:
+            from PIL import Image
+        except ImportError:
+            raise MissingEncoder('Pillow is required to write GIF animations')
+        images = []
+        for filename in filenames:
+            with Image.open(filename) as image:
+                images.append(image.copy())
+        images[0].save(output, save_all=True, append_images=images[1:],
+                       duration=1000/fps, loop=0, disposal=2)
+        return
+
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        raise MissingEncoder(
+            'ffmpeg is required to write {}'.format(output))
+    # Frames are piped to ffmpeg as PNG images, and padded to even
+    # dimensions as required by most video codecs
+    encoder = subprocess.Popen(
+        [ffmpeg, '-y', '-loglevel', 'error', '-f', 'image2pipe',
+         '-framerate', str(fps), '-c:v', 'png', '-i', '-',
+         '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p',
+         output],
+        stdin=subprocess.PIPE)
+    with encoder.stdin:
+        for filename in filenames:
+            with open(filename, 'rb') as infile:
+                encoder.stdin.write(infile.read())
+    if encoder.wait():
+        raise subprocess.CalledProcessError(encoder.returncode, ffmpeg)
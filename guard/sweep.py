@@ -0,0 +1,219 @@
+"""
+Parameter sweeps scored against historical imperial density.
+"""
+from . import default_parameters
+from .analysis import HistoricalImperialDensity, ImperialDensity
+from .daterange import imperial_density_date_ranges
+from .ensemble import run_ensemble, _run_replica, _reduce
+from .world import World
+from ast import literal_eval
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import itertools
+import numpy as np
+import os
+
+"""
+Columns of the results file which hold the score of a point
+"""
+SCORE_COLUMNS = ('mean_r', 'mean_n', 'r_1500BC-500BC', 'r_500BC-500AD',
+                 'r_500AD-1500AD')
+
+
+def grid_design(**values):
+    """
+    Create a design containing every combination of parameter values.
+
+    Args:
+        **values (list): The values of each parameter to sweep, keyed by the
+            Parameters field name.
+
+    Returns:
+        (list[dict]): The parameters of each point of the design.
+    """
+    names = list(values)
+    return [dict(zip(names, point))
+            for point in itertools.product(*values.values())]
+
+
+def random_design(n_points, seed=None, **ranges):
+    """
+    Create a design of points drawn uniformly from ranges of parameter values.
+
+    Args:
+        n_points (int): The number of points.
+        seed (int, default=None): The seed of the random points. A sweep can
+            only be resumed if its design is the same, so this should be set
+            for sweeps which may be interrupted.
+        **ranges (tuple): The (low, high) range of each parameter to sweep,
+            keyed by the Parameters field name. If both bounds are integers
+            the values are integers in the range [low, high].
+
+    Returns:
+        (list[dict]): The parameters of each point of the design.
+    """
+    generator = np.random.default_rng(seed)
+    columns = {}
+    for name, (low, high) in ranges.items():
+        if isinstance(low, int) and isinstance(high, int):
+            columns[name] = generator.integers(low, high, size=n_points,
+                                               endpoint=True).tolist()
+        else:
+            columns[name] = generator.uniform(low, high,
+                                              size=n_points).tolist()
+
+    return [{name: columns[name][i] for name in ranges}
+            for i in range(n_points)]
+
+
+def _read_results(results_file, header):
+    """
+    Read the completed points of a results file. A last row which was only
+    partly written, when a sweep was interrupted, is truncated from the file
+    so the point is run again.
+
+    Returns:
+        (dict): The rows of the file keyed by point number.
+
+    Raises:
+        (ValueError): Raised if the columns of the file do not match the
+            sweep.
+    """
+    if not os.path.exists(results_file):
+        return {}
+
+    # Rows are flushed whole, so only the last line can be incomplete
+    with open(results_file, 'rb') as infile:
+        content = infile.read()
+    complete = content.rfind(b'\n') + 1
+    if complete < len(content):
+        with open(results_file, 'r+b') as outfile:
+            outfile.truncate(complete)
+
+    with open(results_file, 'r', newline='') as csvfile:
+        reader = csv.reader(csvfile)
+        existing_header = next(reader, None)
+        if existing_header is None:
+            return {}
+        if existing_header != header:
+            raise ValueError(
+                'Columns of {} do not match the sweep'.format(results_file))
+
+        rows = {}
+        for line in reader:
+            row = dict(zip(header, line))
+            for name in header[1:-len(SCORE_COLUMNS)]:
+                row[name] = literal_eval(row[name])
+            for name in SCORE_COLUMNS:
+                row[name] = float(row[name])
+            row['point'] = int(row['point'])
+            rows[row['point']] = row
+    return rows
+
+
+def run_sweep(map_file, design, results_file, historical_data,
+              base_params=default_parameters, n_runs=1, steps=1500,
+              engine=World, seed=None, processes=None):
+    """
+    Run an ensemble for each point of a parameter design and score its mean
+    imperial density against historical imperial density.
+
+    The runs of all points are shared across one pool of worker processes.
+    Each point's score is appended to the results file as soon as it is
+    known. Points already in the results file are skipped, so a sweep which
+    is interrupted can be resumed by running it again.
+
+    Args:
+        map_file (str): Path to the YAML definition of the world.
+        design (list[dict]): The parameters of each point, as created by
+            grid_design or random_design.
+        results_file (str): Path of the CSV file to write results to.
+        historical_data (str): Path to the historical imperial density pickle
+            file.
+        base_params (Parameters, default=guard.default_paramters): The
+            parameters which are not swept.
+        n_runs (int, default=1): The number of simulations of each point.
+        steps (int, default=1500): The number of steps of each simulation.
+        engine (class, default=World): The simulation engine, World or
+            ArrayWorld.
+        seed (int, default=None): The root seed of the sweep. The runs of each
+            point are seeded from this seed and the point number, so a resumed
+            sweep gives the same results as an uninterrupted one.
+        processes (int, default=None): The number of worker processes. If
+            None the number of CPUs is used. If 1 the runs are made in this
+            process.
+
+    Returns:
+        (list[dict]): The parameters and scores of every point of the design.
+
+    Raises:
+        (ValueError): Raised if the results file was written by a sweep over
+            different parameters.
+    """
+    names = list(design[0]) if design else []
+    header = ['point'] + names + list(SCORE_COLUMNS)
+    rows = _read_results(results_file, header)
+    pending = [index for index in range(len(design)) if index not in rows]
+
+    # Validates the parameter names before any simulations are run
+    point_params = {index: base_params._replace(**design[index])
+                    for index in pending}
+    entropy = np.random.SeedSequence(seed).entropy
+
+    world = engine.from_file(map_file, base_params, max_steps=steps)
+    historical = HistoricalImperialDensity(world, historical_data)
+    date_ranges = imperial_density_date_ranges
+
+    write_header = not os.path.exists(results_file) or (
+        os.path.getsize(results_file) == 0)
+    with open(results_file, 'a', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        if write_header:
+            writer.writerow(header)
+            csvfile.flush()
+
+        def record(index, mean):
+            scores = historical.correlate(mean, charts=False)
+            row = {'point': index, **design[index],
+                   **dict(zip(SCORE_COLUMNS, scores))}
+            writer.writerow([row['point']]
+                            + [repr(row[name]) for name in names]
+                            + [row[name] for name in SCORE_COLUMNS])
+            csvfile.flush()
+            rows[index] = row
+
+        if processes == 1:
+            for index in pending:
+                result = run_ensemble(
+                    map_file, n_runs, point_params[index],
+                    np.random.SeedSequence(entropy, spawn_key=(index,)),
+                    steps, engine, date_ranges, processes=1, world=world)
+                record(index, result.mean)
+        else:
+            with ProcessPoolExecutor(processes) as pool:
+                try:
+                    # Submit every run so that workers are never idle
+                    # between points
+                    futures = {}
+                    for index in pending:
+                        seeds = np.random.SeedSequence(
+                            entropy, spawn_key=(index,)).spawn(n_runs)
+                        futures[index] = [
+                            pool.submit(_run_replica, engine, map_file,
+                                        point_params[index], steps,
+                                        date_ranges, run_seed)
+                            for run_seed in seeds]
+
+                    for index in pending:
+                        mean = _reduce(
+                            (future.result() for future in futures[index]),
+                            date_ranges)[0]
+                        accumulator = ImperialDensity(world, date_ranges)
+                        accumulator.data = mean
+                        record(index, accumulator)
+                except BaseException:
+                    # Don't wait for the runs of the remaining points
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    raise
+
+    return [rows[index] for index in range(len(design))]
@@ -2,18 +2,40 @@
 World module.
 """
 from . import polity, terrain, period, default_parameters
-from .community import Community, DIRECTIONS, LittoralNeighbour
-from numpy import sqrt
-from numpy.random import random, permutation
-import yaml
+from .random_stream import spawn_streams, get_streams_state, set_streams_state
+from .community import Community, LittoralNeighbour
+from .map_file import load_map, MissingYamlKey
+from .paradigm_table import ParadigmTable
+from .histogram import SizeHistogram
+from bisect import bisect_right
+import numpy as np
+from scipy.spatial import cKDTree
 
 #LEV
 from .Leviathan import Paradigm, Agriculture
-import random as rnd
 
 _START_YEAR = -1500
 _YEARS_PER_STEP = 2
 
+# Scalar attributes of Leviathan paradigms stored in checkpoints
+_PARADIGM_ATTRIBUTES = ('name', 'latitude', 'maxlat', 'mut_amount',
+                        'num_starting_rules', 'sensitivity', 'mutation_rate',
+                        'threshold', 'workrate_change', 'expectations')
+
+# State variables given for each tile by tile_values, the values of the
+# polity forming communities are read from the community objects
+TILE_VALUES = {
+    'labels': None,
+    'active': None,
+    'depletion': None,
+    'comfort': lambda tile: tile.icono.comfort,
+    'yields': lambda tile: tile.agri.yields,
+    'expectations': lambda tile: tile.paradigm.expectations,
+    'paradigm': lambda tile: tile.paradigm.row,
+    'military_techs': lambda tile: tile.total_military_techs(),
+    'ultrasocietal_traits': lambda tile: tile.total_ultrasocietal_traits(),
+}
+
 
 class World(object):
     """
@@ -29,35 +51,91 @@ class World(object):
             (0,1), (0,2)].
         params (Parameters, default=guard.default_paramters): The simulation
             parameter set to use.
+        max_steps (int, default=1500): The number of steps the world is
+            expected to run for. Littoral neighbours are only recorded up to
+            the maximum sea attack distance of this many steps, they are
+            recomputed if the world runs for longer.
+        seed (int, SeedSequence or numpy Generator, default=None): The root
+            seed of the world's random streams. Worlds created with the same
+            seed and parameters produce identical runs. If None fresh entropy
+            is used.
 
     Attributes:
         xdim (int): The x dimension of the world in communities.
         ydim (int): The y dimension of the world in communities.
         params (Parameters): The simulation parameter set.
+        max_steps (int): The number of steps the world is expected to run
+            for.
         step_number (int): The current step number.
         tiles (list[Community]): A list of communities in the world.
-        polities (list[Polity]): A list of polities in the world.
+        polity_forming_tiles (list[Community]): The communities with a polity
+            forming terrain, in the same order as tiles. Only these
+            communities belong to polities, attack and hold Leviathan state,
+            the others are inert.
+        terrain_codes (numpy Array): The terrain of each tile as its index in
+            terrain.TERRAINS, in the same order as tiles.
+        polity_forming (numpy Array): True for the tiles with a polity
+            forming terrain, in the same order as tiles.
+        active_from (numpy Array): The step each tile becomes active, in the
+            same order as tiles.
+        polities (list[Polity]): A list of polities in the world, in order of
+            their ids.
+        register (PolityRegister): The register of polity ids.
+        streams (Streams): The random streams of each subsystem of the world,
+            shared with its communities.
+        events (EventLog): The log recording the events of each step, shared
+            with the communities, None if events are not recorded.
+        labels (numpy Array): The id of the polity each tile belongs to, in
+            the same order as tiles.
+        agriculture (AgricultureTable): The Leviathan soil depletion of the
+            polity forming communities, one row per community in the order of
+            polity_forming_tiles.
+        paradigms (ParadigmTable): The land use rules, latitude and follower
+            counts of the Leviathan paradigms of the world, one row per
+            paradigm. A row is freed when its paradigm is neither followed
+            nor offered to any community.
+        polity_sizes (SizeHistogram): The maximum size of each polity when it
+            disintegrated, and of the remaining polities once end is called.
+        battles_by_size (SizeHistogram): The battle size of each polity
+            forming community at the end of each step, the total size of the
+            two polities of its last attack.
+        attack_targets (numpy Array): The indices of the tiles conquered by
+            successful attacks in the last step, in the order of the attacks.
     """
-    def __init__(self, xdim, ydim, communities, params=default_parameters):
+    def __init__(self, xdim, ydim, communities, params=default_parameters,
+                 max_steps=1500, seed=None):
         self.params = params
+        self.max_steps = max_steps
 
         self.xdim = xdim
         self.ydim = ydim
         self.total_tiles = xdim*ydim
         self.tiles = communities
+        self.set_seed(seed)
+        self.set_event_log(None)
+        self.terrain_codes = np.array(
+            [terrain.TERRAINS.index(tile.terrain) for tile in communities],
+            dtype=np.int8)
+        self.polity_forming_tiles = [tile for tile in communities
+                                     if tile.terrain.polity_forming]
+        self.polity_forming = np.array(
+            [tile.terrain.polity_forming for tile in communities])
+        self.active_from = np.array(
+            [tile.period.active_from for tile in communities])
+        self._set_active_masks()
 
         # Initialise neighbours and littoral neighbours
         self.set_neighbours()
         if params.sea_attacks:
             self.set_littoral_tiles()
-            self.set_littoral_neighbours()
+            self.set_littoral_neighbours(self._horizon(max_steps))
+
+        #LEV TRACKING THAT SHOULD BE SOMEWHERE ELSE...
+        self.polity_sizes = SizeHistogram()
+        self.battles_by_size = SizeHistogram() #sized by the two polities in conflict
 
         # Each agricultural tile is its own polity, set step number to zero
         self.reset()
-        
-        #LEV TRACKING THAT SHOULD BE SOMEWHERE ELSE...
-        self.polity_sizes = []
-        self.battles_by_size = [] #sized by the two polities in conflict
 
     def __str__(self):
         string = 'World:\n'
@@ -77,6 +155,92 @@ class World(object):
         """
         return len(self.polities)
 
+    @property
+    def polities(self):
+        """
+        The polities of the world, in order of their ids.
+        """
+        return self.register.polities()
+
+    @property
+    def labels(self):
+        """
+        The id of the polity each tile belongs to.
+        """
+        return self.register.labels
+
+    def _set_active_masks(self):
+        """
+        Find the active tiles of each agricultural period. Tiles only become
+        active at the start of a period so the mask of active tiles is
+        computed once for each.
+        """
+        self._activation_steps = np.unique(
+            self.active_from[self.polity_forming]).tolist()
+        self._active_masks = [
+            self.polity_forming & (self.active_from <= step)
+            for step in self._activation_steps]
+        self._inactive = np.zeros(self.total_tiles, dtype=bool)
+
+    def active_mask(self):
+        """
+        Determine which tiles are polity forming and currently active.
+
+        Returns:
+            (numpy Array): A boolean array which is True for active tiles, in
+                the same order as tiles. The array is shared between steps
+                and must not be modified.
+        """
+        period = bisect_right(self._activation_steps, self.step_number)
+        if period == 0:
+            return self._inactive
+        return self._active_masks[period-1]
+
+    def tile_polity_sizes(self):
+        """
+        The size of the polity each tile belongs to.
+
+        Returns:
+            (numpy Array): The size of each tile's polity, in the same order
+                as tiles, 0 for tiles which do not belong to a polity.
+        """
+        labels = self.labels
+        sizes = np.bincount(labels[self.polity_forming],
+                            minlength=len(self.register))
+        return np.where(labels >= 0, sizes[labels], 0)
+
+    def tile_values(self, name):
+        """
+        The value of a state variable for each tile.
+
+        Args:
+            name (str): The state variable, one of the keys of TILE_VALUES.
+                labels are the polity ids, active whether tiles are active,
+                depletion the total soil depletion, paradigm the row of the
+                paradigm in the paradigm table and military_techs and
+                ultrasocietal_traits the number of each a tile has.
+
+        Returns:
+            (numpy Array): A new array of the value of each tile, in the same
+                order as tiles. Tiles which do not form polities are -1 for
+                labels and paradigm and 0 otherwise.
+        """
+        if name == 'labels':
+            return self.labels.copy()
+        if name == 'active':
+            return self.active_mask().copy()
+        if name == 'depletion':
+            tile_values = self.agriculture.depletion.sum(axis=1)
+        else:
+            tile_values = [TILE_VALUES[name](tile)
+                           for tile in self.polity_forming_tiles]
+        if name == 'paradigm':
+            values = np.full(self.total_tiles, -1)
+        else:
+            values = np.zeros(self.total_tiles)
+        values[self.polity_forming] = tile_values
+        return values
+
     def index(self, x, y):
         """
         Return the tile at coordinates (x,y).
@@ -96,14 +260,20 @@ class World(object):
         """
         return x + y*self.xdim
 
-    def year(self):
+    def year(self, step_number=None):
         """
         Return the current year.
 
+        Args:
+            step_number (int, default=None): The step to give the year of, by
+                default the current step.
+
         Returns:
             (int): The current year. Years BC are negative.
         """
-        return self.step_number*_YEARS_PER_STEP + _START_YEAR
+        if step_number is None:
+            step_number = self.step_number
+        return step_number*_YEARS_PER_STEP + _START_YEAR
 
     def sea_attack_distance(self):
         """
@@ -115,6 +285,20 @@ class World(object):
         return (self.params.base_sea_attack_distance
                 + self.step_number * self.params.sea_attack_increment)
 
+    def grid(self, values):
+        """
+        Arrange per tile values as a map.
+
+        Args:
+            values (numpy Array): An array with one element per tile, in the
+                same order as tiles.
+
+        Returns:
+            (numpy Array): A two dimensional view of values indexed by the
+                (x,y) coordinates of the tiles.
+        """
+        return np.asarray(values).reshape(self.ydim, self.xdim).T
+
     def set_neighbours(self):
         """
         Assign tiles their neighbours.
@@ -123,10 +307,10 @@ class World(object):
             for y in range(self.ydim):
                 tile = self.index(x, y)
                 tile.position = (x, y)
-                tile.neighbours['left'] = self.index(x-1, y)
-                tile.neighbours['right'] = self.index(x+1, y)
-                tile.neighbours['up'] = self.index(x, y+1)
-                tile.neighbours['down'] = self.index(x, y-1)
+                tile.index = self._index(x, y)
+                # In the order of community.DIRECTIONS
+                tile.adjacent = (self.index(x-1, y), self.index(x+1, y),
+                                 self.index(x, y+1), self.index(x, y-1))
 
     def set_littoral_tiles(self):
         """
@@ -137,8 +321,7 @@ class World(object):
             if not tile.terrain.polity_forming:
                 continue
 
-            for direction in DIRECTIONS:
-                neighbour = tile.neighbours[direction]
+            for neighbour in tile.adjacent:
                 # Ensure there is a neighour
                 if neighbour is None:
                     continue
@@ -149,44 +332,60 @@ class World(object):
                     # to be littoral
                     break
 
-    def set_littoral_neighbours(self):
+    def set_littoral_neighbours(self, horizon):
         """
-        Assign littoral tiles their lists of littoral neighbours.
+        Assign littoral tiles their lists of littoral neighbours within a
+        maximum distance, sorted by distance.
+
+        Args:
+            horizon (float): The maximum distance to a littoral neighbour.
         """
-        littoral_tiles = [tile for tile in self.tiles if tile.littoral is True]
-        n_littoral = len(littoral_tiles)
+        self._littoral_horizon = horizon
+        littoral = np.array([tile.littoral for tile in self.tiles])
+        positions = np.array([tile.position for tile in self.tiles])
+        pointers, neighbours, distances = littoral_neighbour_index(
+            positions, littoral, horizon)
 
-        for tile in littoral_tiles:
-            # Add self as a littoral neighbour with 0 distance, this is
+        for tile_no in np.flatnonzero(littoral):
+            tile = self.tiles[tile_no]
+            start, end = pointers[tile_no], pointers[tile_no+1]
+            # Each tile is its own neighbour with 0 distance, this is
             # important in order to reproduce Turchin's results
-            tile.littoral_neighbours.append(LittoralNeighbour(tile, 0))
-
-        for i in range(n_littoral-1):
-            itile = littoral_tiles[i]
-            for j in range(i+1, n_littoral):
-                jtile = littoral_tiles[j]
-
-                # Calculate euclidean distance between tiles in tile dimension
-                # units
-                distance = sqrt((itile.position[0]-jtile.position[0])**2 +
-                                (itile.position[1]-jtile.position[1])**2)
-
-                # Add neighbour and the symmetric entry
-                itile.littoral_neighbours.append(
-                    LittoralNeighbour(jtile, distance))
-                jtile.littoral_neighbours.append(
-                    LittoralNeighbour(itile, distance))
+            tile.littoral_distances = distances[start:end].tolist()
+            tile.littoral_neighbours = [
+                LittoralNeighbour(self.tiles[neighbour], distance)
+                for neighbour, distance in zip(neighbours[start:end].tolist(),
+                                               tile.littoral_distances)
+                ]
+            tile.littoral_in_range = tile.littoral_neighbours_in_range(
+                tile.sea_attack_distance)
+
+    def _horizon(self, steps):
+        """
+        The maximum sea attack distance reached in a number of steps.
+        """
+        return (self.params.base_sea_attack_distance
+                + steps * self.params.sea_attack_increment)
 
     @classmethod
-    def from_file(cls, yaml_file, params=default_parameters):
+    def from_file(cls, yaml_file, params=default_parameters, max_steps=1500,
+                  seed=None, cache=True):
         """
-        Read a world from a YAML file.
+        Read a world from a YAML file. The map is read from its compiled
+        binary map when the YAML file is unchanged since it was compiled, see
+        map_file.load_map.
 
         Args:
             yaml_file (str): Path to the file containing a YAML definition of
                 the world.
             params (Parameters, default=guard.default_paramters): The
                 simulation parameter set.
+            max_steps (int, default=1500): The number of steps the world is
+                expected to run for.
+            seed (int, SeedSequence or numpy Generator, default=None): The
+                root seed of the world's random streams.
+            cache (bool, default=True): Whether to use and write the compiled
+                binary map.
 
         Returns:
             (World): The world object specified by the YAML file
@@ -195,73 +394,79 @@ class World(object):
             (MissingYamlKey): Raised if a required key is not present in the
                 YAML file.
         """
-        # Parse YAML file
-        with open(yaml_file, 'r') as infile:
-            world_data = yaml.load(infile, Loader=yaml.FullLoader)
-        try:
-            xdim = world_data['xdim']
-        except KeyError:
-            raise MissingYamlKey('xdim', yaml_file)
-        try:
-            ydim = world_data['ydim']
-        except KeyError:
-            raise MissingYamlKey('ydim', yaml_file)
-
-        # Determine total number of tiles and assign list
-        total_communities = xdim*ydim
-        communities = [None]*total_communities
+        map_data = load_map(yaml_file, cache)
 
         # Enter world data into tiles list
-        try:
-            community_data = world_data['communities']
-        except KeyError:
-            raise MissingYamlKey('communities', yaml_file)
-        for community in community_data:
-            x, y = community['x'], community['y']
-
-            assert community['terrain'] in ['agriculture', 'steppe',
-                                            'desert', 'sea']
-            if community['terrain'] == 'agriculture':
-                landscape = terrain.agriculture
-            elif community['terrain'] == 'steppe':
-                landscape = terrain.steppe
-            elif community['terrain'] == 'desert':
-                landscape = terrain.desert
-            elif community['terrain'] == 'sea':
-                landscape = terrain.sea
-
+        communities = []
+        for code, elevation, period_code in zip(
+                map_data.terrain_codes.tolist(), map_data.elevation.tolist(),
+                map_data.period_codes.tolist()):
+            landscape = terrain.TERRAINS[code]
             if landscape.polity_forming:
-                elevation = community['elevation'] / 1000.
-                agricultural_period = community['activeFrom']
-
-                if agricultural_period == 'agri1':
-                    active_from = period.agri1
-                elif agricultural_period == 'agri2':
-                    active_from = period.agri2
-                elif agricultural_period == 'agri3':
-                    active_from = period.agri3
-
-                communities[x + y*xdim] = Community(params, landscape,
-                                                    elevation, active_from)
+                communities.append(Community(params, landscape, elevation,
+                                             period.PERIODS[period_code]))
             else:
-                communities[x + y*xdim] = Community(params, landscape)
+                communities.append(Community(params, landscape))
+
+        return cls(map_data.xdim, map_data.ydim, communities, params,
+                   max_steps, seed)
+
+    def set_seed(self, seed):
+        """
+        Replace the random streams of the world and its communities.
+
+        Args:
+            seed (int, SeedSequence or numpy Generator): The root seed of the
+                new random streams. If None fresh entropy is used.
+        """
+        self.streams = spawn_streams(seed)
+        for tile in self.tiles:
+            tile.streams = self.streams
 
-        return cls(xdim, ydim, communities, params)
+    def set_event_log(self, events):
+        """
+        Record the attacks, ethnocides, disintegrations and paradigm changes
+        of the following steps in an event log.
+
+        Args:
+            events (EventLog): The event log, shared with the communities. If
+                None events are no longer recorded.
+        """
+        self.events = events
+        for tile in self.tiles:
+            tile.events = events
 
-    def reset(self):
+    def reset(self, seed=None):
         """
-        Reset the world by returning all polities to single communities and
-        setting the step number to 0.
+        Reset the world by returning all polities to single communities,
+        setting the step number to 0 and clearing the polity and battle size
+        histograms. Only the polity forming communities are reset, the others
+        have no state.
+
+        Args:
+            seed (int, SeedSequence or numpy Generator, default=None): If not
+                None the random streams are replaced by streams from this seed
+                before the reset, so the following run is reproducible.
         """
+        if seed is not None:
+            self.set_seed(seed)
         self.step_number = 0
+        self.polity_sizes.clear()
+        self.battles_by_size.clear()
         
         #LEV Reset tiles (communities)--seems like these should have been reset before...
         # Otherwise ultrasociety and military techs carried over between tests
-        for tile in self.tiles:
-            tile.paradigm = Paradigm.Paradigm(tile)
-            tile.icono.comfort = rnd.random()
-            tile.agri = Agriculture.Agriculture(tile)
-            tile.sea_attack_distance = 0
+        self.agriculture = Agriculture.AgricultureTable(
+            len(self.polity_forming_tiles), self.params.n_land_use_rules)
+        self.paradigms = ParadigmTable(self.params.n_land_use_rules,
+                                       capacity=len(self.polity_forming_tiles))
+        for row, tile in enumerate(self.polity_forming_tiles):
+            tile.paradigm = Paradigm.Paradigm(tile, self.paradigms)
+            tile.icono.comfort = self.streams.world.random()
+            # Paradigms offered in an earlier run
+            tile.icono.ClearInbox()
+            tile.agri = Agriculture.Agriculture(tile, self.agriculture, row)
+            tile.set_sea_attack_distance(0)
             
             tile.ultrasocietal_traits = [False]*self.params.n_ultrasocietal_traits
             if self.params.military_technology_seed == 'steppes':
@@ -275,73 +480,103 @@ class World(object):
                 # original simulation there are 115 steppes tiles out of 2647
                 # polity supporting (steppe or agricultural) tiles making 4.34% of
                 # the communities begining with all miliatry technologies
-                if random() < 0.0434:
-                    if tile.terrain in [terrain.steppe, terrain.agriculture]:
-                        tile.military_techs = [True]*self.params.n_military_techs
+                if self.streams.world.random() < 0.0434:
+                    tile.military_techs = [True]*self.params.n_military_techs
                 else:
                     tile.military_techs = [False]*self.params.n_military_techs
         
-        self.polities = [polity.Polity([tile])
-                         for tile in self.tiles]#if tile.terrain.polity_forming] #for display--should not be used anywhere but polity forming
-        #TODO--change analysis so don't need to create polities on all tiles?
-        
+        self.register = polity.PolityRegister(self.total_tiles)
+        for tile in self.polity_forming_tiles:
+            polity.Polity([tile], self.register)
+        self.attack_targets = np.zeros(0, dtype=int)
 
     def cultural_shift(self):
         """
         Attempt cultural shift in all communities.
+
+        With Leviathan each loop runs the agriculture of every active
+        community at once and then the iconorhythm of each active community
+        in turn, before the ultrasocietal traits shift.
         """
-        for tile in self.tiles:
-            if tile.terrain.polity_forming:
-                tile.cultural_shift(self.params, self.step_number) #LEV added step number so can check if active
+        params = self.params
+        tiles = self.polity_forming_tiles
+        if params.icono:
+            active = [tile for tile in tiles
+                      if tile.is_active(self.step_number)]
+            for i in range(params.num_icono_loops):
+                self.agriculture.Run(active)
+                for tile in active:
+                    tile.icono.Run()
+
+        # Draw the random numbers for every trait of every tile at once
+        draws = self.streams.cultural_shift.block(
+            (len(tiles), params.n_ultrasocietal_traits)).tolist()
+        for tile, tile_draws in zip(tiles, draws):
+            tile.cultural_shift(params, self.step_number, tile_draws,
+                                run_leviathan=False) #LEV added step number so can check if active
 
     def disintegration(self):
         """
         Attempt disintegration of all polities
         """
-        new_states = []
         for state in self.polities:
             # Skip single community polities
             if state.size() == 1:
                 continue
-            if state.disintegrate_probability(self.params) > random():
+            if (state.disintegrate_probability(self.params)
+                    > self.streams.world.random()):
                 # Create a new set of polities, one for each of the communities
                 
                 #LEV--TRACKING FOR POWERLAWS
-                self.polity_sizes.append(state.max_size)
+                self.polity_sizes.add(state.max_size)
+                if self.events is not None:
+                    self.events.record('disintegration', state.id,
+                                       state.size(), state.max_size)
                 
-                new_states += state.disintegrate()
+                state.disintegrate()
 
         # Delete the now empy polities
         self.prune_empty_polities()
 
-        # Append new polities from disintegrated old polities to list
-        self.polities += new_states
-
     def attack(self, callback=None):
         """
         Attempt an attack from all communities.
 
         Args:
-            callback (function, default=None): A callback function invoked if
-                an attack is successful. Used to record attack events.
+            callback (function, default=None): A callback function invoked
+                with the target of each attack made.
         """
-        # Generate a random order for communities to attempt attacks in
-        attack_order = permutation(self.total_tiles)
-        for tile_no in attack_order:
-            tile = self.tiles[tile_no]
+        sea_attack_distance = self.sea_attack_distance()
+        if (self.params.sea_attacks
+                and sea_attack_distance > self._littoral_horizon):
+            # The world has run for longer than expected, extend the
+            # littoral neighbour lists
+            self.max_steps *= 2
+            self.set_littoral_neighbours(
+                max(sea_attack_distance, self._horizon(self.max_steps)))
+
+        # Generate a random order for communities to attempt attacks in, only
+        # polity forming communities may attack
+        tiles = self.polity_forming_tiles
+        attack_order = self.streams.attack.permutation(len(tiles))
+        targets = []
+        for tile_no in attack_order.tolist():
+            tile = tiles[tile_no]
             tile.battle_size = 0 #LEV TRACKING-ELSEWHERE?
             if tile.can_attack(self.step_number):
-                tile.attempt_attack(self.params, self.step_number,
-                                    self.sea_attack_distance(), callback)
+                target = tile.attempt_attack(self.params, self.step_number,
+                                             sea_attack_distance, callback)
+                if target is not None:
+                    targets.append(target.index)
+        self.attack_targets = np.array(targets, dtype=int)
 
         self.prune_empty_polities()
 
     def prune_empty_polities(self):
         """
-        Prune polities with zero communities.
+        Prune polities with zero communities, freeing their ids.
         """
-        self.polities = [state for state in self.polities
-                         if state.size() != 0]
+        self.register.prune()
 
     def step(self, attack_callback=None):
         """
@@ -349,9 +584,12 @@ class World(object):
 
         Args:
             attack_callback (function, default=None): A callback function
-                invoked if an attack is successful. Used to record attack
-                events.
+                invoked with the target of each attack made. The targets of
+                successful attacks are also kept in attack_targets.
         """
+        if self.events is not None:
+            self.events.step = self.step_number
+
         # Attacks
         self.attack(attack_callback)
 
@@ -370,23 +608,269 @@ class World(object):
         for polity in self.polities:
             if polity.max_size < len(polity.communities):
                 polity.max_size = len(polity.communities)
-        for tile in self.tiles:
-            self.battles_by_size.append(tile.battle_size)
+        self.battles_by_size.add(
+            [tile.battle_size for tile in self.polity_forming_tiles])
     
     def end(self):
-        for polity in self.polities:
-            self.polity_sizes.append(polity.max_size)
+        """
+        Record the maximum sizes of the remaining polities.
+
+        Returns:
+            (SizeHistogram): The maximum size of every polity which has
+                disintegrated or remains.
+        """
+        self.polity_sizes.add([polity.max_size for polity in self.polities])
         
         return self.polity_sizes
-            
 
+    def save_checkpoint(self, checkpoint_file):
+        """
+        Save the state of the world between steps to a compressed numpy
+        archive.
+
+        The checkpoint holds the step number, polity membership, traits,
+        technologies, Leviathan state, the table of paradigms and the state
+        of the random streams, but not the map, which is checked against the
+        world the checkpoint is loaded into. Community state is only stored
+        for the polity forming communities.
 
-class MissingYamlKey(Exception):
+        Args:
+            checkpoint_file (str): Path of the file to write.
+        """
+        tiles = self.polity_forming_tiles
+
+        # Number each paradigm reachable from a tile
+        paradigm_rows = {}
+        paradigms = []
+
+        def paradigm_row(paradigm):
+            if id(paradigm) not in paradigm_rows:
+                paradigm_rows[id(paradigm)] = len(paradigms)
+                paradigms.append(paradigm)
+            return paradigm_rows[id(paradigm)]
+
+        tile_paradigms = [paradigm_row(tile.paradigm) for tile in tiles]
+        inboxes = [[paradigm_row(paradigm)
+                    for paradigm in tile.icono.counterParadigms]
+                   for tile in tiles]
+        # Paradigms refer to the technology list of a community
+        tech_owners = {id(tile.military_techs): tile.index for tile in tiles}
+
+        register = self.register
+        polity_max_size = np.zeros(len(register), dtype=int)
+        for state in self.polities:
+            polity_max_size[state.id] = state.max_size
+
+        arrays = dict(
+            xdim=self.xdim, ydim=self.ydim, terrain_codes=self.terrain_codes,
+            step_number=self.step_number, max_steps=self.max_steps,
+            labels=self.labels,
+            polity_index=[tile.polity_index for tile in tiles],
+            free_ids=np.array(register.free_ids(), dtype=int),
+            polity_max_size=polity_max_size,
+            ultrasocietal_traits=np.array(
+                [tile.ultrasocietal_traits for tile in tiles], dtype=bool),
+            military_techs=np.array(
+                [tile.military_techs for tile in tiles], dtype=bool),
+            comfort=[tile.icono.comfort for tile in tiles],
+            workrate=[tile.agri.workrate for tile in tiles],
+            yields=[tile.agri.yields for tile in tiles],
+            yields_prev=[tile.agri.yields_prev for tile in tiles],
+            depletion=self.agriculture.depletion,
+            sea_attack_distance=[tile.sea_attack_distance for tile in tiles],
+            battle_size=[tile.battle_size for tile in tiles],
+            attack_targets=self.attack_targets,
+            paradigm=tile_paradigms,
+            inbox_pointers=np.cumsum([0] + [len(inbox) for inbox in inboxes]),
+            inbox=np.array([row for inbox in inboxes for row in inbox],
+                           dtype=int),
+            **self.polity_sizes.get_state('polity_sizes'),
+            **self.battles_by_size.get_state('battles_by_size'),
+            **get_streams_state(self.streams))
+        for attribute in _PARADIGM_ATTRIBUTES:
+            arrays['paradigm_'+attribute] = [getattr(paradigm, attribute)
+                                             for paradigm in paradigms]
+        arrays['paradigm_community'] = [paradigm.community.index
+                                        for paradigm in paradigms]
+        table_rows = [paradigm.row for paradigm in paradigms]
+        arrays['paradigm_yield_rules'] = self.paradigms.yield_rules[table_rows]
+        arrays['paradigm_depletion_rules'] = (
+            self.paradigms.depletion_rules[table_rows])
+        arrays['paradigm_techs_owner'] = [
+            tech_owners.get(id(paradigm.military_techs), -1)
+            for paradigm in paradigms]
+        arrays['paradigm_techs'] = np.array(
+            [paradigm.military_techs for paradigm in paradigms], dtype=bool)
+
+        np.savez_compressed(checkpoint_file, **arrays)
+
+    def load_checkpoint(self, checkpoint_file):
+        """
+        Restore the state of the world from a checkpoint written by
+        save_checkpoint. The world must have the same map as the world the
+        checkpoint was saved from. The simulation parameters of the world
+        are kept, those of existing paradigms are restored.
+
+        Args:
+            checkpoint_file (str): Path of the checkpoint file.
+
+        Raises:
+            (InvalidCheckpoint): Raised if the checkpoint was saved from a
+                world with a different map.
+        """
+        with np.load(checkpoint_file) as checkpoint:
+            arrays = dict(checkpoint)
+
+        if (int(arrays['xdim']) != self.xdim
+                or int(arrays['ydim']) != self.ydim
+                or np.any(arrays['terrain_codes'] != self.terrain_codes)):
+            raise InvalidCheckpoint(checkpoint_file)
+
+        tiles = self.polity_forming_tiles
+        self.step_number = int(arrays['step_number'])
+        max_steps = int(arrays['max_steps'])
+        if max_steps != self.max_steps:
+            self.max_steps = max_steps
+            if self.params.sea_attacks:
+                self.set_littoral_neighbours(self._horizon(max_steps))
+
+        traits = arrays['ultrasocietal_traits'].tolist()
+        techs = arrays['military_techs'].tolist()
+        comfort = arrays['comfort'].tolist()
+        workrate = arrays['workrate'].tolist()
+        yields = arrays['yields'].tolist()
+        yields_prev = arrays['yields_prev'].tolist()
+        sea_attack_distance = arrays['sea_attack_distance'].tolist()
+        battle_size = arrays['battle_size'].tolist()
+        self.attack_targets = arrays['attack_targets']
+        self.agriculture.depletion[:] = arrays['depletion']
+        for i, tile in enumerate(tiles):
+            tile.ultrasocietal_traits = traits[i]
+            tile.military_techs = techs[i]
+            tile.icono.comfort = comfort[i]
+            tile.agri.workrate = workrate[i]
+            tile.agri.yields = yields[i]
+            tile.agri.yields_prev = yields_prev[i]
+            tile.set_sea_attack_distance(sea_attack_distance[i])
+            tile.battle_size = battle_size[i]
+
+        # Rebuild the paradigms in a new table, the follower counts are
+        # restored as the communities adopt them
+        columns = {attribute: arrays['paradigm_'+attribute].tolist()
+                   for attribute in _PARADIGM_ATTRIBUTES}
+        community = arrays['paradigm_community'].tolist()
+        yield_rules = arrays['paradigm_yield_rules']
+        depletion_rules = arrays['paradigm_depletion_rules']
+        techs_owner = arrays['paradigm_techs_owner'].tolist()
+        paradigm_techs = arrays['paradigm_techs'].tolist()
+        table = ParadigmTable(yield_rules.shape[1], capacity=len(community))
+        paradigms = []
+        for row in range(len(community)):
+            paradigm = Paradigm.Paradigm.__new__(Paradigm.Paradigm)
+            paradigm.table = table
+            paradigm.row = table.allocate()
+            paradigm.inboxes = 0
+            table.yield_rules[paradigm.row] = yield_rules[row]
+            table.depletion_rules[paradigm.row] = depletion_rules[row]
+            table.origin[paradigm.row] = community[row]
+            for attribute in _PARADIGM_ATTRIBUTES:
+                setattr(paradigm, attribute, columns[attribute][row])
+            paradigm.community = self.tiles[community[row]]
+            if techs_owner[row] >= 0:
+                paradigm.military_techs = self.tiles[
+                    techs_owner[row]].military_techs
+            else:
+                paradigm.military_techs = paradigm_techs[row]
+            paradigms.append(paradigm)
+
+        tile_paradigms = arrays['paradigm'].tolist()
+        inbox_pointers = arrays['inbox_pointers'].tolist()
+        inbox = arrays['inbox'].tolist()
+        self.paradigms = table
+        for i, tile in enumerate(tiles):
+            tile.paradigm = paradigms[tile_paradigms[i]]
+            tile.icono.ClearInbox()
+            for row in inbox[inbox_pointers[i]:inbox_pointers[i+1]]:
+                tile.icono.Receive(paradigms[row])
+
+        # Rebuild the polities with their ids and community order
+        labels = arrays['labels'].tolist()
+        polity_index = arrays['polity_index'].tolist()
+        polity_max_size = arrays['polity_max_size'].tolist()
+        members = [[] for polity_id in polity_max_size]
+        for tile, index in zip(tiles, polity_index):
+            members[labels[tile.index]].append((index, tile))
+        polities = [None]*len(members)
+        for polity_id, communities in enumerate(members):
+            if communities:
+                communities.sort(key=lambda member: member[0])
+                state = polity.Polity(
+                    [community for index, community in communities])
+                state.max_size = polity_max_size[polity_id]
+                polities[polity_id] = state
+        self.register = polity.PolityRegister(self.total_tiles)
+        self.register.restore(polities, arrays['free_ids'].tolist())
+
+        self.polity_sizes.set_state('polity_sizes', arrays)
+        self.battles_by_size.set_state('battles_by_size', arrays)
+        set_streams_state(self.streams, arrays)
+
+
+
+def littoral_neighbour_index(positions, littoral, horizon):
+    """
+    Build a compressed index of the littoral neighbours of each tile within a
+    given distance, sorted by distance.
+
+    Args:
+        positions (numpy Array): The (x,y) coordinates of each tile.
+        littoral (numpy Array): A boolean array which is True for littoral
+            tiles.
+        horizon (float): The maximum distance to a neighbour.
+
+    Returns:
+        (tuple): A tuple of the form (pointers, neighbours, distances). The
+            littoral neighbours of tile i are neighbours[pointers[i]:
+            pointers[i+1]] at distances[pointers[i]:pointers[i+1]]. Each
+            littoral tile is its own neighbour at distance 0.
+    """
+    total_tiles = len(positions)
+    littoral_tiles = np.flatnonzero(littoral)
+    counts = np.zeros(total_tiles, dtype=int)
+    neighbours = np.zeros(0, dtype=int)
+    distances = np.zeros(0)
+
+    if len(littoral_tiles) > 0:
+        coordinates = positions[littoral_tiles]
+        tree = cKDTree(coordinates)
+        in_range = tree.query_ball_point(coordinates, r=horizon)
+
+        rows = np.repeat(np.arange(len(littoral_tiles)),
+                         [len(row) for row in in_range])
+        columns = np.concatenate([np.array(row, dtype=int)
+                                  for row in in_range])
+        distances = np.sqrt(np.sum(
+            (coordinates[rows] - coordinates[columns])**2, axis=1))
+
+        # Sort by tile and then by distance
+        order = np.lexsort((littoral_tiles[columns], distances, rows))
+        rows = rows[order]
+        neighbours = littoral_tiles[columns[order]]
+        distances = distances[order]
+        counts[littoral_tiles] = np.bincount(rows,
+                                             minlength=len(littoral_tiles))
+
+    pointers = np.concatenate([[0], np.cumsum(counts)])
+    return pointers, neighbours, distances
+
+
+class InvalidCheckpoint(Exception):
     """
-    Exception raised when a necessary key is missing from the world YAML file.
+    Exception raised when a checkpoint does not match the world it is loaded
+    into.
     """
-    def __init__(self, key, filename):
+    def __init__(self, filename):
         super().__init__(
-            'Required key "{}" missing from the world definition'
-            ' file "{}".'.format(key, filename)
+            'Checkpoint "{}" was saved from a world with a different'
+            ' map.'.format(filename)
             )
@@ -1,4 +1,6 @@
-from guard import analysis
+from guard import ArrayWorld, analysis, area
+from guard.event_log import EventLog
+from guard.histogram import SizeHistogram
 import numpy as np
 import os
 import pytest
@@ -45,6 +47,94 @@ class TestImperialDensitySummation():
                           == 2.0*self.test_density)
 
 
+def test_imperial_density_world(generate_world):
+    world = generate_world(8, 8)
+    date_range = analysis.DateRange(-1500, 1500)
+    imperial_density = analysis.ImperialDensity(world,
+                                                date_ranges=[date_range])
+    expected = np.zeros([8, 8])
+    for i in range(50):
+        world.step()
+        imperial_density.sample()
+        for tile in world.tiles:
+            if tile.polity.size() > analysis._LARGE_POLITY_THRESHOLD:
+                expected[tile.position] += 1.
+    assert np.all(imperial_density.data[date_range] == expected)
+
+
+@pytest.mark.parametrize('engine', ['World', 'ArrayWorld'])
+def test_attack_events(generate_world, engine):
+    world = generate_world(6, 6)
+    if engine == 'ArrayWorld':
+        world = ArrayWorld.from_world(world)
+    world.set_event_log(EventLog())
+    date_range = analysis.DateRange(-1500, 1500)
+    attack_events = analysis.AttackEvents(world, date_ranges=[date_range])
+    for i in range(20):
+        world.step()
+        attack_events.sample()
+
+    attacks = world.events.events('attack')
+    targets = attacks['target'][attacks['success']]
+    assert np.all(attack_events.data[date_range]
+                  == world.grid(np.bincount(targets, minlength=36)))
+
+
+@pytest.fixture
+def correlation(generate_world_with_sea, dateranges_5_centuries):
+    world = generate_world_with_sea(6, 5, [(0, 0), (5, 4)])
+    rng = np.random.default_rng(2)
+    correlator = analysis.CorrelateBase(world, dateranges_5_centuries)
+    accumulators = [analysis.AccumulatorBase(world, dateranges_5_centuries)
+                    for i in range(3)]
+    for era in dateranges_5_centuries:
+        correlator.data[era] = rng.integers(0, 3, [6, 5]).astype(float)
+        for accumulator in accumulators:
+            accumulator.data[era] = rng.integers(0, 5, [6, 5]).astype(float)
+    return correlator, accumulators
+
+
+@pytest.mark.parametrize('options', [
+    {},
+    {'blur': 1.5},
+    {'cumulative': True, 'log_log': True},
+    {'area': area.Rectangle(1, 5, 0, 4),
+     'exclude': area.Rectangle(2, 3, 0, 5)}
+    ])
+def test_correlate(correlation, options):
+    correlator, accumulators = correlation
+    data = {era: value.copy() for era, value in accumulators[0].data.items()}
+    scores = correlator.correlate(accumulators[0], charts=False, **options)
+    # Correlation does not modify the accumulator
+    for era, value in data.items():
+        assert np.all(accumulators[0].data[era] == value)
+    assert correlator.correlate(accumulators[0], charts=False,
+                                **options) == scores
+
+    # Batched correlation gives the same scores
+    single = [correlator.correlate(accumulator, charts=False, **options)
+              for accumulator in accumulators]
+    batched = correlator.correlate_many(accumulators, **options)
+    for single_scores, batched_scores in zip(single, batched):
+        assert batched_scores == pytest.approx(single_scores)
+
+
+def test_correlate_tiles(correlation):
+    # Sea and excluded tiles are not compared
+    correlator, accumulators = correlation
+    compared = np.ones([6, 5], dtype=bool)
+    compared[0, 0] = compared[5, 4] = False
+    compared[2, :] = False
+    r = [analysis.stats.linregress(accumulators[0].data[era][compared],
+                                   correlator.data[era][compared]).rvalue
+         for era in correlator.date_ranges]
+
+    scores = correlator.correlate(accumulators[0], charts=False,
+                                  exclude=area.Rectangle(2, 3, 0, 5))
+    assert scores[0] == pytest.approx(np.mean(r))
+    assert scores[1] == 23
+
+
 @pytest.fixture(scope='class')
 def example_cities(world_5x5):
     cities = analysis.CitiesPopulation(
@@ -82,3 +172,45 @@ def test_mean_accumulator(world_5x5, daterange_0_100AD, accumulator_class):
 
     mean = analysis.AccumulatorBase.mean(accumulators)
     assert np.all(mean.data[daterange_0_100AD] == mean_data)
+
+
+@pytest.fixture
+def power_law_sizes():
+    # A power law tail above 10 with uniform sizes below
+    rng = np.random.default_rng(1)
+    sizes = rng.zipf(2.5, 20000)
+    return np.concatenate([sizes[sizes >= 10], rng.integers(1, 10, 5000)])
+
+
+def test_fit_power_law(power_law_sizes):
+    fit = analysis.fit_power_law(power_law_sizes, n_bootstrap=200, seed=1)
+    assert fit.xmin >= 5
+    assert fit.n_tail == np.count_nonzero(power_law_sizes >= fit.xmin)
+    assert fit.alpha == pytest.approx(2.5, abs=3*fit.alpha_error)
+    assert 0 < fit.alpha_error < 0.1
+
+
+def test_fit_power_law_histogram(power_law_sizes):
+    histogram = SizeHistogram()
+    histogram.add(power_law_sizes)
+    assert (analysis.fit_power_law(histogram, xmin=10)
+            == analysis.fit_power_law(power_law_sizes, xmin=10))
+
+
+def test_fit_power_law_maximum_likelihood(power_law_sizes):
+    # The exponent maximises the discrete power law likelihood of the tail
+    from scipy import special
+    fit = analysis.fit_power_law(power_law_sizes, xmin=10)
+    tail = power_law_sizes[power_law_sizes >= 10]
+
+    def log_likelihood(alpha):
+        return (-len(tail)*np.log(special.zeta(alpha, 10))
+                - alpha*np.sum(np.log(tail)))
+
+    assert log_likelihood(fit.alpha) > log_likelihood(fit.alpha + 1e-3)
+    assert log_likelihood(fit.alpha) > log_likelihood(fit.alpha - 1e-3)
+
+
+def test_fit_power_law_short_tail():
+    with pytest.raises(ValueError):
+        analysis.fit_power_law([1, 2, 3], min_tail=50)
@@ -0,0 +1,336 @@
+from guard import (World, ArrayWorld, Community, analysis, terrain,
+                   generate_parameters, default_parameters)
+from guard.array_world import ParadigmTable
+from guard.world import MissingYamlKey, InvalidCheckpoint
+import numpy as np
+import os
+import pytest
+
+project_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+@pytest.fixture
+def array_world_with_sea():
+    def _array_world(xdim, ydim, sea_tiles, params=default_parameters):
+        codes = np.full(xdim*ydim, terrain.TERRAINS.index(terrain.agriculture))
+        for x, y in sea_tiles:
+            codes[x + y*xdim] = terrain.TERRAINS.index(terrain.sea)
+        return ArrayWorld(xdim, ydim, codes, np.zeros(xdim*ydim),
+                          np.zeros(xdim*ydim), params)
+    return _array_world
+
+
+def check_polity_aggregates(world):
+    labels = world.labels[world.polity_forming]
+    assert np.all(np.bincount(labels, minlength=world.total_tiles)
+                  == world.polity_size)
+    assert np.all(np.bincount(labels,
+                              weights=world.trait_totals[world.polity_forming],
+                              minlength=world.total_tiles)
+                  == world.polity_traits)
+    assert np.all(world.ultrasocietal_traits.sum(axis=1) == world.trait_totals)
+    assert np.all(world.military_techs.sum(axis=1) == world.tech_totals)
+    paradigms = world.paradigm[world.polity_forming]
+    assert np.all(np.bincount(paradigms,
+                              minlength=len(world.paradigms.followers))
+                  == world.paradigms.followers)
+    # Paradigms are only offered by their followers, and only rows without
+    # followers are free
+    offers = world.offers[world.offers >= 0]
+    assert np.all(world.paradigms.followers[offers] > 0)
+    free = world.paradigms.free_rows()
+    assert len(set(free)) == len(free)
+    assert np.all(world.paradigms.followers[free] == 0)
+
+
+@pytest.fixture(scope='module')
+def yaml_array_world():
+    return ArrayWorld.from_file(project_dir+'/test/data/test_map_5x5.yml')
+
+
+class TestYamlParsing():
+    def test_number_of_polities(self, yaml_array_world):
+        assert yaml_array_world.number_of_polities() == 22
+
+    @pytest.mark.parametrize('coordinate, value', [
+        ((4, 4), terrain.steppe),
+        ((3, 4), terrain.desert),
+        ((4, 0), terrain.sea),
+        ((1, 0), terrain.agriculture)
+        ])
+    def test_terrain(self, yaml_array_world, coordinate, value):
+        codes = yaml_array_world.grid(yaml_array_world.terrain_codes)
+        assert terrain.TERRAINS[codes[coordinate]] is value
+
+    @pytest.mark.parametrize('coordinate, elevation', [((2, 2), 5),
+                                                       ((3, 1), 3),
+                                                       ((3, 0), 1)])
+    def test_elevation(self, yaml_array_world, coordinate, elevation):
+        elevations = yaml_array_world.grid(yaml_array_world.elevation)
+        assert elevations[coordinate] == elevation
+
+    def test_matches_world(self, yaml_array_world):
+        world = World.from_file(project_dir+'/test/data/test_map_5x5.yml')
+        assert np.all(world.terrain_codes == yaml_array_world.terrain_codes)
+
+    @pytest.mark.parametrize('yaml_file', ['missing_xdim.yml',
+                                           'missing_ydim.yml',
+                                           'missing_communities.yml'])
+    def test_missing_keys(self, yaml_file):
+        with pytest.raises(MissingYamlKey):
+            ArrayWorld.from_file(project_dir+'/test/data/'+yaml_file)
+
+
+def test_neighbours(generate_world):
+    world = generate_world(xdim=3, ydim=3)
+    array_world = ArrayWorld.from_world(world)
+    for i, tile in enumerate(world.tiles):
+        expected = [
+            -1 if tile.neighbours[direction] is None
+            else world.tiles.index(tile.neighbours[direction])
+            for direction in ['left', 'right', 'up', 'down']
+            ]
+        assert list(array_world.neighbours[i]) == expected
+
+
+def test_littoral_neighbours(generate_world_with_sea):
+    sea_tiles = [(2, 1), (2, 2), (2, 3), (2, 4),
+                 (0, 4), (1, 4), (3, 4), (4, 4)]
+    world = generate_world_with_sea(xdim=5, ydim=5, sea_tiles=sea_tiles)
+    array_world = ArrayWorld.from_world(world)
+
+    for i, tile in enumerate(world.tiles):
+        assert array_world.littoral[i] == tile.littoral
+        start, end = array_world.littoral_pointers[i:i+2]
+        expected = sorted((neighbour.distance, world.tiles.index(
+            neighbour.neighbour)) for neighbour in tile.littoral_neighbours)
+        assert list(zip(array_world.littoral_distances[start:end],
+                        array_world.littoral_neighbours[start:end])) == (
+            expected)
+
+    in_range = array_world.littoral_neighbours_in_range(2)
+    assert in_range[world.tiles.index(world.index(2, 0))] == 3
+
+
+def test_step_increment(array_world_with_sea):
+    world = array_world_with_sea(5, 5, [(2, 1), (2, 2)])
+    nsteps = 10
+
+    for i in range(nsteps):
+        world.step()
+
+    assert world.step_number == nsteps
+    check_polity_aggregates(world)
+
+
+@pytest.mark.parametrize('params', [
+    generate_parameters(icono=True),
+    generate_parameters(icono=True, mil_spread=True,
+                        spread_para_on_ethnocide=True, mutation_rate=0.5),
+    generate_parameters(icono=True, contagion='Perfect'),
+    generate_parameters(icono=True, n_land_use_rules=4, mut_amount=2),
+    generate_parameters(attack_method='entropy_maximisation')
+    ])
+def test_aggregates_consistent(array_world_with_sea, params):
+    world = array_world_with_sea(6, 6, [(0, 0), (3, 2), (3, 3), (3, 4)],
+                                 params)
+    for i in range(30):
+        world.step()
+        check_polity_aggregates(world)
+
+
+def test_ethnocide_paradigm_spread(generate_world):
+    params = generate_parameters(icono=True, spread_para_on_ethnocide=True,
+                                 threshold=0.5)
+    world = ArrayWorld.from_world(generate_world(20, 20, params), seed=4)
+    attack = world.attack
+
+    def checked_attack():
+        # Ethnocided tiles must not offer the paradigm they abandoned to the
+        # following Leviathan loop
+        attack()
+        offers = world.offers[world.offers >= 0]
+        assert np.all(world.paradigms.followers[offers] > 0)
+
+    world.attack = checked_attack
+    for i in range(100):
+        world.step()
+        check_polity_aggregates(world)
+
+
+@pytest.mark.parametrize('littoral_expectations', [4, 6])
+def test_mimesis_matches_world(littoral_expectations):
+    # Both engines adopt the offered paradigm with the highest expectations,
+    # whether it is offered over land or over sea
+    params = generate_parameters(icono=True, threshold=0, mutation_rate=0,
+                                 base_sea_attack_distance=2)
+    communities = [
+        Community(params, terrain.sea if x == 3 else terrain.agriculture)
+        for y in range(5) for x in range(7)
+        ]
+    world = World(7, 5, communities, params, seed=1)
+    array_world = ArrayWorld.from_world(world, seed=1)
+
+    target = world.index(2, 2)
+    offering = [world.index(x, y) for x, y in [(1, 2), (2, 1), (2, 3), (4, 2)]]
+    expectations = [2, 5, 3, littoral_expectations]
+    best = offering[np.argmax(expectations)]
+    for tile, value in zip(offering, expectations):
+        tile.set_sea_attack_distance(world.sea_attack_distance())
+        tile.paradigm.expectations = value
+        tile.icono.Spread(tile.paradigm)
+        row = array_world.paradigm[tile.index]
+        array_world.paradigms.expectations[row] = value
+        array_world.offers[tile.index] = row
+    target.icono.Response()
+    array_world.leviathan(np.array([target.index]))
+
+    assert target.paradigm is best.paradigm
+    assert (array_world.paradigm[target.index]
+            == array_world.paradigm[best.index])
+    check_polity_aggregates(array_world)
+
+
+def test_expectations_match_world(generate_world):
+    # Four tiles following one paradigm each pull its expectations by a
+    # quarter of 2%
+    params = generate_parameters(icono=True, mutation_rate=0)
+    world = generate_world(4, 1, params)
+    array_world = ArrayWorld.from_world(world, seed=1)
+    tiles = np.arange(4)
+    row = array_world.paradigm[0]
+    array_world.paradigms.switch(array_world.paradigm[1:], [row]*3)
+    array_world.paradigm[tiles] = row
+    array_world.comfort[tiles] = .5
+    expectations = array_world.paradigms.expectations[row]
+    array_world.leviathan(tiles)
+
+    paradigm = world.index(0, 0).paradigm
+    paradigm.expectations = expectations
+    for tile in world.tiles:
+        tile.paradigm = paradigm
+    for tile in world.tiles:
+        tile.agri.yields = array_world.yields[tile.index]
+        tile.icono.comfort = array_world.comfort[tile.index]
+        paradigm.UpdateExpectations(tile)
+    assert (array_world.paradigms.expectations[row]
+            == pytest.approx(paradigm.expectations))
+
+
+def test_seed_reproducible():
+    def run(seed):
+        world = ArrayWorld.from_file(project_dir+'/test/data/test_map_5x5.yml',
+                                     generate_parameters(icono=True),
+                                     seed=seed)
+        for i in range(20):
+            world.step()
+        return world.labels, world.comfort
+
+    labels, comfort = run(7)
+    other_labels, other_comfort = run(7)
+    assert np.all(labels == other_labels)
+    assert np.all(comfort == other_comfort)
+    assert not np.all(comfort == run(8)[1])
+
+
+def test_checkpoint(array_world_with_sea, tmp_path):
+    params = generate_parameters(icono=True, mil_spread=True)
+    world = array_world_with_sea(6, 6, [(0, 0), (3, 2), (3, 3)], params)
+    for i in range(20):
+        world.step()
+    world.save_checkpoint(tmp_path / 'checkpoint.npz')
+    for i in range(20):
+        world.step()
+
+    restored = array_world_with_sea(6, 6, [(0, 0), (3, 2), (3, 3)], params)
+    restored.load_checkpoint(tmp_path / 'checkpoint.npz')
+    for i in range(20):
+        restored.step()
+    assert np.all(restored.labels == world.labels)
+    assert np.all(restored.comfort == world.comfort)
+    assert np.all(restored.paradigms.expectations
+                  == world.paradigms.expectations)
+    check_polity_aggregates(restored)
+
+    with pytest.raises(InvalidCheckpoint):
+        array_world_with_sea(6, 6, []).load_checkpoint(
+            tmp_path / 'checkpoint.npz')
+
+
+def test_disintegration(array_world_with_sea):
+    params = generate_parameters(disintegration_base=1000)
+    world = array_world_with_sea(5, 5, [], params)
+
+    # Merge every tile into one polity
+    world.labels[:] = 0
+    world.polity_size[:] = 0
+    world.polity_size[0] = 25
+
+    world.disintegration()
+    assert world.number_of_polities() == 25
+    assert np.all(world.tile_polity_sizes() == 1)
+
+
+class TestCulturalShift():
+    def test_shift_to_true(self, array_world_with_sea):
+        params = generate_parameters(mutation_to_ultrasocietal=1,
+                                     mutation_from_ultrasocietal=1)
+        world = array_world_with_sea(3, 3, [(1, 1)], params)
+        world.cultural_shift()
+
+        assert np.all(world.trait_totals[world.polity_forming]
+                      == params.n_ultrasocietal_traits)
+        assert world.trait_totals[4] == 0
+        check_polity_aggregates(world)
+
+    def test_shift_to_false(self, array_world_with_sea):
+        params = generate_parameters(mutation_to_ultrasocietal=1,
+                                     mutation_from_ultrasocietal=1)
+        world = array_world_with_sea(3, 3, [(1, 1)], params)
+        world.cultural_shift()
+        world.cultural_shift()
+
+        assert np.all(world.trait_totals == 0)
+        check_polity_aggregates(world)
+
+
+def test_paradigm_table():
+    table = ParadigmTable(n_rules=10, capacity=2)
+    rows = table.new(np.array([0, 1]))
+    assert len(table) == 2
+
+    mutants = table.mutate(rows, np.array([0, 1]), np.array([3, 4]),
+                           mut_amount=1)
+    assert len(table.followers) >= 4
+    assert np.all(table.yield_rules[rows] == 0)
+    assert np.all(table.expectations[mutants] == table.expectations[rows])
+
+    # Rows without followers are reused
+    table.switch(rows, [])
+    assert len(table) == 2
+    assert set(table.new(np.array([2, 3]))) == set(rows)
+
+    # Unless they are still offered
+    free = table.free_rows()
+    table.switch(mutants, [rows[0], rows[0]], offered=[-1, mutants[1]])
+    assert table.free_rows() == free + [mutants[0]]
+    assert table.followers[mutants[1]] == 0
+
+
+def test_imperial_density(array_world_with_sea):
+    world = array_world_with_sea(5, 5, [(4, 4)])
+    date_range = analysis.DateRange(-1500, 1500)
+    imperial_density = analysis.ImperialDensity(world,
+                                                date_ranges=[date_range])
+
+    # Create a large polity from the tiles in the first three columns
+    for tile in range(1, 15):
+        x, y = tile // 5, tile % 5
+        world.labels[x + y*5] = 0
+    world.polity_size = np.bincount(world.labels[world.polity_forming],
+                                    minlength=25)
+
+    imperial_density.sample()
+    expected = np.zeros([5, 5])
+    expected[0:3, :] = 1.
+    assert np.all(imperial_density.data[date_range] == expected)
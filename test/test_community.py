@@ -25,6 +25,37 @@ class TestCommunity(object):
             default_parameters.n_ultrasocietal_traits-traits)
         assert tile.total_ultrasocietal_traits() == traits
 
+    def test_ultrasocietal_traits_packed(self, basic_community):
+        traits = [True, False, False, True, True, False, False, False, True,
+                  False]
+        tile = basic_community()
+        tile.ultrasocietal_traits = traits
+        assert tile.ultrasocietal_traits == tuple(traits)
+
+    def test_read_only_views(self, basic_community):
+        tile = basic_community()
+        with pytest.raises(TypeError):
+            tile.ultrasocietal_traits[0] = True
+        with pytest.raises(TypeError):
+            tile.neighbours['up'] = basic_community()
+
+    def test_copy_ultrasocietal_traits(self, basic_community):
+        tile = basic_community()
+        other = basic_community()
+        other.ultrasocietal_traits = [True]*3 + [False]*(
+            default_parameters.n_ultrasocietal_traits-3)
+        tile.copy_ultrasocietal_traits(other)
+        assert tile.ultrasocietal_traits == other.ultrasocietal_traits
+        assert tile.total_ultrasocietal_traits() == 3
+
+    def test_neighbours(self, basic_community):
+        tile = basic_community()
+        neighbour = basic_community()
+        tile.neighbours = {'left': None, 'right': neighbour, 'up': None,
+                           'down': None}
+        assert tile.adjacent == (None, neighbour, None, None)
+        assert tile.neighbours['right'] is neighbour
+
     def test_total_military_techs(self,  basic_community):
         techs = 7
         tile = basic_community()
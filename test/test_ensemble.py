@@ -0,0 +1,79 @@
+from guard import World, ArrayWorld, generate_parameters
+from guard.daterange import DateRange
+from guard import ensemble
+from guard.ensemble import run_ensemble
+import numpy as np
+import os
+import pytest
+
+project_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+map_file = project_dir+'/test/data/test_map_5x5.yml'
+date_ranges = [DateRange(-1500, -1460)]
+params = generate_parameters(disintegration_base=0)
+
+
+@pytest.mark.parametrize('engine', [World, ArrayWorld])
+def test_ensemble_shape(engine):
+    result = run_ensemble(map_file, 3, params, seed=1, steps=20,
+                          engine=engine, date_ranges=date_ranges,
+                          processes=1)
+    assert result.n_runs == 3
+    assert result.mean.data[date_ranges[0]].shape == (5, 5)
+    assert np.all(result.variance.data[date_ranges[0]] >= 0)
+
+
+def test_ensemble_reproducible():
+    serial = run_ensemble(map_file, 4, params, seed=1, steps=20,
+                          engine=ArrayWorld, date_ranges=date_ranges,
+                          processes=1)
+    parallel = run_ensemble(map_file, 4, params, seed=1, steps=20,
+                            engine=ArrayWorld, date_ranges=date_ranges,
+                            processes=2)
+    era = date_ranges[0]
+    assert np.all(serial.mean.data[era] == parallel.mean.data[era])
+    assert np.all(serial.variance.data[era] == parallel.variance.data[era])
+
+
+def test_ensemble_variance():
+    result = run_ensemble(map_file, 1, params, seed=1, steps=20,
+                          engine=ArrayWorld, date_ranges=date_ranges,
+                          processes=1)
+    assert np.all(result.variance.data[date_ranges[0]] == 0)
+
+
+@pytest.mark.parametrize('engine', [World, ArrayWorld])
+def test_ensemble_sizes(engine):
+    result = run_ensemble(map_file, 3, params, seed=1, steps=20,
+                          engine=engine, date_ranges=date_ranges,
+                          processes=1)
+    world = World.from_file(map_file)
+    assert (len(result.battles_by_size)
+            == 3*20*len(world.polity_forming_tiles))
+    assert len(result.polity_sizes) >= 3
+
+
+
+def test_reused_worker_world(monkeypatch):
+    # A run on a world reused from an earlier run, with paradigms still
+    # offered at its end, matches the same run on a new world. With no
+    # threshold any paradigm left in an inbox would be adopted
+    icono_params = generate_parameters(disintegration_base=0, icono=True,
+                                       threshold=0)
+
+    def run(seed):
+        replica = ensemble._run_replica(World, map_file, icono_params, 20,
+                                        date_ranges, seed)
+        world = ensemble._worker_world['world']
+        return replica, [(tile.paradigm.expectations, tile.icono.comfort)
+                         for tile in world.polity_forming_tiles]
+
+    monkeypatch.setitem(ensemble._worker_world, 'key', None)
+    fresh, fresh_state = run(2)
+    monkeypatch.setitem(ensemble._worker_world, 'key', None)
+    run(1)
+    reused, reused_state = run(2)
+    era = date_ranges[0]
+    assert np.all(fresh.imperial_density[era] == reused.imperial_density[era])
+    assert fresh.polity_sizes.to_list() == reused.polity_sizes.to_list()
+    assert fresh.battles_by_size.to_list() == reused.battles_by_size.to_list()
+    assert fresh_state == reused_state
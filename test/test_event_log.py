@@ -0,0 +1,78 @@
+from guard import ArrayWorld
+from guard.event_log import EventLog, read_event_log
+import numpy as np
+import pytest
+
+
+def fill(log):
+    for i in range(7):
+        log.step = i
+        log.record('attack', i, i+1, i % 2 == 0, True)
+        log.extend('adoption', np.arange(i), np.zeros(i), np.ones(i))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 100])
+def test_chunks(chunk_size, tmp_path):
+    in_memory = EventLog(chunk_size=chunk_size)
+    fill(in_memory)
+    with EventLog(str(tmp_path), chunk_size=chunk_size) as on_disk:
+        fill(on_disk)
+        assert len(on_disk) == len(in_memory) == 7 + 21
+
+    attacks = in_memory.events('attack')
+    assert attacks['step'].tolist() == list(range(7))
+    assert attacks['sea'].tolist() == [i % 2 == 0 for i in range(7)]
+    adoptions = in_memory.events('adoption')
+    assert adoptions['tile'].tolist() == [j for i in range(7)
+                                          for j in range(i)]
+    for kind in ['attack', 'adoption', 'mutation']:
+        assert np.all(read_event_log(str(tmp_path), kind)
+                      == in_memory.events(kind))
+    columns = read_event_log(str(tmp_path), 'adoption', ['step'], mmap=True)
+    assert np.all(columns['step'] == adoptions['step'])
+
+
+def test_world_events(generate_world):
+    world = generate_world(6, 6)
+    world.set_event_log(EventLog(chunk_size=10))
+    targets = []
+    for i in range(20):
+        world.step(attack_callback=targets.append)
+
+    attacks = world.events.events('attack')
+    assert np.all(np.diff(attacks['step']) >= 0)
+    assert attacks['step'][-1] == 19
+    # The callback is invoked for every attack made
+    assert attacks['target'].tolist() == [tile.index for tile in targets]
+    ethnocides = world.events.events('ethnocide')
+    assert len(ethnocides) <= np.count_nonzero(attacks['success'])
+
+    disintegrations = world.events.events('disintegration')
+    assert len(world.polity_sizes) == len(disintegrations)
+    assert np.all(disintegrations['size'] > 1)
+
+
+def test_array_world_events(generate_world):
+    world = ArrayWorld.from_world(generate_world(6, 6))
+    world.set_event_log(EventLog(chunk_size=10))
+    for i in range(20):
+        world.step()
+
+    attacks = world.events.events('attack')
+    assert np.all(np.diff(attacks['step']) >= 0)
+    assert np.all(world.labels[attacks['attacker']] >= 0)
+    disintegrations = world.events.events('disintegration')
+    assert len(world.polity_sizes) == len(disintegrations)
+    mutations = world.events.events('mutation')
+    assert np.all(mutations['old'] != mutations['new'])
+
+
+def test_stop_recording(generate_world):
+    world = ArrayWorld.from_world(generate_world(4, 4))
+    world.set_event_log(EventLog())
+    world.step()
+    recorded = len(world.events)
+    events = world.events
+    world.set_event_log(None)
+    world.step()
+    assert len(events) == recorded
@@ -0,0 +1,97 @@
+from guard import ArrayWorld
+from guard.histogram import SizeHistogram
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def sizes():
+    return np.random.default_rng(1).zipf(2.5, 1000)
+
+
+def test_counts(sizes):
+    histogram = SizeHistogram()
+    histogram.add(sizes[:500])
+    for size in sizes[500:]:
+        histogram.add(size)
+    assert len(histogram) == len(sizes)
+    assert histogram.to_list() == sorted(sizes.tolist())
+
+
+def test_log_binned(sizes):
+    histogram = SizeHistogram()
+    histogram.add(np.concatenate([sizes, [0, 0]]))
+    edges, density = histogram.log_binned(bin_multiplier=1.8)
+    assert edges[0] == sizes.min()
+    assert edges[-2] < sizes.max() <= edges[-1]
+    expected, expected_edges = np.histogram(sizes, bins=edges, density=True)
+    assert density == pytest.approx(expected)
+
+
+def test_empty_log_binned():
+    edges, density = SizeHistogram().log_binned()
+    assert len(edges) == 0 and len(density) == 0
+
+
+def test_merge(sizes):
+    histogram = SizeHistogram()
+    other = SizeHistogram()
+    histogram.add(sizes[:300])
+    other.add(sizes[300:])
+    histogram.merge(other)
+    assert histogram.to_list() == sorted(sizes.tolist())
+
+
+@pytest.mark.parametrize('split', [0, 5, 300])
+def test_reservoir_sample(sizes, split):
+    histogram = SizeHistogram(sample_size=10, seed=1)
+    other = SizeHistogram(sample_size=10, seed=2)
+    histogram.add(sizes[:split])
+    other.add(sizes[split:])
+    histogram.merge(other)
+    assert len(histogram.sample) == 10
+    assert set(histogram.sample.tolist()) <= set(sizes.tolist())
+
+
+def test_reservoir_sample_uniform():
+    # Each of 100 sizes should be sampled with probability 1/10
+    sampled = np.zeros(100)
+    for seed in range(500):
+        histogram = SizeHistogram(sample_size=10, seed=seed)
+        histogram.add(np.arange(50))
+        histogram.add(np.arange(50, 100))
+        sampled[histogram.sample] += 1
+    assert sampled[:50].mean() == pytest.approx(50, rel=0.1)
+    assert sampled[50:].mean() == pytest.approx(50, rel=0.1)
+
+
+def test_state(sizes):
+    histogram = SizeHistogram(sample_size=10, seed=1)
+    histogram.add(sizes[:500])
+    restored = SizeHistogram(sample_size=10, seed=2)
+    restored.set_state('sizes', histogram.get_state('sizes'))
+    histogram.add(sizes[500:])
+    restored.add(sizes[500:])
+    assert restored.to_list() == histogram.to_list()
+    assert np.all(restored.sample == histogram.sample)
+
+
+@pytest.mark.parametrize('array_world', [False, True])
+def test_world_battles_by_size(generate_world, array_world):
+    world = generate_world(4, 4)
+    if array_world:
+        world = ArrayWorld.from_world(world)
+    n_polity_forming = np.count_nonzero(world.polity_forming)
+    for i in range(5):
+        world.step()
+    assert len(world.battles_by_size) == 5*n_polity_forming
+    disintegrated = len(world.polity_sizes)
+    assert world.end() is world.polity_sizes
+    assert (len(world.polity_sizes)
+            == disintegrated + world.number_of_polities())
+
+    # Each run starts with empty histograms
+    world.reset()
+    assert len(world.polity_sizes) == len(world.battles_by_size) == 0
+    world.step()
+    assert len(world.battles_by_size) == n_polity_forming
@@ -0,0 +1,101 @@
+from guard.daterange import (DateRange, InvalidDateRange, cities_date_ranges,
+                             imperial_density_date_ranges)
+from guard.historical_data import (load_cities, load_battles, parse_cities,
+                                   parse_battles, compiled_data_path,
+                                   population_grids, battle_grids)
+import numpy as np
+import os
+import pytest
+import shutil
+import yaml
+
+project_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+@pytest.fixture
+def cities_copy(tmp_path):
+    yaml_file = str(tmp_path / 'test_cities.yml')
+    shutil.copy(project_dir+'/test/data/test_cities.yml', yaml_file)
+    return yaml_file
+
+
+@pytest.fixture
+def battles_file(tmp_path):
+    battles = [{'label': 'a', 'x': 1, 'y': 2, 'year': -1500},
+               {'label': 'b', 'x': 1, 'y': 2, 'year': 499},
+               {'label': 'c', 'x': 0, 'y': 3, 'year': -600},
+               {'label': 'd', 'x': 4, 'y': 0, 'year': 500},
+               {'label': 'e', 'x': 4, 'y': 0, 'year': 1500}]
+    yaml_file = str(tmp_path / 'battles.yml')
+    with open(yaml_file, 'w') as outfile:
+        yaml.dump(battles, outfile)
+    return yaml_file
+
+
+def test_compiled_cities_reused(cities_copy):
+    cities = load_cities(cities_copy)
+    assert os.path.exists(compiled_data_path(cities_copy))
+    modified = os.path.getmtime(compiled_data_path(cities_copy))
+    compiled = load_cities(cities_copy)
+    assert os.path.getmtime(compiled_data_path(cities_copy)) == modified
+    for field, value in zip(cities._fields, cities):
+        assert np.array_equal(getattr(compiled, field), value)
+
+
+def test_stale_compiled_cities(cities_copy):
+    load_cities(cities_copy)
+    with open(cities_copy, 'r') as infile:
+        contents = infile.read()
+    with open(cities_copy, 'w') as outfile:
+        outfile.write(contents.replace('42000', '43000'))
+    cities = load_cities(cities_copy)
+    assert np.all(cities.population == parse_cities(cities_copy).population)
+    assert 43000 in cities.population
+
+
+@pytest.mark.parametrize('length', [0, 0.5])
+def test_partly_written_compiled_cities(cities_copy, length):
+    load_cities(cities_copy)
+    with open(compiled_data_path(cities_copy), 'rb') as infile:
+        contents = infile.read()
+    with open(compiled_data_path(cities_copy), 'wb') as outfile:
+        outfile.write(contents[:int(len(contents)*length)])
+
+    cities = load_cities(cities_copy)
+    assert np.array_equal(cities.population,
+                          parse_cities(cities_copy).population,
+                          equal_nan=True)
+    assert np.all(load_cities(cities_copy).x == cities.x)
+
+
+def test_population_grids(cities_copy):
+    grids = population_grids(load_cities(cities_copy), cities_date_ranges,
+                             5, 5)
+    assert grids['0-500AD'][0, 0] == 42000
+    assert grids['1400AD-1500AD'][2, 4] == 400000
+    assert grids['1400AD-1500AD'].sum() == 438000
+
+
+def test_missing_population(cities_copy):
+    with pytest.raises(InvalidDateRange):
+        population_grids(load_cities(cities_copy), [DateRange(0, 100)], 5, 5)
+
+
+def test_battle_grids(battles_file):
+    battles = load_battles(battles_file, cache=False)
+    assert not os.path.exists(compiled_data_path(battles_file))
+    assert np.all(np.diff(battles.year) >= 0)
+
+    grids = battle_grids(battles, imperial_density_date_ranges, 5, 5)
+    expected = {era: np.zeros([5, 5]) for era in imperial_density_date_ranges}
+    with open(battles_file, 'r') as infile:
+        records = yaml.load(infile, Loader=yaml.FullLoader)
+    for battle in records:
+        for era in imperial_density_date_ranges:
+            if era.is_within(battle['year']):
+                expected[era][battle['x'], battle['y']] += 1.
+    for era in imperial_density_date_ranges:
+        assert np.all(grids[era] == expected[era])
+    assert grids['1500BC-500BC'][1, 2] == 1
+    assert grids['500AD-1500AD'][4, 0] == 1
+    assert np.all(parse_battles(battles_file).year == battles.year)
@@ -0,0 +1,102 @@
+from guard import World
+from guard.map_file import (load_map, parse_map, compile_map,
+                            compiled_map_path, MissingYamlKey)
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import os
+import pytest
+import shutil
+
+project_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+@pytest.fixture
+def map_copy(tmp_path):
+    yaml_file = str(tmp_path / 'test_map_5x5.yml')
+    shutil.copy(project_dir+'/test/data/test_map_5x5.yml', yaml_file)
+    return yaml_file
+
+
+def assert_maps_equal(map_data, other):
+    assert (map_data.xdim, map_data.ydim) == (other.xdim, other.ydim)
+    assert np.all(map_data.terrain_codes == other.terrain_codes)
+    assert np.all(map_data.elevation == other.elevation)
+    assert np.all(map_data.period_codes == other.period_codes)
+
+
+def test_compiled_map_written(map_copy):
+    load_map(map_copy)
+    assert os.path.exists(compiled_map_path(map_copy))
+
+
+def test_compiled_map_matches_yaml(map_copy):
+    compile_map(map_copy)
+    assert_maps_equal(load_map(map_copy), parse_map(map_copy))
+
+
+def test_compiled_map_reused(map_copy):
+    compile_map(map_copy)
+    modified = os.path.getmtime(compiled_map_path(map_copy))
+    load_map(map_copy)
+    assert os.path.getmtime(compiled_map_path(map_copy)) == modified
+
+
+def test_stale_compiled_map(map_copy):
+    compile_map(map_copy)
+    with open(map_copy, 'r') as infile:
+        contents = infile.read()
+    with open(map_copy, 'w') as outfile:
+        outfile.write(contents.replace('xdim: 5', 'xdim: 5\n# edited', 1))
+    # Make the stale compiled map distinguishable from the recompiled one
+    compiled = dict(np.load(compiled_map_path(map_copy)))
+    compiled['elevation'] = compiled['elevation'] + 1
+    with open(compiled_map_path(map_copy), 'wb') as outfile:
+        np.savez(outfile, **compiled)
+
+    assert_maps_equal(load_map(map_copy), parse_map(map_copy))
+
+
+@pytest.mark.parametrize('length', [0, 0.5])
+def test_partly_written_compiled_map(map_copy, length):
+    compile_map(map_copy)
+    with open(compiled_map_path(map_copy), 'rb') as infile:
+        contents = infile.read()
+    with open(compiled_map_path(map_copy), 'wb') as outfile:
+        outfile.write(contents[:int(len(contents)*length)])
+
+    assert_maps_equal(load_map(map_copy), parse_map(map_copy))
+    modified = os.path.getmtime(compiled_map_path(map_copy))
+    load_map(map_copy)
+    assert os.path.getmtime(compiled_map_path(map_copy)) == modified
+
+
+def test_concurrent_compile(map_copy):
+    with ProcessPoolExecutor(4) as pool:
+        maps = list(pool.map(load_map, [map_copy]*8))
+    for map_data in maps:
+        assert_maps_equal(map_data, parse_map(map_copy))
+    assert sorted(os.listdir(os.path.dirname(map_copy))) == [
+        os.path.basename(map_copy), os.path.basename(map_copy) + '.npz']
+
+
+def test_no_cache(map_copy):
+    load_map(map_copy, cache=False)
+    assert not os.path.exists(compiled_map_path(map_copy))
+
+
+def test_missing_key(tmp_path):
+    yaml_file = str(tmp_path / 'missing_xdim.yml')
+    shutil.copy(project_dir+'/test/data/missing_xdim.yml', yaml_file)
+    with pytest.raises(MissingYamlKey):
+        load_map(yaml_file)
+    assert not os.path.exists(compiled_map_path(yaml_file))
+
+
+def test_world_from_compiled_map(map_copy):
+    parsed = World.from_file(map_copy, cache=False)
+    compile_map(map_copy)
+    compiled = World.from_file(map_copy)
+    for tile, other in zip(parsed.tiles, compiled.tiles):
+        assert tile.terrain is other.terrain
+        assert tile.elevation == other.elevation
+        assert tile.period is other.period
@@ -231,6 +231,59 @@ def test_transfer(arbitrary_polity):
                 state_a.communities[-1].elevation == 12])
 
 
+# Ensure communities know their position in the polity after removals
+def test_swap_remove(polity_10):
+    state = polity_10
+    removed = [state.communities[i] for i in [0, 4, 9]]
+    for community in removed:
+        state.remove_community(community)
+
+    assert state.size() == 7
+    assert all([community not in state.communities for community in removed])
+    assert all([state.communities[community.polity_index] is community
+                for community in state.communities])
+
+
+# Ensure registered polities are given ids and label their communities
+def test_register_labels():
+    register = polity.PolityRegister(4)
+    communities = [Community(default_parameters) for i in range(4)]
+    for i, community in enumerate(communities):
+        community.index = i
+    state_a = polity.Polity(communities[:3], register)
+    state_b = polity.Polity(communities[3:], register)
+    assert [state_a.id, state_b.id] == [0, 1]
+
+    state_b.transfer_community(communities[0])
+    assert list(register.labels) == [1, 0, 0, 1]
+
+    # Ids of empty polities are reused once pruned
+    new_states = state_a.disintegrate()
+    register.prune()
+    assert sorted([state.id for state in new_states]) == [2, 3]
+    assert polity.Polity([], register).id == 0
+    assert register.polities() == [state_b] + new_states
+
+
+# Ensure the running total of traits follows transfers and trait changes
+def test_trait_total(arbitrary_polity, example_traits):
+    traits, _ = example_traits
+    state_a = arbitrary_polity(10)
+    state_b = arbitrary_polity(10)
+    set_ultrasocietal_traits(default_parameters, state_a, traits)
+    set_ultrasocietal_traits(default_parameters, state_b, traits)
+
+    state_a.transfer_community(state_b.communities[4])
+    state_a.communities[0].ultrasocietal_traits = (
+        [True]*default_parameters.n_ultrasocietal_traits)
+
+    for state in [state_a, state_b]:
+        assert state.trait_total == sum(
+            [community.total_ultrasocietal_traits()
+             for community in state.communities])
+    assert state_a.trait_total == sum(traits) + 8 + 7
+
+
 # Assign the example ultrasocietal traits to polity
 def set_ultrasocietal_traits(params, polity, traits):
     for i, number in enumerate(traits):
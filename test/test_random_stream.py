@@ -0,0 +1,72 @@
+from guard.random_stream import RandomStream, spawn_streams
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def stream():
+    return RandomStream(np.random.default_rng(0), block_size=100)
+
+
+def test_random_range(stream):
+    draws = [stream.random() for i in range(1000)]
+    assert min(draws) >= 0
+    assert max(draws) < 1
+    assert np.mean(draws) == pytest.approx(0.5, abs=0.05)
+
+
+def test_blocks_match_generator():
+    stream = RandomStream(np.random.default_rng(0), block_size=100)
+    draws = [stream.random() for i in range(250)]
+    expected = np.random.default_rng(0).random(300)[:250]
+    assert np.all(np.array(draws) == expected)
+
+
+def test_block_shape(stream):
+    assert stream.block((5, 3)).shape == (5, 3)
+
+
+def test_randint(stream):
+    draws = [stream.randint(4) for i in range(1000)]
+    assert set(draws) == {0, 1, 2, 3}
+
+
+def test_choice(stream):
+    sequence = ('left', 'right', 'up', 'down')
+    assert stream.choice(sequence) in sequence
+
+
+@pytest.mark.parametrize('probabilities', [[0, 1, 0], [0.5, 0.5, 0]])
+def test_weighted_index(stream, probabilities):
+    counts = np.bincount([stream.weighted_index(probabilities)
+                          for i in range(1000)], minlength=3)
+    assert np.all(counts/1000 == pytest.approx(probabilities, abs=0.05))
+
+
+def test_permutation(stream):
+    assert sorted(stream.permutation(10)) == list(range(10))
+
+
+def test_spawn_streams_reproducible():
+    first = spawn_streams(42)
+    second = spawn_streams(42)
+    for stream, other in zip(first, second):
+        assert np.all(stream.block(10) == other.block(10))
+
+
+def test_spawn_streams_independent():
+    streams = spawn_streams(42)
+    assert not np.all(streams.attack.block(10) == streams.world.block(10))
+
+
+def test_spawn_streams_from_seed_sequence():
+    seed = np.random.SeedSequence(42)
+    first = spawn_streams(seed)
+    second = spawn_streams(seed)
+    assert np.all(first.world.block(10) == second.world.block(10))
+
+
+def test_spawn_streams_from_generator():
+    streams = spawn_streams(np.random.default_rng(42))
+    other = spawn_streams(np.random.default_rng(42))
+    assert np.all(streams.leviathan.block(10) == other.leviathan.block(10))
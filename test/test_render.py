@@ -0,0 +1,188 @@
+from guard import ArrayWorld, render
+from guard.area import Rectangle
+from guard.render import (MapRenderer, FrameWriter, BackgroundFrameWriter,
+                          MissingEncoder, LAYERS, colour_table, write_png,
+                          export_animation)
+from guard.world import TILE_VALUES
+from matplotlib import colormaps, image
+import numpy as np
+import os
+from PIL import Image
+import pytest
+import shutil
+
+SEA_TILES = [(0, 0), (3, 1), (4, 2)]
+
+
+@pytest.fixture
+def world(generate_world_with_sea):
+    world = generate_world_with_sea(5, 4, SEA_TILES)
+    for i in range(3):
+        world.step()
+    return world
+
+
+@pytest.mark.parametrize('array_world', [False, True])
+def test_tile_values(world, array_world):
+    if array_world:
+        world = ArrayWorld.from_world(world)
+    sea = world.grid(~world.polity_forming)
+    for name in TILE_VALUES:
+        values = world.grid(world.tile_values(name))
+        assert values.shape == (5, 4)
+        if name in ['labels', 'paradigm']:
+            assert np.all(values[sea] == -1)
+            assert np.all(values[~sea] >= 0)
+        else:
+            assert np.all(values[sea] == 0)
+
+
+def test_world_tile_values(world):
+    comfort = world.tile_values('comfort')
+    paradigm = world.tile_values('paradigm')
+    for tile in world.polity_forming_tiles:
+        assert comfort[tile.index] == tile.icono.comfort
+        assert paradigm[tile.index] == tile.paradigm.row
+    assert np.all(world.tile_values('labels') == world.labels)
+    assert (world.tile_values('military_techs')[world.index(1, 1).index]
+            == world.index(1, 1).total_military_techs())
+
+
+def test_frame(world):
+    renderer = MapRenderer(world)
+    values = world.tile_values('comfort')
+    frame = renderer.frame(values)
+    assert frame.shape == (4, 5, 4) and frame.dtype == np.uint8
+
+    # As drawn by the analysis plots
+    expected = np.rot90(colormaps['RdYlGn_r'](world.grid(values)))
+    sea = np.rot90(world.grid(~world.polity_forming))
+    assert np.all(np.abs(frame[~sea] - expected[~sea]*255) <= 1)
+    assert np.all(frame[sea] == [64, 147, 237, 255])
+    # North at the top
+    assert np.all(frame[3, 0] == [64, 147, 237, 255])
+
+
+def test_categories(world):
+    renderer = MapRenderer(world)
+    frame = renderer.render('polities')
+    labels = np.rot90(world.grid(world.labels))
+    colours = colour_table('tab20')
+    for row, column in zip(*np.nonzero(labels >= 0)):
+        assert np.all(frame[row, column]
+                      == colours[labels[row, column] % len(colours)])
+
+
+def test_area_and_scale(world):
+    values = world.tile_values('yields')
+    frame = MapRenderer(world).frame(values, vmax=10.)
+    area = Rectangle(1, 4, 1, 3)
+    scaled = MapRenderer(world, area=area, scale=2).frame(values, vmax=10.)
+    assert scaled.shape == (4, 6, 4)
+    assert np.all(scaled[::2, ::2] == frame[1:3, 1:4])
+    assert np.all(scaled[1::2, 1::2] == frame[1:3, 1:4])
+
+
+@pytest.mark.parametrize('layer', LAYERS)
+def test_png(world, layer, tmp_path):
+    renderer = MapRenderer(world, highlight_desert=True,
+                           highlight_steppe=True)
+    filename = renderer.save(layer, str(tmp_path / 'frame.png'))
+    read = np.round(image.imread(filename)*255)
+    assert np.all(read == renderer.render(layer))
+
+
+def test_png_compression(tmp_path):
+    frame = np.random.default_rng(1).integers(0, 256, [7, 3, 4],
+                                              dtype=np.uint8)
+    for compression in [0, 9]:
+        write_png(str(tmp_path / 'frame.png'), frame, compression)
+        read = np.round(image.imread(str(tmp_path / 'frame.png'))*255)
+        assert np.all(read == frame)
+
+
+def test_frame_writer(generate_world, tmp_path, monkeypatch):
+    world = ArrayWorld.from_world(generate_world(4, 4))
+    frames = FrameWriter(MapRenderer(world), str(tmp_path / 'frames'),
+                         layers=['polities', 'comfort'], every=3)
+    frames.update()
+    for i in range(7):
+        world.step()
+        frames.update()
+        frames.update()
+    assert [os.path.basename(filename) for filename in frames.filenames] == [
+        '{}_{:05d}.png'.format(layer, step)
+        for step in [0, 3, 6] for layer in ['polities', 'comfort']
+        ]
+    assert sorted(os.listdir(str(tmp_path / 'frames'))) == sorted(
+        os.path.basename(filename) for filename in frames.filenames)
+
+    exported = []
+    monkeypatch.setattr(render, 'export_animation',
+                        lambda *args: exported.append(args))
+    frames.export('comfort.gif', 'comfort', fps=5)
+    assert exported == [(frames.filenames[1::2], 'comfort.gif', 5)]
+
+
+@pytest.mark.parametrize('max_pending,processes', [(1, 1), (3, 2)])
+def test_background_frame_writer(generate_world, tmp_path, max_pending,
+                                 processes):
+    world = ArrayWorld.from_world(generate_world(6, 5))
+    layers = ['polities', 'comfort', 'yields', 'paradigms']
+    frames = FrameWriter(MapRenderer(world), str(tmp_path / 'frames'),
+                         layers=layers, every=2)
+    with BackgroundFrameWriter(MapRenderer(world),
+                               str(tmp_path / 'background'), layers=layers,
+                               every=2, max_pending=max_pending,
+                               processes=processes) as background:
+        for i in range(9):
+            world.step()
+            frames.update()
+            background.update()
+    assert len(background.filenames) == 4*len(layers)
+    for filename, written in zip(frames.filenames, background.filenames):
+        assert os.path.basename(filename) == os.path.basename(written)
+        with open(filename, 'rb') as expected, open(written, 'rb') as read:
+            assert expected.read() == read.read()
+
+
+def test_background_error(generate_world, tmp_path):
+    world = ArrayWorld.from_world(generate_world(4, 4))
+    background = BackgroundFrameWriter(MapRenderer(world),
+                                       str(tmp_path / 'frames'), every=1)
+    shutil.rmtree(str(tmp_path / 'frames'))
+    world.step()
+    background.update()
+    with pytest.raises(FileNotFoundError):
+        background.close()
+
+
+@pytest.fixture
+def png_frames(tmp_path):
+    filenames = []
+    for i in range(4):
+        filenames.append(str(tmp_path / 'frame_{}.png'.format(i)))
+        write_png(filenames[-1], np.full([5, 7, 4], 60*i + 15, np.uint8))
+    return filenames
+
+
+def test_export_gif(png_frames, tmp_path):
+    export_animation(png_frames, str(tmp_path / 'run.gif'), fps=5)
+    with Image.open(str(tmp_path / 'run.gif')) as animation:
+        assert animation.n_frames == 4
+        assert animation.size == (7, 5)
+
+
+def test_missing_encoder(tmp_path, monkeypatch):
+    write_png(str(tmp_path / 'frame.png'), np.zeros([2, 2, 4], np.uint8))
+    monkeypatch.setattr(shutil, 'which', lambda name: None)
+    with pytest.raises(MissingEncoder):
+        export_animation([str(tmp_path / 'frame.png')],
+                         str(tmp_path / 'run.mp4'))
+
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None,
+                    reason='ffmpeg is not installed')
+def test_export_mp4(png_frames, tmp_path):
+    export_animation(png_frames, str(tmp_path / 'run.mp4'))
+    assert os.path.getsize(str(tmp_path / 'run.mp4')) > 0
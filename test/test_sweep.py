@@ -0,0 +1,98 @@
+from guard import ArrayWorld, generate_parameters, sweep as sweep_module
+from guard.sweep import grid_design, random_design, run_sweep
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import os
+import pickle
+import pytest
+
+project_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+map_file = project_dir+'/test/data/test_map_5x5.yml'
+
+
+def test_grid_design():
+    design = grid_design(threshold=[1, 2], mult=[0.5, 1, 2])
+    assert len(design) == 6
+    assert {'threshold': 2, 'mult': 0.5} in design
+
+
+def test_random_design():
+    design = random_design(10, seed=1, num_icono_loops=(1, 3),
+                           sensitivity=(0.1, 0.2))
+    assert design == random_design(10, seed=1, num_icono_loops=(1, 3),
+                                   sensitivity=(0.1, 0.2))
+    assert all(point['num_icono_loops'] in [1, 2, 3] for point in design)
+    assert all(0.1 <= point['sensitivity'] < 0.2 for point in design)
+
+
+@pytest.fixture
+def sweep_dir(tmp_path, monkeypatch):
+    # Correlation plots are written to the working directory
+    monkeypatch.chdir(tmp_path)
+    historical = np.random.default_rng(0).random([5, 5])
+    with open(tmp_path / 'impd.pkl', 'wb') as picklefile:
+        pickle.dump({'1500BC-500BC': historical.copy(),
+                     '500BC-500AD': historical.copy(),
+                     '500AD-1500AD': historical.copy()}, picklefile)
+    return tmp_path
+
+
+def sweep(sweep_dir, design, processes=1):
+    params = generate_parameters(disintegration_base=0)
+    return run_sweep(map_file, design, str(sweep_dir / 'results.csv'),
+                     str(sweep_dir / 'impd.pkl'), params, n_runs=2,
+                     engine=ArrayWorld, seed=3, processes=processes)
+
+
+def test_sweep_resumes(sweep_dir):
+    design = grid_design(disintegration_size_coefficient=[0.01, 0.02])
+    first = sweep(sweep_dir, design[:1])
+    assert len(first) == 1
+
+    # The completed point is read back rather than run again
+    rows = sweep(sweep_dir, design)
+    assert len(rows) == 2
+    assert rows[0] == first[0]
+    with open(sweep_dir / 'results.csv') as results:
+        assert len(results.readlines()) == 3
+
+    # A sweep run in one go gives the same scores
+    os.remove(sweep_dir / 'results.csv')
+    assert sweep(sweep_dir, design, processes=2) == rows
+
+
+def test_sweep_mismatched_file(sweep_dir):
+    sweep(sweep_dir, grid_design(disintegration_size_coefficient=[0.01]))
+    with pytest.raises(ValueError):
+        sweep(sweep_dir, grid_design(mult=[1]))
+
+
+def test_sweep_partly_written_row(sweep_dir):
+    design = grid_design(disintegration_size_coefficient=[0.01, 0.02])
+    rows = sweep(sweep_dir, design)
+
+    # Interrupted while writing the second row
+    with open(sweep_dir / 'results.csv') as results:
+        lines = results.readlines()
+    with open(sweep_dir / 'results.csv', 'w') as results:
+        results.writelines(lines[:2])
+        results.write(lines[2][:len(lines[2])//2])
+    assert sweep(sweep_dir, design) == rows
+    with open(sweep_dir / 'results.csv') as results:
+        assert results.readlines() == lines
+
+
+def test_sweep_error_cancels_runs(sweep_dir, monkeypatch):
+    shutdowns = []
+
+    class Pool(ProcessPoolExecutor):
+        def shutdown(self, wait=True, *, cancel_futures=False):
+            shutdowns.append(cancel_futures)
+            super().shutdown(wait, cancel_futures=cancel_futures)
+
+    monkeypatch.setattr(sweep_module, 'ProcessPoolExecutor', Pool)
+    design = grid_design(icono=[True], contagion=['Invalid'],
+                         disintegration_size_coefficient=[0.01, 0.02])
+    with pytest.raises(Exception, match='Invalid contagion'):
+        sweep(sweep_dir, design, processes=2)
+    assert shutdowns[0] is True
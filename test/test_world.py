@@ -1,8 +1,10 @@
-from guard import (World, terrain, generate_parameters,
+from guard import (World, Community, terrain, generate_parameters,
                    default_parameters, period)
-from guard.world import MissingYamlKey
+from guard.world import MissingYamlKey, InvalidCheckpoint
 from guard.community import LittoralNeighbour
 from numpy import sqrt
+import gc
+import numpy as np
 import os
 import pytest
 
@@ -222,6 +224,60 @@ class TestLittoralNeighbours(object):
             world.index(4, 3), sqrt(13)) in in_range
 
 
+    def test_littoral_neighbours_sorted(self, generate_world_with_sea):
+        world = generate_world_with_sea(
+            xdim=5, ydim=5,
+            sea_tiles=[(2, 1), (2, 2), (2, 3), (2, 4),
+                       (0, 4), (1, 4), (3, 4), (4, 4)]
+            )
+
+        for tile in world.tiles:
+            distances = [neighbour.distance
+                         for neighbour in tile.littoral_neighbours]
+            assert distances == sorted(distances)
+            assert distances == tile.littoral_distances
+
+    def test_littoral_neighbour_horizon(self, generate_world_with_sea):
+        world = generate_world_with_sea(
+            xdim=5, ydim=5,
+            sea_tiles=[(2, 1), (2, 2), (2, 3), (2, 4),
+                       (0, 4), (1, 4), (3, 4), (4, 4)]
+            )
+        tile = world.index(2, 0)
+
+        # Only neighbours within the horizon are recorded
+        world.set_littoral_neighbours(horizon=2)
+        assert len(tile.littoral_neighbours) == 3
+
+        # Neighbours are extended once the sea attack distance passes the
+        # horizon
+        world.step_number = 1000
+        world.attack()
+        assert len(tile.littoral_neighbours) == 9
+
+
+    def test_littoral_in_range(self, generate_world_with_sea):
+        world = generate_world_with_sea(
+            xdim=5, ydim=5,
+            sea_tiles=[(2, 1), (2, 2), (2, 3), (2, 4),
+                       (0, 4), (1, 4), (3, 4), (4, 4)]
+            )
+        tile = world.index(2, 0)
+        assert tile.littoral_in_range == [LittoralNeighbour(tile, 0)]
+
+        tile.set_sea_attack_distance(2)
+        in_range = tile.littoral_in_range
+        assert in_range == tile.littoral_neighbours_in_range(2)
+
+        # The list is only rebuilt when a neighbour enters or leaves range
+        tile.set_sea_attack_distance(2.1)
+        assert tile.littoral_in_range is in_range
+        tile.set_sea_attack_distance(3)
+        assert len(tile.littoral_in_range) == 5
+        tile.set_sea_attack_distance(1)
+        assert len(tile.littoral_in_range) == 1
+
+
 def test_destruction_of_empty_polities(generate_world):
     dimension = 5
     initial_polities = dimension**2
@@ -278,6 +334,266 @@ def test_step_increment(generate_world):
     assert world.step_number == nsteps
 
 
+def test_polity_trait_totals(generate_world):
+    params = generate_parameters(mutation_to_ultrasocietal=0.1,
+                                 mutation_from_ultrasocietal=0.05)
+    world = generate_world(xdim=5, ydim=5, params=params)
+
+    for i in range(20):
+        world.step()
+        for state in world.polities:
+            assert state.trait_total == sum(
+                [community.total_ultrasocietal_traits()
+                 for community in state.communities])
+
+
+def test_polity_labels(generate_world):
+    world = generate_world(xdim=5, ydim=5)
+
+    for i in range(20):
+        world.step()
+    assert all([world.labels[i] == tile.polity.id
+                for i, tile in enumerate(world.tiles)])
+    assert all([world.register[state.id] is state
+                for state in world.polities])
+    assert np.all(world.tile_polity_sizes()
+                  == [tile.polity.size() for tile in world.tiles])
+
+
+class TestInertTiles():
+    @pytest.fixture
+    def world(self, generate_world_with_sea):
+        return generate_world_with_sea(xdim=4, ydim=3,
+                                       sea_tiles=[(1, 1), (2, 1)])
+
+    def test_no_polity(self, world):
+        assert world.number_of_polities() == 10
+        assert world.index(1, 1).polity is None
+        assert world.labels[world.index(1, 1).index] == -1
+
+    def test_no_leviathan_state(self, world):
+        sea = world.index(2, 1)
+        assert sea.paradigm is None
+        assert sea.icono is None
+        assert sea.agri is None
+        assert sea.total_ultrasocietal_traits() == 0
+
+    def test_polity_forming_tiles(self, world):
+        assert world.polity_forming_tiles == [
+            tile for tile in world.tiles if tile.terrain is not terrain.sea]
+
+    def test_step(self, world):
+        for i in range(20):
+            world.step()
+        assert world.index(1, 1).polity is None
+        assert sum([state.size() for state in world.polities]) == 10
+
+
+def seeded_run(seed):
+    params = generate_parameters(mutation_to_ultrasocietal=0.1)
+    world = World.from_file(project_dir+'/test/data/test_map_5x5.yml', params,
+                            seed=seed)
+    for i in range(20):
+        world.step()
+    return (list(world.labels),
+            [tile.ultrasocietal_traits for tile in world.tiles],
+            [tile.icono.comfort for tile in world.polity_forming_tiles])
+
+
+def test_seed_reproducible():
+    assert seeded_run(7) == seeded_run(7)
+    assert seeded_run(7) != seeded_run(8)
+
+
+def island_world(seed, **parameters):
+    # An island surrounded by sea, with a channel, so Leviathan spread never
+    # reaches the edge of the map
+    parameters = dict(icono=True, mil_spread=True,
+                      spread_para_on_ethnocide=True, mutation_rate=0.3,
+                      **parameters)
+    params = generate_parameters(**parameters)
+    dimension = 8
+    communities = []
+    for y in range(dimension):
+        for x in range(dimension):
+            if (x in (0, dimension-1) or y in (0, dimension-1)
+                    or (x == 4 and y in (2, 3))):
+                communities.append(Community(params, terrain.sea))
+            else:
+                communities.append(Community(params))
+    return World(dimension, dimension, communities, params, seed=seed)
+
+
+def world_state(world):
+    return (list(world.labels),
+            [tile.ultrasocietal_traits for tile in world.tiles],
+            [tile.military_techs for tile in world.tiles],
+            [tile.icono.comfort for tile in world.polity_forming_tiles],
+            [tile.paradigm.expectations
+             for tile in world.polity_forming_tiles],
+            [state.max_size for state in world.polities])
+
+
+def test_batched_agriculture():
+    world = island_world(seed=1)
+    other = island_world(seed=1)
+    for i in range(10):
+        world.step()
+        other.step()
+
+    world.agriculture.Run(world.polity_forming_tiles)
+    for tile in other.polity_forming_tiles:
+        tile.agri.Run()
+    for tile, other_tile in zip(world.polity_forming_tiles,
+                                other.polity_forming_tiles):
+        assert tile.agri.yields == pytest.approx(other_tile.agri.yields)
+        assert tile.agri.yields_prev == other_tile.agri.yields_prev
+    assert world.agriculture.depletion == pytest.approx(
+        other.agriculture.depletion)
+
+
+def test_land_use_rules():
+    world = island_world(seed=1, n_land_use_rules=4, mut_amount=2)
+    for i in range(10):
+        world.step()
+    assert world.agriculture.depletion.shape == (
+        len(world.polity_forming_tiles), 4)
+    assert all([len(tile.paradigm.yield_rules) == 4
+                for tile in world.polity_forming_tiles])
+
+
+def test_paradigm_followers():
+    world = island_world(seed=1)
+    for i in range(20):
+        world.step()
+    counts = {}
+    for tile in world.polity_forming_tiles:
+        counts[tile.paradigm] = counts.get(tile.paradigm, 0) + 1
+    for paradigm, count in counts.items():
+        assert paradigm.followers == count
+    assert len(world.paradigms) == len(counts)
+
+
+def test_paradigm_rows_released():
+    # Rows are freed as soon as a paradigm is neither followed nor offered,
+    # without waiting for the garbage collector
+    world = island_world(seed=1, max_counter_paradigms=2)
+    table = world.paradigms
+    gc.disable()
+    try:
+        for i in range(50):
+            world.step()
+            inboxes = {}
+            for tile in world.polity_forming_tiles:
+                for paradigm in tile.icono.counterParadigms:
+                    inboxes[paradigm] = inboxes.get(paradigm, 0) + 1
+            live = set(inboxes) | {tile.paradigm
+                                   for tile in world.polity_forming_tiles}
+            for paradigm in live:
+                assert paradigm.inboxes == inboxes.get(paradigm, 0)
+            rows = [paradigm.row for paradigm in live]
+            free = table.free_rows()
+            assert len(set(rows + free)) == len(rows) + len(free)
+            assert len(rows) + len(free) == len(table.followers)
+    finally:
+        gc.enable()
+
+
+def test_paradigm_mutation_copies_rules():
+    world = island_world(seed=1)
+    tile = world.polity_forming_tiles[0]
+    parent = tile.paradigm
+    rules = parent.yield_rules.copy()
+    # An offered paradigm is kept without followers
+    world.polity_forming_tiles[1].icono.Receive(parent)
+    tile.paradigm = parent.Mutate(tile)
+    assert np.all(parent.yield_rules == rules)
+    assert parent.followers == 0
+    assert tile.paradigm.followers == 1
+
+
+def test_paradigm_rows_reused():
+    world = island_world(seed=1)
+    tile = world.polity_forming_tiles[0]
+    row = tile.paradigm.row
+    tile.paradigm = tile.paradigm.Mutate(tile)
+    # The old paradigm is gone so its row is free
+    assert tile.paradigm.Mutate(tile).row == row
+
+
+def test_counter_paradigm_inbox():
+    world = island_world(seed=1, max_counter_paradigms=2)
+    tile = world.index(2, 2)
+    neighbour = world.index(3, 2)
+    # Repeated offers of a paradigm are held once
+    tile.icono.Spread(tile.paradigm)
+    tile.icono.Spread(tile.paradigm)
+    assert list(neighbour.icono.counterParadigms) == [tile.paradigm]
+    # Full inboxes ignore new paradigms
+    for other in (world.index(3, 1), world.index(3, 3)):
+        other.icono.Spread(other.paradigm)
+    assert len(neighbour.icono.counterParadigms) == 2
+    assert world.index(3, 3).paradigm not in neighbour.icono.counterParadigms
+
+
+def test_mimesis_adopts_best_offer():
+    world = island_world(seed=1, threshold=1)
+    tile = world.index(2, 2)
+    tile.icono.comfort = 1
+    tile.paradigm.expectations = 1
+    offers = [world.index(x, y).paradigm for x, y in [(1, 2), (3, 2), (2, 1)]]
+    for offer, expectations in zip(offers, [2, 5, 3]):
+        offer.expectations = expectations
+    for offer in offers:
+        tile.icono.Receive(offer)
+    tile.icono.Response()
+    assert tile.paradigm is offers[1]
+    assert not tile.icono.counterParadigms
+
+
+class TestCheckpoint():
+    def test_continuation(self, tmp_path):
+        world = island_world(seed=1)
+        for i in range(20):
+            world.step()
+        world.save_checkpoint(tmp_path / 'checkpoint.npz')
+        for i in range(20):
+            world.step()
+
+        # A world with a different seed continues exactly as the original
+        restored = island_world(seed=2)
+        restored.load_checkpoint(tmp_path / 'checkpoint.npz')
+        assert restored.step_number == 20
+        for i in range(20):
+            restored.step()
+        assert world_state(restored) == world_state(world)
+
+    def test_shared_paradigms(self, tmp_path):
+        world = island_world(seed=1)
+        for i in range(20):
+            world.step()
+        world.save_checkpoint(tmp_path / 'checkpoint.npz')
+
+        restored = island_world(seed=2)
+        restored.load_checkpoint(tmp_path / 'checkpoint.npz')
+        tiles = list(zip(world.polity_forming_tiles,
+                         restored.polity_forming_tiles))
+        for tile, restored_tile in tiles:
+            for other, restored_other in tiles:
+                assert ((tile.paradigm is other.paradigm)
+                        == (restored_tile.paradigm is restored_other.paradigm))
+            assert np.all(tile.paradigm.yield_rules
+                          == restored_tile.paradigm.yield_rules)
+            assert (tile.paradigm.followers
+                    == restored_tile.paradigm.followers)
+
+    def test_mismatched_map(self, tmp_path, generate_world):
+        world = island_world(seed=1)
+        world.save_checkpoint(tmp_path / 'checkpoint.npz')
+        with pytest.raises(InvalidCheckpoint):
+            generate_world(8, 8).load_checkpoint(tmp_path / 'checkpoint.npz')
+
+
 @pytest.fixture(scope='class')
 def world_activation():
     return World.from_file(project_dir+'/test/data/test_activation.yml')
@@ -290,6 +606,8 @@ def test_community_activation(world_activation, step, number_active):
         [tile for tile in world_activation.tiles
             if tile.is_active(world_activation.step_number) is True]
         ) == number_active
+    assert np.all(world_activation.active_mask()
+                  == [tile.is_active(step) for tile in world_activation.tiles])
 
 
 @pytest.mark.incremental